@@ -0,0 +1,860 @@
+"""
+Crawler Benchmarks
+------------------
+Micro-benchmarks for the crawler's CPU/IO stages on synthetic data, so changes
+can be measured without a GPU or a real resources folder.
+
+Usage:
+    python bench.py discovery [--resources 1500] [--depth 6] [--workers 8]
+    python bench.py lua [--file es_extended/server/main.lua ...] [--size-mb 2]
+    python bench.py finetune [--examples 2000] [--max-length 512] [--steps 20]
+    python bench.py crawl [--resources 40] [--latency 0.5] [--fail-rate 0.02] [--pack] [--nodes 1]
+                          [--compare old.json]
+    python bench.py search [--docs 200000] [--dim 384] [--queries 50]
+
+The finetune benchmark needs torch, transformers and datasets but no GPU or
+downloads: it trains a tiny Llama with a word-level tokenizer on CPU.
+
+The crawl benchmark runs one full crawl pass over a synthetic resources folder
+against a local mock of Ollama's /api/chat, and saves blocks/sec, request
+latency, CPU time and peak memory as JSON so versions can be compared.
+
+The search benchmark indexes a synthetic dataset with search.py (hashed
+vectors stand in for an embedding model) and times full builds, incremental
+updates and BM25, vector, hybrid and filtered queries.
+"""
+
+import io
+import os
+import re
+import json
+import time
+import shutil
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import crawl
+
+BENCH_DIR = os.path.join(tempfile.gettempdir(), "fivem-crawler-bench")
+
+# --------------------------------------
+# SYNTHETIC TREES
+# --------------------------------------
+def make_deep_tree(root, resources=1500, depth=6, noise_files=200):
+    """
+    Build a resources folder with nested [category] folders, resources at the
+    leaves (each with a stream/ folder) and node_modules/.git noise around them.
+    """
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    for i in range(resources):
+        parts = [f"[cat{(i >> (2 * level)) % 4}]" for level in range(depth - 1)]
+        resource = os.path.join(root, *parts, f"resource_{i}")
+        os.makedirs(os.path.join(resource, "client"), exist_ok=True)
+        os.makedirs(os.path.join(resource, "stream"), exist_ok=True)
+        with open(os.path.join(resource, "fxmanifest.lua"), "w") as f:
+            f.write("fx_version 'cerulean'\ngame 'gta5'\nclient_script 'client/main.lua'\n")
+        with open(os.path.join(resource, "client", "main.lua"), "w") as f:
+            f.write("print('hi')\n")
+        for j in range(5):
+            open(os.path.join(resource, "stream", f"prop_{j}.ydr"), "w").close()
+        if i % 50 == 0:
+            # NUI build folders and checkouts are where the old walk lost its time.
+            for noise in ("node_modules", ".git"):
+                base = os.path.join(resource, "..", f"tooling_{i}", noise)
+                for k in range(noise_files // 10):
+                    pkg = os.path.join(base, f"pkg_{k}")
+                    os.makedirs(pkg, exist_ok=True)
+                    for n in range(10):
+                        open(os.path.join(pkg, f"f{n}.js"), "w").close()
+
+LUA_TEMPLATE = """
+-- handler {i}: [[ not a long string ]] end
+local function Helper{i}(player, amount)
+    if not player then return false end
+    for k, v in pairs(Config.Items) do
+        if v.name == "item_{i}" and amount > 0 then
+            local msg = [[multi-line
+            text with end and function in it]]
+            while amount > 0 do amount = amount - 1 end
+        elseif v.name == 'x' then
+            repeat amount = amount + 1 until amount > 10
+        end
+    end
+    return true
+end
+
+RegisterNetEvent('framework:server:event{i}', function(data)
+    local src = source
+    local cb = function(ok) print("done {i}", ok) end
+    if Helper{i}(src, data.amount) then TriggerClientEvent('framework:client:done', src) end
+end)
+
+Config.Items["item_{i}"] = {{ label = "Item {i}", weight = {i} }}
+"""
+
+JS_TEMPLATE = """
+function onMessage{i}(event) {{
+    const data = event.data;
+    if (data.action === "open{i}") {{
+        document.getElementById("app").style.display = "block";
+        fetch(`https://${{GetParentResourceName()}}/opened{i}`, {{ method: "POST", body: JSON.stringify({{ id: {i} }}) }});
+    }} else if (data.action === "close{i}") {{
+        document.getElementById("app").style.display = "none";
+    }}
+}}
+window.addEventListener("message", onMessage{i});
+"""
+
+HTML_TEMPLATE = """
+<div class="panel" id="panel{i}">
+    <h2>Panel {i}</h2>
+    <button onclick="post('select', {{ id: {i} }})">Select</button>
+    <ul class="items">{items}</ul>
+</div>
+"""
+
+MANIFEST_TEMPLATE = """fx_version 'cerulean'
+game 'gta5'
+
+ui_page 'html/index.html'
+
+shared_script 'config.lua'
+client_scripts {{ 'client/*.lua' }}
+server_scripts {{ 'server/*.lua' }}
+files {{ 'html/index.html', 'html/js/*.js', 'html/vendor/*.js' }}
+"""
+
+def _fill(template, size_kb, start=0):
+    """Repeat `template` with increasing {i} until it reaches size_kb."""
+    parts, size, i = [], 0, start
+    while size < size_kb * 1024:
+        part = template.format(i=i, items="".join(f"<li>item {n}</li>" for n in range(3)))
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return "".join(parts)
+
+def make_resource_tree(root, resources=40, files=3, file_kb=8, fork_every=5, seed=0):
+    """
+    Build a resources folder of FiveM resources: Lua client/server scripts, a
+    NUI page with JS, a minified vendored library, node_modules noise, and
+    every fork_every-th resource duplicated as a fork under [forks].
+    Returns the resource folders (forks included).
+    """
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    rng = random.Random(seed)
+    made = []
+    for r in range(resources):
+        resource = os.path.join(root, f"[cat{r % 4}]", f"bench_{r}")
+        start = r * 1000  # distinct code per resource so nothing is answered from the cache
+        tree = {"fxmanifest.lua": MANIFEST_TEMPLATE, "config.lua": _fill(LUA_TEMPLATE, 1, start)}
+        for n in range(files):
+            # +-50% around file_kb so block counts and file sizes vary.
+            size = file_kb * rng.uniform(0.5, 1.5)
+            tree[f"client/client_{n}.lua"] = _fill(LUA_TEMPLATE, size, start + 100 * n)
+            tree[f"server/server_{n}.lua"] = _fill(LUA_TEMPLATE, size, start + 100 * n + 50)
+            tree[f"html/js/app_{n}.js"] = _fill(JS_TEMPLATE, size / 2, start + 100 * n)
+        tree["html/index.html"] = ("<html><body><div id=\"app\">"
+                                   + _fill(HTML_TEMPLATE, file_kb / 2, start)
+                                   + "</div><script src=\"js/app_0.js\"></script></body></html>")
+        # Vendored and minified: skipped by SKIP_BUNDLED_ASSETS, but still read.
+        tree["html/vendor/jquery-3.6.0.min.js"] = "/*! jQuery v3.6.0 | (c) OpenJS Foundation */" + (
+            "!function(e,t){\"use strict\";var n=[];" * 2000)
+        for n in range(20):
+            tree[f"html/node_modules/pkg_{n}/index.js"] = "module.exports = {};\n"
+        for rel, text in tree.items():
+            path = os.path.join(resource, *rel.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        made.append(resource)
+        if fork_every and r % fork_every == 0:
+            fork = os.path.join(root, "[forks]", f"bench_{r}_fork")
+            shutil.copytree(resource, fork)
+            made.append(fork)
+    return made
+
+def make_lua_source(size_mb):
+    parts, size, i = [], 0, 0
+    while size < size_mb * 1024 * 1024:
+        part = LUA_TEMPLATE.format(i=i)
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return "".join(parts)
+
+LEGACY_CHUNK_LIMIT = 4000  # the old character cut-off per block
+
+def legacy_extract_lua_blocks(code):
+    """The original line-regex Lua extractor, for comparison."""
+    blocks, stack, start, lines = [], 0, 0, code.splitlines()
+    for i, line in enumerate(lines):
+        if re.match(r'\s*function\b', line) or 'RegisterNetEvent' in line or 'RegisterNUICallback' in line:
+            if stack == 0:
+                start = i
+            stack += 1
+        if re.match(r'\s*end\b', line) and stack > 0:
+            stack -= 1
+            if stack == 0 and i > start:
+                block = '\n'.join(lines[start:i+1])
+                if len(block.strip()) > 80:
+                    blocks.append(block[:LEGACY_CHUNK_LIMIT])
+    return blocks or [code[:LEGACY_CHUNK_LIMIT]]
+
+def legacy_discover(root_dir):
+    """The original os.walk + os.path.exists discovery loop, for comparison."""
+    resource_dirs = []
+    for root, dirs, files in os.walk(root_dir):
+        for d in dirs:
+            candidate = os.path.join(root, d)
+            if os.path.exists(os.path.join(candidate, "fxmanifest.lua")):
+                resource_dirs.append(candidate)
+    return resource_dirs
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its largest child, or None off Unix."""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is KB on Linux and bytes on macOS.
+    scale = 1 / 1024 if os.uname().sysname != "Darwin" else 1 / (1 << 20)
+    return (round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1),
+            round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1))
+
+def timed(fn, *args, repeat=3):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+# --------------------------------------
+# MOCK OLLAMA
+# --------------------------------------
+RUNNER_CRASH = "llama runner process has terminated: exit status 2"
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # the crawler dropping keep-alive connections at exit is expected
+
+class MockOllama:
+    """
+    Local stand-in for Ollama's /api/chat on a background thread.
+
+    Every request costs `overhead` seconds (prompt evaluation, scheduling)
+    plus a latency drawn from N(latency, jitter) per answer, streamed as NDJSON
+    in `tokens` pieces per answer; the final object carries eval_count and the
+    duration fields. JSON-mode requests get one answer per "### Block <id>"
+    heading, and a `bad_json_rate` share of them leaves one block out. At most
+    `parallel` requests are served at once, like OLLAMA_NUM_PARALLEL; the rest
+    queue. A `fail_rate` share of requests fails with the runner crash Ollama
+    reports, half of them as an HTTP 500 and half part way through the stream.
+    While `down_for` seconds from start() have not passed every request
+    crashes and /api/version answers 503, like a node that went away.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.1, fail_rate=0.0, parallel=4, tokens=20,
+                 overhead=0.1, bad_json_rate=0.0, down_for=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.tokens = tokens
+        self.overhead = overhead
+        self.bad_json_rate = bad_json_rate
+        self.down_for = down_for
+        self.down_until = 0.0
+        self.slots = threading.Semaphore(parallel)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.service_times = []
+        self.cpu_seconds = 0.0  # spent in handlers, so the runner can leave it out of the crawler's
+        self.server = _QuietHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/api/chat"
+
+    @property
+    def down(self):
+        return time.monotonic() < self.down_until
+
+    def start(self):
+        self.down_until = time.monotonic() + self.down_for
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _draw(self, answers):
+        with self.lock:
+            self.requests += 1
+            latency = self.overhead + sum(max(0.0, self.rng.gauss(self.latency, self.jitter))
+                                          for _ in range(answers))
+            failure = None
+            if self.down:
+                self.failures += 1
+                failure = "status"
+            elif self.rng.random() < self.fail_rate:
+                self.failures += 1
+                failure = self.rng.choice(("status", "stream"))
+            elif answers > 1 and self.rng.random() < self.bad_json_rate:
+                failure = "partial"
+            return latency, failure
+
+    def _answer_text(self, ids, failure):
+        words = " ".join(f"token{n}" for n in range(self.tokens))
+        if not ids:
+            return words
+        if failure == "partial":
+            ids = ids[:-1]
+        return json.dumps({block_id: f"{block_id}: {words}" for block_id in ids})
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _chunk(self, obj):
+                data = (json.dumps(obj) + "\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                body = json.dumps({"version": "0.0.0-mock"}).encode()
+                self.send_response(503 if mock.down else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                cpu = time.thread_time()
+                try:
+                    self._answer()
+                finally:
+                    with mock.lock:
+                        mock.cpu_seconds += time.thread_time() - cpu
+
+            def _answer(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompt = payload["messages"][-1]["content"]
+                ids = []
+                if payload.get("format") == "json":
+                    ids = re.findall(r"^### Block (\S+)$", prompt, re.MULTILINE)
+                answers = max(1, len(ids))
+                latency, failure = mock._draw(answers)
+                text = mock._answer_text(ids, failure)
+                pieces = mock.tokens * answers
+                step = -(-len(text) // pieces)
+                with mock.slots:
+                    start = time.perf_counter()
+                    if failure == "status":
+                        time.sleep(latency / 4)
+                        body = json.dumps({"error": RUNNER_CRASH}).encode()
+                        self.send_response(500)
+                        self.send_header("Content-Type", "application/json")
+                        self.send_header("Content-Length", str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for n in range(pieces):
+                        time.sleep(latency / pieces)
+                        if failure == "stream" and n == pieces // 2:
+                            self._chunk({"error": RUNNER_CRASH})
+                            break
+                        self._chunk({"model": payload.get("model"), "done": False,
+                                     "message": {"role": "assistant",
+                                                 "content": text[n * step:(n + 1) * step]}})
+                    else:
+                        self._chunk({"model": payload.get("model"), "done": True,
+                                     "message": {"role": "assistant", "content": ""},
+                                     "eval_count": pieces,
+                                     "eval_duration": int(latency * 1e9),
+                                     "prompt_eval_count": len(prompt) // 4,
+                                     "prompt_eval_duration": int(latency * 1e8),
+                                     "load_duration": 0,
+                                     "total_duration": int(latency * 1.1e9)})
+                    self.wfile.write(b"0\r\n\r\n")
+                    with mock.lock:
+                        mock.service_times.append(time.perf_counter() - start)
+
+        return Handler
+
+# --------------------------------------
+# BENCHMARKS
+# --------------------------------------
+def bench_discovery(args):
+    root = os.path.join(BENCH_DIR, "discovery")
+    print(f"[Bench] Building tree: {args.resources} resources, depth {args.depth} ...")
+    make_deep_tree(root, args.resources, args.depth)
+
+    legacy_time, legacy = timed(legacy_discover, root)
+    print(f"legacy os.walk      : {legacy_time * 1000:8.1f} ms  ({len(legacy)} resources)")
+
+    for workers in sorted({1, args.workers}):
+        elapsed, found = timed(crawl.discover_resources, root, crawl.DISCOVERY_IGNORE, workers)
+        print(f"scandir workers={workers:<3}: {elapsed * 1000:8.1f} ms  ({len(found)} resources, "
+              f"{legacy_time / elapsed:.1f}x)")
+        if set(found) != set(legacy):
+            print("[Bench] WARNING: resource sets differ from the legacy walk")
+
+    # Time to the first resource is what decides when LLM work can start.
+    start = time.perf_counter()
+    next(crawl.walk_resources(root, crawl.DISCOVERY_IGNORE, args.workers))
+    print(f"first resource after: {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    if not args.keep:
+        shutil.rmtree(root)
+
+def bench_lua(args):
+    if args.file:
+        sources = [(path, crawl.safe_read(path)) for path in args.file]
+    else:
+        sources = [(f"synthetic {args.size_mb} MB", make_lua_source(args.size_mb))]
+
+    for label, code in sources:
+        mb = len(code.encode("utf-8")) / (1024 * 1024)
+        print(f"[Bench] {label}: {mb:.2f} MB, {code.count(chr(10))} lines")
+        legacy_time, legacy = timed(legacy_extract_lua_blocks, code)
+        new_time, spans = timed(lambda c: list(crawl.lua_block_spans(c)), code)
+        kinds = {}
+        for block in spans:
+            kinds[block.kind] = kinds.get(block.kind, 0) + 1
+        print(f"legacy line regex: {legacy_time * 1000:8.1f} ms  {mb / legacy_time:6.1f} MB/s  "
+              f"{len(legacy)} blocks")
+        print(f"lua tokenizer    : {new_time * 1000:8.1f} ms  {mb / new_time:6.1f} MB/s  "
+              f"{len(spans)} blocks {kinds}")
+
+def make_finetune_examples(count, max_length, seed=0):
+    """Instruction records whose code and answer lengths vary like the real dataset."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(500)]
+    examples = {"instruction": [], "input": [], "output": []}
+    for i in range(count):
+        # Mostly a few hundred tokens with a long tail, as in the crawl.
+        size = min(max_length, int(rng.lognormvariate(4.8, 0.7)))
+        code = " ".join(rng.choice(words) for _ in range(size // 2))
+        examples["instruction"].append("Explain, analyze, or answer this FiveM code segment.")
+        examples["input"].append(f"Resource: res{i % 40}\nFile: client/main.lua\n\n{code}")
+        examples["output"].append(" ".join(rng.choice(words) for _ in range(size // 2)))
+    return examples
+
+def make_tiny_tokenizer(examples):
+    from tokenizers import Tokenizer, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    tok = Tokenizer(models.WordLevel(unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    corpus = examples["instruction"][:1] + examples["input"] + examples["output"] + ["###"]
+    tok.train_from_iterator(corpus, trainers.WordLevelTrainer(special_tokens=["[UNK]", "</s>"]))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tok, unk_token="[UNK]", eos_token="</s>")
+    tokenizer.pad_token = tokenizer.eos_token
+    return tokenizer
+
+def bench_finetune(args):
+    import torch
+    from datasets import Dataset
+    from transformers import LlamaConfig, LlamaForCausalLM
+    import finetune
+
+    torch.manual_seed(0)
+    examples = make_finetune_examples(args.examples, args.max_length)
+    tokenizer = make_tiny_tokenizer(examples)
+    dataset = Dataset.from_dict(examples)
+    config = LlamaConfig(vocab_size=len(tokenizer), hidden_size=64, intermediate_size=128,
+                         num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=4,
+                         max_position_embeddings=args.max_length, use_cache=False)
+
+    def run(label, data, sampler, collator):
+        model = LlamaForCausalLM(config)
+        optimizer = torch.optim.AdamW(model.parameters(), lr=1e-3)
+        loader = torch.utils.data.DataLoader(
+            data.remove_columns("length"), batch_size=args.batch_size,
+            sampler=sampler, collate_fn=collator)
+        real = padded = steps = 0
+        start = time.perf_counter()
+        for batch in loader:
+            loss = model(**batch).loss
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+            real += int((batch["labels"] != finetune.IGNORE_INDEX).sum())
+            padded += batch["input_ids"].numel()
+            steps += 1
+            if steps == args.steps:
+                break
+        elapsed = time.perf_counter() - start
+        print(f"{label:<22}: {real / steps:8.0f} target tokens/step  {padded / steps:8.0f} tokens/step  "
+              f"{100 * (1 - real / padded):5.1f}% wasted  {real / elapsed:8.0f} target tokens/s  "
+              f"loss {loss.item():.3f}")
+
+    # Cold tokenization against the memory-mapped cache finetune.py restarts from.
+    work = os.path.join(BENCH_DIR, "finetune")
+    shutil.rmtree(work, ignore_errors=True)
+    os.makedirs(work)
+    jsonl = os.path.join(work, "lora.jsonl")
+    dataset.to_json(jsonl)
+    cache_dir = os.path.join(work, "tokenized")
+    cold, tokenized = timed(finetune.load_tokenized, jsonl, tokenizer, args.max_length, False,
+                            cache_dir, 1, repeat=1)
+    warm, tokenized = timed(finetune.load_tokenized, jsonl, tokenizer, args.max_length, False,
+                            cache_dir, 1, repeat=1)
+    print(f"[Bench] tokenize: {cold * 1000:8.1f} ms cold, {warm * 1000:8.1f} ms from cache")
+    packed = finetune.load_tokenized(jsonl, tokenizer, args.max_length, True, cache_dir, 1)
+    lengths = tokenized["length"]
+    print(f"[Bench] {len(tokenized)} examples, mean {sum(lengths) / len(lengths):.0f} tokens, "
+          f"max {max(lengths)}; {len(packed)} packed rows of up to {args.max_length}")
+
+    pad_id = tokenizer.pad_token_id
+    # The old format(): every example padded to max_length, in random order.
+    run("padding=max_length", tokenized, torch.utils.data.RandomSampler(tokenized),
+        finetune.PaddingCollator(pad_id, pad_to_multiple_of=args.max_length))
+    run("random + dynamic pad", tokenized, torch.utils.data.RandomSampler(tokenized),
+        finetune.PaddingCollator(pad_id))
+    run("bucketed + dynamic pad", tokenized,
+        finetune.LengthBucketSampler(lengths, args.batch_size), finetune.PaddingCollator(pad_id))
+    run("packed", packed, torch.utils.data.RandomSampler(packed), finetune.PaddingCollator(pad_id))
+
+    # Packed examples must not see each other: logits of the second example in
+    # a packed row have to match running that example alone.
+    model = LlamaForCausalLM(config).eval()
+    row = next(r for r in packed if r["position_ids"].count(0) > 1)
+    second = row["position_ids"].index(0, 1)
+    end = row["position_ids"].index(0, second + 1) if row["position_ids"].count(0) > 2 else len(row["input_ids"])
+    with torch.no_grad():
+        together = model(input_ids=torch.tensor([row["input_ids"]]),
+                         position_ids=torch.tensor([row["position_ids"]])).logits[0, second:end]
+        alone = model(input_ids=torch.tensor([row["input_ids"][second:end]])).logits[0]
+    print(f"[Bench] packed attention isolated: {torch.allclose(together, alone, atol=1e-4)} "
+          f"(max diff {(together - alone).abs().max().item():.2e})")
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+async def crawl_pass(root, mode):
+    """One crawl pass the way main() runs each epoch, or resource by resource."""
+    if mode == "resource":
+        for path in crawl.walk_resources(root, crawl.DISCOVERY_IGNORE, crawl.DISCOVERY_WORKERS):
+            await crawl.process_resource(path)
+        return
+    file_index = crawl.FileIndex(crawl.FILE_INDEX_PATH)
+    await crawl.crawl_resources(crawl.iter_resources(root), crawl.crawl_state, file_index)
+
+async def crawl_session(root, mode, rescan):
+    """Crawl `root`, optionally time an unchanged rescan, then close everything run() closes."""
+    try:
+        start = time.perf_counter()
+        await crawl_pass(root, mode)
+        elapsed = time.perf_counter() - start
+        rescan_elapsed = None
+        if rescan and mode == "epoch":
+            start = time.perf_counter()
+            await crawl_pass(root, mode)
+            rescan_elapsed = time.perf_counter() - start
+        return elapsed, rescan_elapsed
+    finally:
+        await crawl.ollama_router.close()
+        crawl.completion_cache.close()
+        crawl.crawl_state.close()
+        crawl.shutdown_extract_executor()
+
+def compare_results(old, new):
+    """Print the change in the headline numbers against an earlier result file."""
+    print(f"[Bench] against {old.get('revision') or '?'} ({old.get('timestamp', '?')}):")
+    for key, higher_is_better in (("blocks_per_second", True), ("latency_p50_ms", False),
+                                  ("latency_p99_ms", False), ("cpu_seconds", False),
+                                  ("peak_rss_mb", False)):
+        before, after = old.get(key), new.get(key)
+        if not before or after is None:
+            continue
+        change = (after - before) / before * 100
+        worse = change < -10 if higher_is_better else change > 10
+        print(f"  {key:<18} {before:10.2f} -> {after:10.2f}  {change:+6.1f}%"
+              + ("  REGRESSION" if worse else ""))
+
+def bench_crawl(args):
+    base = os.path.join(BENCH_DIR, "crawl")
+    root = os.path.join(base, "resources")
+    output = os.path.abspath(args.output or os.path.join(
+        "bench-results", f"crawl-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"))
+    made = make_resource_tree(root, args.resources, args.files, args.file_kb, args.fork_every)
+    print(f"[Bench] {len(made)} resources ({args.resources} + forks) in {root}")
+
+    # Every crawler path is relative, so a fresh working folder isolates its
+    # dataset, cache, state and index from a real crawl.
+    work = os.path.join(base, "work")
+    shutil.rmtree(work, ignore_errors=True)
+    os.makedirs(work)
+    cwd = os.getcwd()
+    os.chdir(work)
+
+    mocks = [MockOllama(args.latency, args.jitter, args.fail_rate, args.parallel, args.tokens,
+                        args.overhead, args.bad_json_rate, args.down_for if n == 0 else 0.0, seed=n).start()
+             for n in range(args.nodes)]
+    router = crawl.build_router([{"url": m.url, "concurrency": args.parallel} for m in mocks],
+                                args.routing)
+    router.base_delay = args.retry_delay
+    # Short enough that an ejected node can come back within a benchmark run.
+    router.probe_interval = 1
+    for client in router.clients:
+        client.cooldown = 1
+    crawl.ollama_router = router
+    crawl.PACK_BLOCKS = args.pack
+    crawl.CONTENT_DEDUPE = not args.no_content_dedupe
+    crawl.metrics.profile = False
+
+    latencies = []
+    query_llm = crawl.query_llm
+
+    async def timed_query(payload):
+        # End to end per block: slot wait, retries and backoff included.
+        start = time.perf_counter()
+        try:
+            return await query_llm(payload)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    crawl.query_llm = timed_query
+    cpu_before = os.times()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log) if not args.verbose else contextlib.nullcontext():
+            elapsed, rescan = asyncio.run(crawl_session(root, args.mode, not args.no_rescan))
+    finally:
+        crawl.query_llm = query_llm
+        for mock in mocks:
+            mock.stop()
+        os.chdir(cwd)
+    cpu_after = os.times()
+    requests = sum(m.requests for m in mocks)
+    failures = sum(m.failures for m in mocks)
+
+    snap = crawl.metrics.snapshot()
+    counters = snap["counters"]
+    answered = counters.get("blocks_answered", 0)
+    self_rss, child_rss = peak_rss_mb()
+    result = {
+        "benchmark": "crawl",
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k != "func"},
+        "resources": len(made),
+        "blocks": counters.get("blocks_extracted", 0),
+        "blocks_answered": answered,
+        "blocks_failed": counters.get("blocks_failed", 0),
+        "seconds": round(elapsed, 3),
+        "rescan_seconds": round(rescan, 3) if rescan is not None else None,
+        "blocks_per_second": round(answered / elapsed, 3) if elapsed else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "latency_max_ms": round(max(latencies, default=0) * 1000, 1),
+        "server_p50_ms": round(percentile([t for m in mocks for t in m.service_times], 50) * 1000, 1),
+        # The mocks share this process; their handler time is not the crawler's.
+        "cpu_seconds": round(cpu_after.user - cpu_before.user + cpu_after.system - cpu_before.system
+                             - sum(m.cpu_seconds for m in mocks), 2),
+        "cpu_children_seconds": round(cpu_after.children_user - cpu_before.children_user
+                                      + cpu_after.children_system - cpu_before.children_system, 2),
+        "peak_rss_mb": self_rss,
+        "peak_child_rss_mb": child_rss,
+        "mock_requests": requests,
+        "mock_failures": failures,
+        "nodes": router.snapshot(),
+        "metrics": snap,
+    }
+
+    print(f"[Bench] {answered} blocks answered, {result['blocks_failed']} failed, "
+          f"in {elapsed:.2f}s: {result['blocks_per_second']:.1f} blocks/s")
+    print(f"[Bench] latency p50 {result['latency_p50_ms']:.0f} ms, p99 {result['latency_p99_ms']:.0f} ms "
+          f"(server p50 {result['server_p50_ms']:.0f} ms); {requests} requests, "
+          f"{failures} injected failures, {counters.get('llm_retries', 0)} retries")
+    print(f"[Bench] CPU {result['cpu_seconds']:.2f}s + {result['cpu_children_seconds']:.2f}s in "
+          f"extract workers; peak RSS {self_rss} MB (largest worker {child_rss} MB)")
+    reused = sum(counters.get(k, 0) for k in ("content_dedupe_hits", "content_inflight_hits",
+                                              "content_fuzzy_hits"))
+    if reused:
+        print(f"[Bench] {reused} blocks reused the answer of identical code elsewhere in the tree")
+    if args.pack:
+        print(f"[Bench] {counters.get('packed_blocks', 0)} blocks answered in "
+              f"{counters.get('packed_requests', 0)} packed requests, "
+              f"{counters.get('pack_fallbacks', 0)} sent alone after an incomplete answer")
+    if args.nodes > 1:
+        print("[Bench] answered per node: " + ", ".join(
+            f"{node['served']}" + (" (ejected)" if node["ejected"] else "") for node in result["nodes"]))
+    if rescan is not None:
+        print(f"[Bench] unchanged rescan: {rescan * 1000:.0f} ms")
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"[Bench] saved {output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare_results(json.load(f), result)
+    if not args.keep:
+        shutil.rmtree(base, ignore_errors=True)
+
+# --------------------------------------
+# SEARCH INDEX
+# --------------------------------------
+SEARCH_WORDS = ("player vehicle inventory money job garage phone police bank shop weapon "
+                "society billing housing target notify menu spawn death license").split()
+
+def make_search_dataset(path, count, start=0, resources=2000, seed=0):
+    """Crawler-shaped records: one event handler per entry, with an answer about it."""
+    rng = random.Random(seed + start)
+    with open(path, "a", encoding="utf-8") as f:
+        for i in range(start, start + count):
+            resource = f"res_{rng.randrange(resources)}"
+            noun, verb = rng.choice(SEARCH_WORDS), rng.choice(("Loaded", "Updated", "Opened", "Removed"))
+            event = f"{resource}:{noun}{verb}"
+            path_ = f"./resources/{resource}/{rng.choice(('client', 'server'))}/{noun}.{rng.choice(('lua', 'js'))}"
+            code = (f"RegisterNetEvent('{event}')\nAddEventHandler('{event}', function(data)\n"
+                    f"  local {noun} = data.{rng.choice(SEARCH_WORDS)}\n  TriggerClientEvent('{resource}:notify', -1, {noun})\nend)")
+            words = " ".join(rng.choice(SEARCH_WORDS) for _ in range(40))
+            completion = f"Handles {event}: reads the {noun} from the payload and notifies every client. {words}"
+            f.write(json.dumps({"id": i, "resource": resource, "path": path_,
+                                "prompt": crawl.USER_PROMPT.format(resource=resource, path=path_, code=code),
+                                "completion": completion}) + "\n")
+
+def bench_search(args):
+    import search
+
+    work = tempfile.mkdtemp(prefix="search-bench-")
+    dataset = os.path.join(work, "fivem_dataset.jsonl")
+    try:
+        make_search_dataset(dataset, args.docs)
+        embed = {"backend": "hash", "dim": args.dim} if args.dim else {}
+        index = search.SearchIndex(os.path.join(work, "index"))
+        start = time.perf_counter()
+        index.update(dataset, embed, progress=False)
+        build = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(index.path) for name in names)
+        print(f"[Bench] build: {args.docs} entries in {build:.1f}s ({args.docs / build:,.0f}/s), "
+              f"{size / (1 << 20):.0f} MB on disk, {len(index.meta['segments'])} segments")
+
+        make_search_dataset(dataset, max(1, args.docs // 100), start=args.docs)
+        start = time.perf_counter()
+        added = index.update(dataset, progress=False)
+        print(f"[Bench] incremental update: {added} entries in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        rng = random.Random(1)
+        queries = [f"res_{rng.randrange(2000)}:{rng.choice(SEARCH_WORDS)}Loaded" for _ in range(args.queries)]
+        modes = [("bm25", {}), ("bm25 + resource/ext filter", {"resources": ["res_7", "res_8"], "exts": [".lua"]})]
+        if args.dim:
+            modes += [("dense", {}), ("dense, float16 file scan", {}), ("hybrid", {})]
+        for label, filters in modes:
+            mode = label.split()[0].rstrip(",")
+            index.vector_cache_mb = 0 if "scan" in label else search.VECTOR_CACHE_MB
+            index.search(queries[0], 10, mode, **filters)  # maps pages, fills caches
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, 10, mode, **filters)
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"{label:<28}: p50 {percentile(latencies, 50):6.1f} ms  p99 {percentile(latencies, 99):6.1f} ms")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crawler stages on synthetic data.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("discovery", help="resource discovery on a synthetic deep tree")
+    p.add_argument("--resources", type=int, default=1500)
+    p.add_argument("--depth", type=int, default=6)
+    p.add_argument("--workers", type=int, default=8, help="thread count for the parallel walk")
+    p.add_argument("--keep", action="store_true", help="keep the generated tree")
+    p.set_defaults(func=bench_discovery)
+
+    p = sub.add_parser("lua", help="Lua block extraction throughput")
+    p.add_argument("--file", nargs="*", help="real Lua files, e.g. a framework core")
+    p.add_argument("--size-mb", type=float, default=2.0, help="size of the synthetic source")
+    p.set_defaults(func=bench_lua)
+
+    p = sub.add_parser("finetune", help="tokens per step of finetune.py's padding and packing modes")
+    p.add_argument("--examples", type=int, default=2000)
+    p.add_argument("--max-length", type=int, default=512)
+    p.add_argument("--batch-size", type=int, default=4)
+    p.add_argument("--steps", type=int, default=20)
+    p.set_defaults(func=bench_finetune)
+
+    p = sub.add_parser("crawl", help="end-to-end crawl pass against a mock Ollama server")
+    p.add_argument("--resources", type=int, default=40)
+    p.add_argument("--files", type=int, default=3, help="Lua/JS files of each kind per resource")
+    p.add_argument("--file-kb", type=float, default=8, help="average script size")
+    p.add_argument("--fork-every", type=int, default=5, help="duplicate every Nth resource as a fork; 0 = none")
+    p.add_argument("--latency", type=float, default=0.5, help="mean seconds per answer")
+    p.add_argument("--overhead", type=float, default=0.1, help="fixed seconds per request (prompt eval)")
+    p.add_argument("--jitter", type=float, default=0.1, help="standard deviation of the latency")
+    p.add_argument("--fail-rate", type=float, default=0.02, help="share of requests that crash the runner")
+    p.add_argument("--parallel", type=int, default=4, help="requests each mock node serves at once")
+    p.add_argument("--nodes", type=int, default=1, help="mock Ollama endpoints to route across")
+    p.add_argument("--routing", choices=("least_outstanding", "latency"), default=crawl.ROUTING)
+    p.add_argument("--down-for", type=float, default=0.0,
+                   help="seconds the first node is down at the start, to exercise ejection")
+    p.add_argument("--tokens", type=int, default=20, help="streamed pieces per answer")
+    p.add_argument("--pack", action="store_true", help="crawl with PACK_BLOCKS on")
+    p.add_argument("--no-content-dedupe", action="store_true", help="crawl with CONTENT_DEDUPE off")
+    p.add_argument("--bad-json-rate", type=float, default=0.02,
+                   help="share of packed answers that leave a block out")
+    p.add_argument("--retry-delay", type=float, default=0.1, help="crawler retry base delay")
+    p.add_argument("--mode", choices=("epoch", "resource"), default="epoch",
+                   help="one main() epoch, or process_resource() on each resource in turn")
+    p.add_argument("--no-rescan", action="store_true", help="skip timing an unchanged second pass")
+    p.add_argument("--output", help="result JSON (default bench-results/crawl-<time>.json)")
+    p.add_argument("--compare", help="earlier result JSON to compare against")
+    p.add_argument("--verbose", action="store_true", help="show the crawler's own output")
+    p.add_argument("--keep", action="store_true", help="keep the generated tree and work folder")
+    p.set_defaults(func=bench_crawl)
+
+    p = sub.add_parser("search", help="search.py index build, update and query latency")
+    p.add_argument("--docs", type=int, default=200000)
+    p.add_argument("--dim", type=int, default=384, help="hashed vector width; 0 = BM25 only")
+    p.add_argument("--queries", type=int, default=50)
+    p.set_defaults(func=bench_search)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
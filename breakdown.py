@@ -0,0 +1,35 @@
+"""
+File-Type Breakdown
+-------------------
+Counts dataset entries by extension and directory; shared by test.py and
+postprocess.py.
+"""
+
+import os
+
+FRONTEND_EXTS = {".js", ".html", ".css"}
+BACKEND_EXTS = {".lua", ".sql", ".json", ".xml", ".cfg"}
+
+def file_kind(path):
+    """(extension, parent directory name) used for the breakdown."""
+    return os.path.splitext(path)[1].lower(), os.path.basename(os.path.dirname(path))
+
+def print_breakdown(ext_counter, dir_counter, frontend_count, backend_count, total):
+    if not total:
+        print("\nTotal entries analyzed: 0")
+        return
+
+    print("\n--- File Type Breakdown ---")
+    for ext, count in ext_counter.most_common():
+        pct = (count / total) * 100
+        print(f"{ext:<8}: {count:>5} ({pct:.1f}%)")
+
+    print(f"\nFront-end files : {frontend_count} ({(frontend_count/total)*100:.1f}%)")
+    print(f"Back-end files  : {backend_count} ({(backend_count/total)*100:.1f}%)")
+
+    print("\n--- Top 10 Most Represented Directories ---")
+    for dir_name, count in dir_counter.most_common(10):
+        pct = (count / total) * 100
+        print(f"{dir_name:<20}: {count:>5} ({pct:.1f}%)")
+
+    print(f"\nTotal entries analyzed: {total}")
@@ -17,19 +17,99 @@ import aiohttp
 import glob
 import hashlib
 import time
+import random
+import gzip
+import struct
+import sqlite3
+import argparse
+import fnmatch
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
-import asyncio, aiohttp, json, subprocess, time
+from urllib.parse import urlsplit, urlunsplit
+import asyncio, aiohttp, json, time
 
 # --------------------------------------
 # CONFIGURATION
 # --------------------------------------
 MODEL = "llama3.2"
 OLLAMA_URL = "http://localhost:11434/api/chat"
+OLLAMA_ENDPOINTS = []  # several nodes: [{"url": ".../api/chat", "concurrency": 4}, ...]; empty = OLLAMA_URL
+ROUTING = "least_outstanding"  # or "latency": outstanding requests weighted by each node's recent latency
+KEEP_ALIVE = "30m"  # sent with every request so nodes keep the model loaded between requests
+HEALTH_PROBE_INTERVAL = 15  # seconds between health probes of ejected endpoints
 DATASET_PATH = "./dataset/fivem_dataset.jsonl"
-PROGRESS_LOG = "./dataset/progress.json"
+PROGRESS_LOG = "./dataset/progress.json"  # legacy; imported into the state store once
+STATE_DB_PATH = "./dataset/crawl_state.sqlite"
+CHUNK_MAX_ATTEMPTS = 3  # passes that may retry a chunk whose answer failed
 ROOT_DIR = os.getcwd()
 TEMPERATURE = 0.8
-CHUNK_LIMIT = 4000  # soft limit per logical block
+MODEL_CONTEXT = 4096  # num_ctx sent with every request; block budgets are derived from it
+BLOCK_MAX_TOKENS = 1536  # ceiling per block even when the context allows more (prompt eval time)
+BLOCK_OVERLAP_LINES = 3  # lines each window of a split block repeats from the one before
+PROMPT_OVERHEAD_TOKENS = 256  # system prompt, file header and chat template around a block
+SKIP_BUNDLED_ASSETS = True  # ignore minified/vendored NUI bundles
+MAX_CONCURRENCY = 4  # keep in line with OLLAMA_NUM_PARALLEL on the server
+ADAPTIVE_CONCURRENCY = True  # grow/shrink in-flight requests from observed latency
+MIN_CONCURRENCY = 1
+REQUEST_TIMEOUT = 600  # seconds per /api/chat request
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 2  # seconds, doubled per attempt with full jitter
+RETRY_MAX_DELAY = 60
+BREAKER_THRESHOLD = 3  # consecutive failures before dispatch is paused
+BREAKER_COOLDOWN = 30  # seconds the runner gets to come back
+COMPLETION_CACHE_PATH = "./dataset/completion_cache.sqlite"
+CACHE_MAX_ENTRIES = 200000  # least recently used completions are evicted past this
+CACHE_MODE = "skip"  # "skip" cached blocks, or "serve" them again into the dataset
+CONTENT_DEDUPE = True  # ask once per distinct block across resources (forks, vendored libs)
+CONTENT_DEDUPE_FUZZY = False  # also reuse the answer of a near-identical block (simhash)
+FUZZY_MAX_DISTANCE = 3  # simhash bits two blocks may differ by and still share an answer
+FUZZY_MIN_TOKENS = 40  # shorter blocks only match exactly; they look alike too easily
+FILE_INDEX_PATH = "./dataset/file_index.json"
+EPOCH_INTERVAL = 3600  # seconds between full passes when not watching
+WATCH_MODE = False  # poll indexed files and react to edits instead of sleeping
+WATCH_POLL_INTERVAL = 2  # seconds between stat sweeps in watch mode
+WATCH_DEBOUNCE = 3  # quiet seconds required before a changed resource is crawled
+WATCH_RESCAN_INTERVAL = 300  # full rediscovery for new resources/files in watch mode
+DISCOVERY_IGNORE = ["node_modules", ".git", ".svn", ".vscode", "__pycache__", "stream", "dataset"]
+DISCOVERY_WORKERS = 1  # raise for network drives; local disks are fastest on one thread
+EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # processes reading + chunking files; 0 = threads
+BLOCK_QUEUE_SIZE = 256  # parsed blocks waiting for the LLM before extraction pauses
+PIPELINE_REPORT_INTERVAL = 30  # seconds between [Pipeline] queue depth lines
+SUPPORTED_EXTS = ('.lua', '.js', '.html', '.css')
+WRITER_BATCH_RECORDS = 64  # records buffered before a write
+WRITER_BATCH_BYTES = 1 << 20
+WRITER_FLUSH_INTERVAL = 5  # seconds a partial batch may wait
+WRITER_FSYNC = "batch"  # "always" (every record), "batch" (every write) or "never"
+DATASET_FORMAT = "jsonl"  # "jsonl": one self-contained record per line, "compact": see compact_rows
+DATASET_COMPRESS = False  # gzip the compact dataset (.compact.jsonl.gz)
+METRICS_PATH = "./dataset/metrics.json"  # rewritten every PIPELINE_REPORT_INTERVAL; "" disables
+METRICS_FORMAT = "json"  # "json" snapshot or "prometheus" text (node_exporter textfile format)
+PROFILE = False  # per-resource stage breakdown written at the end of every epoch
+PROFILE_DIR = "./dataset/profile"
+PACK_BLOCKS = False  # answer several small blocks of a file in one JSON-mode request
+PACK_TOKEN_BUDGET = 1024  # estimated code tokens per packed request
+PACK_MAX_BLOCKS = 4  # blocks per packed request; each gets the full num_predict
+PACK_NUM_CTX = 8192  # context for packed requests: the blocks plus every answer must fit
+
+SYSTEM_PROMPT = (
+    "You are an expert FiveM developer analyzing {ext} code. "
+    "Explain what this block does, identify any events or NUI communication, "
+    "and generate 2-3 realistic developer questions about it."
+)
+USER_PROMPT = "Resource: {resource}\nFile: {path}\n\n{code}"
+PACK_SYSTEM_PROMPT = (
+    "You are an expert FiveM developer analyzing {ext} code. You will be given "
+    "several blocks from one file, each under a '### Block <id>' heading. For "
+    "every block, explain what it does, identify any events or NUI communication, "
+    "and generate 2-3 realistic developer questions about it. Reply with one JSON "
+    "object that maps each block id to its answer as a string."
+)
+PACK_BLOCK = "### Block {id}\n{code}\n"
+LLM_OPTIONS = {"temperature": TEMPERATURE, "num_predict": 1024, "num_ctx": MODEL_CONTEXT}
 
 # --------------------------------------
 # UTILITIES
@@ -41,58 +121,508 @@ def safe_read(path):
     except Exception:
         return ""
 
-def parse_fxmanifest(path):
-    data = safe_read(path)
-    fx = {}
-    for key in ["name", "author", "description", "version", "ui_page"]:
-        match = re.search(fr'{key}\s+\"([^\"]+)\"', data)
-        if match:
-            fx[key] = match.group(1)
-    for block in ["client_scripts", "server_scripts", "shared_scripts", "files"]:
-        matches = re.findall(fr'{block}\s+{{([^}}]+)}}', data)
-        if matches:
-            entries = []
-            for group in matches:
-                entries += [x.strip().strip("'\"") for x in group.split(',') if x.strip()]
-            fx[block] = entries
-    return fx
-
 def hash_id(*args):
     return hashlib.sha1("::".join(args).encode()).hexdigest()
 
+_TOKEN_PIECE = re.compile(r"\w+|[^\w\s]|\n[ \t]*")
+
+def estimate_tokens(text):
+    """
+    Approximate token count of code for a Llama-style BPE vocabulary: one per
+    six characters of a word, one per symbol, one per newline and indent.
+    """
+    return sum(1 + len(piece) // 6 for piece in _TOKEN_PIECE.findall(text)) + 1
+
+def block_token_budget():
+    """Tokens of code one request may carry: what the context leaves next to the answer."""
+    room = MODEL_CONTEXT - LLM_OPTIONS["num_predict"] - PROMPT_OVERHEAD_TOKENS
+    return max(256, min(BLOCK_MAX_TOKENS, room))
+
 # --------------------------------------
 # LOGIC-AWARE CHUNKING
 # --------------------------------------
+CodeBlock = namedtuple("CodeBlock", "kind name start_line end_line text")
+
+_COMMENT_SYNTAX = {".lua": ("--", ""), ".js": ("//", ""), ".css": ("/*", " */"), ".html": ("<!--", " -->")}
+_CLOSING_LINE = re.compile(r"\s*(end\b|until\b|else\b|elseif\b|[}\])])")
+
+def _cut_score(lines, i):
+    """Lower is a better place to start a new window: a shallow line that opens a statement."""
+    while i < len(lines) and not lines[i].strip():
+        i += 1
+    if i == len(lines):
+        return 0
+    line = lines[i]
+    indent = len(line) - len(line.lstrip())
+    return indent + (1000 if _CLOSING_LINE.match(line) else 0)
+
+def split_block(block, ext, budget=None, overlap=BLOCK_OVERLAP_LINES):
+    """
+    The text of `block`, or overlapping windows of it when it is over the
+    token budget. Windows end where the next line is the shallowest statement
+    start in their second half, repeat `overlap` lines of the previous window,
+    and open with a comment naming the enclosing block and its line range.
+    """
+    budget = budget or block_token_budget()
+    if estimate_tokens(block.text) <= budget:
+        return [block.text]
+    prefix, suffix = _COMMENT_SYNTAX.get(ext, ("//", ""))
+    if ext == ".html" and block.kind != "file":
+        # Blocks of a page come from its inline scripts and styles.
+        prefix, suffix = _COMMENT_SYNTAX[".css" if block.kind == "rules" else ".js"]
+    body = budget - 32  # room for the header
+
+    lines, costs = [], []
+    for line in block.text.splitlines(keepends=True):
+        cost = estimate_tokens(line)
+        if cost <= body:
+            lines.append(line)
+            costs.append(cost)
+            continue
+        # Minified or generated: a single line over the budget is cut by characters.
+        step = max(1, len(line) * body // cost)
+        for k in range(0, len(line), step):
+            lines.append(line[k:k + step])
+            costs.append(estimate_tokens(line[k:k + step]))
+
+    spans, start = [], 0
+    while start < len(lines):
+        end, used = start, 0
+        while end < len(lines) and used + costs[end] <= body:
+            used += costs[end]
+            end += 1
+        end = max(end, start + 1)
+        if end < len(lines):
+            lo = start + max(1, (end - start) // 2)
+            end = min(range(lo, end + 1), key=lambda i: (_cut_score(lines, i), -i))
+        if spans and end <= spans[-1][1]:
+            # Nothing past the overlap fits (a long line follows it): drop the overlap.
+            start = spans[-1][1]
+            continue
+        spans.append((start, end))
+        if end >= len(lines):
+            break
+        start = max(end - overlap, start + 1)
+
+    label = f"{block.kind} {block.name}".strip()
+    windows = []
+    for n, (start, end) in enumerate(spans, 1):
+        first = block.start_line + sum(line.endswith("\n") for line in lines[:start])
+        last = first + sum(line.endswith("\n") for line in lines[start:end - 1])
+        windows.append(f"{prefix} {label} (part {n}/{len(spans)}, lines {first}-{last}){suffix}\n"
+                       + "".join(lines[start:end]))
+    return windows
+
+def _block_windows(spans, code, ext, keep):
+    """Windows of every span passing `keep`, or of the whole file when none does."""
+    blocks = [window for span in spans if keep(span) for window in split_block(span, ext)]
+    return blocks or split_block(CodeBlock("file", "", 1, code.count("\n") + 1, code), ext)
+
+_LUA_COMMENT = r"--\[(?P<ceq>=*)\[.*?\](?P=ceq)\]|--[^\n]*"
+_LUA_STRING = r"""\[(?P<seq>=*)\[.*?\](?P=seq)\]|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`[^`\n]*`"""
+# Every token; used at the top level, where statement boundaries matter.
+_LUA_TOKEN = re.compile(rf"""
+    (?P<comment>{_LUA_COMMENT})
+  | (?P<string>{_LUA_STRING})
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<number>0[xX][0-9a-fA-F.]+(?:[pP][+-]?\d+)?|\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<op>\.\.\.|\.\.|==|~=|<=|>=|<<|>>|//|::|\S)
+""", re.VERBOSE | re.DOTALL)
+# Only tokens that change nesting; the regex engine skips everything else.
+_LUA_BRACKETS = re.compile(rf"""
+    (?P<comment>{_LUA_COMMENT})
+  | (?P<string>{_LUA_STRING})
+  | (?P<name>\b(?:function|if|do|repeat|end|until)\b)
+  | (?P<op>[(){{}}\[\]])
+""", re.VERBOSE | re.DOTALL)
+# Inside a block brackets balance out before its `end`, so only keywords count.
+_LUA_KEYWORDS = re.compile(rf"""
+    (?P<comment>{_LUA_COMMENT})
+  | (?P<string>{_LUA_STRING})
+  | (?P<name>\b(?:function|if|do|repeat|end|until)\b)
+""", re.VERBOSE | re.DOTALL)
+
+# Tokens after which a new line still continues the same statement.
+_LUA_CONTINUATION = frozenset([
+    "local", "return", "and", "or", "not", "=", ",", "(", "{", "[", ".", ":", "..",
+    "+", "-", "*", "/", "//", "%", "^", "#", "==", "~=", "<", "<=", ">", ">=",
+    "&", "|", "~", "<<", ">>", "in",
+])
+_LUA_EVENT_CALLS = frozenset([
+    "RegisterNetEvent", "RegisterServerEvent", "AddEventHandler", "AddStateBagChangeHandler",
+])
+_LUA_FUNCTION_DEF = re.compile(r"(?:local\s+)?function\s+([\w.:]+)")
+_LUA_CALL = re.compile(r"""([\w.:]+)\s*\(\s*(?:(["'`])(.*?)\2)?""")
+_LUA_ASSIGNMENT = re.compile(r"(?:local\s+)?([^=\n]+?)\s*=[^=]")
+
+def _classify_lua_statement(text):
+    """Derive (kind, name) for a top-level statement from its source text."""
+    m = _LUA_FUNCTION_DEF.match(text)
+    if m:
+        return "function", m.group(1)
+    m = _LUA_CALL.match(text)
+    if m:
+        callee = m.group(1)
+        kind = "event" if callee.rsplit(".", 1)[-1] in _LUA_EVENT_CALLS else "callback"
+        return kind, m.group(3) or callee
+    m = _LUA_ASSIGNMENT.match(text)
+    if m:
+        return "function", m.group(1).strip()
+    return "block", text.split(None, 1)[0] if text.strip() else ""
+
+def lua_block_spans(code):
+    """
+    Single pass over the token stream of `code`, yielding a CodeBlock for every
+    top-level statement that defines a function: `function`/`local function`
+    definitions, `x = function` assignments and calls taking a function such
+    as RegisterNetEvent, RegisterNUICallback or CreateThread. Nesting follows
+    function/if/do/repeat ... end/until plus brackets, and strings, comments
+    and [[long brackets]] never affect it.
+    """
+    depth = 0  # open function/if/do/repeat blocks
+    brackets = 0  # open ( { [
+    stmt_start = None
+    has_function = False
+    prev_value, prev_end = None, 0
+    line_no, line_pos = 1, 0  # line numbers are counted lazily, only for emitted blocks
+    pos, length = 0, len(code)
+
+    while pos < length:
+        top_level = depth == 0 and brackets == 0
+        if top_level:
+            m = _LUA_TOKEN.search(code, pos)
+        else:
+            m = (_LUA_KEYWORDS if depth else _LUA_BRACKETS).search(code, pos)
+        if m is None:
+            break
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "comment":
+            continue
+        value = m.group()
+        start = m.start()
+
+        if top_level:
+            if value == ";":
+                # The next token starts a statement, wherever it is.
+                stmt_start, has_function = None, False
+                prev_value, prev_end = value, pos
+                continue
+            new_line = stmt_start is None or code.find("\n", prev_end, start) != -1
+            if stmt_start is None or (new_line and prev_value not in _LUA_CONTINUATION):
+                stmt_start, has_function = start, False
+
+        closed = False
+        if kind == "name":
+            if value in ("function", "if", "do", "repeat"):
+                depth += 1
+                has_function = has_function or value == "function"
+            elif value in ("end", "until") and depth > 0:
+                depth -= 1
+                closed = True
+        elif kind == "op":
+            if value in ("(", "{", "["):
+                brackets += 1
+            elif value in (")", "}", "]") and brackets > 0:
+                brackets -= 1
+                closed = True
+
+        if closed and depth == 0 and brackets == 0 and has_function:
+            # The statement's own span, so two blocks sharing a line don't both
+            # take the whole line; indentation is kept when it starts the line.
+            block_start = code.rfind("\n", 0, stmt_start) + 1
+            if code[block_start:stmt_start].strip():
+                block_start = stmt_start
+            line_no += code.count("\n", line_pos, stmt_start)
+            start_line = line_no
+            line_no += code.count("\n", stmt_start, pos - 1)
+            line_pos = pos - 1
+            block_kind, name = _classify_lua_statement(code[stmt_start:stmt_start + 256])
+            yield CodeBlock(block_kind, name, start_line, line_no, code[block_start:pos])
+            stmt_start, has_function = None, False
+
+        prev_value, prev_end = value, pos
+
 def extract_lua_blocks(code):
-    blocks, stack, start, lines = [], 0, 0, code.splitlines()
-    for i, line in enumerate(lines):
-        if re.match(r'\s*function\b', line) or 'RegisterNetEvent' in line or 'RegisterNUICallback' in line:
-            if stack == 0:
-                start = i
-            stack += 1
-        if re.match(r'\s*end\b', line) and stack > 0:
-            stack -= 1
-            if stack == 0 and i > start:
-                block = '\n'.join(lines[start:i+1])
-                if len(block.strip()) > 80:
-                    blocks.append(block[:CHUNK_LIMIT])
-    return blocks or [code[:CHUNK_LIMIT]]
+    return _block_windows(lua_block_spans(code), code, ".lua", lambda b: len(b.text.strip()) > 80)
 
-def extract_js_blocks(code):
+_JS_TOKEN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<template>`)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<number>\.?\d[\w.]*)
+  | (?P<op>=>|\?\.|\.\.\.|[^\s\w])
+""", re.VERBOSE | re.DOTALL)
+# Rest of a template literal up to its closing backtick or the next ${.
+_JS_TEMPLATE_BODY = re.compile(r"(?:\\.|\$(?!\{)|[^`\\$])*(`|\$\{)?", re.DOTALL)
+_JS_REGEX_LITERAL = re.compile(r"/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*")
+# After these a "/" starts a regex literal rather than a division.
+_JS_REGEX_PREFIX = frozenset("( , = : [ ! & | ? { } ; + - * % < > ~ ^ => return typeof case do else".split())
+# A line ending in one of these continues the statement on the next line...
+_JS_CONTINUATION = frozenset(". ?. , = ( [ { : ? + - * / % & | ^ ! ~ < > => new typeof in instanceof extends else".split())
+# ...and so does a line starting with one of these.
+_JS_LEADING_CONTINUATION = frozenset(". ?. , = : ? + - * / % & | ^ < > => ) ] } else catch finally".split())
+_JS_FUNCTION_DEF = re.compile(r"(?:export\s+)?(?:default\s+)?(?:async\s+)?(function\*?|class)\s*([\w$]*)")
+_JS_BINDING = re.compile(r"(?:export\s+)?(?:const|let|var)\s+([\w$]+)|([\w$.]+)\s*=[^=>]")
+_JS_LISTENER = re.compile(r"""([\w$.()'"\[\]]*?)\.?(addEventListener|on|\$on)\s*\(\s*(["'`])(.*?)\3""")
+_JS_CALL = re.compile(r"(?:async\s+)?([\w$.]+)\s*\(")
+
+class _JsFrame:
+    __slots__ = ("opener", "stmt_start", "has_function", "is_class", "class_pending")
+
+    def __init__(self, opener, is_class=False):
+        self.opener = opener
+        self.stmt_start = None
+        self.has_function = False
+        self.is_class = is_class
+        self.class_pending = False
+
+def _classify_js_statement(text, in_class):
+    """Derive (kind, name) for a JS statement from its source text."""
+    m = _JS_FUNCTION_DEF.match(text)
+    if m:
+        return ("class" if m.group(1) == "class" else "function"), m.group(2)
+    m = _JS_LISTENER.match(text)
+    if m:
+        return "handler", m.group(4)
+    if in_class:
+        m = _JS_CALL.match(text)
+        if m:
+            return "method", m.group(1)
+    m = _JS_BINDING.match(text)
+    if m:
+        return "function", m.group(1) or m.group(2)
+    m = _JS_CALL.match(text)
+    if m:
+        return "callback", m.group(1)
+    return "block", text.split(None, 1)[0] if text.strip() else ""
+
+def _nest_blocks(blocks, code):
+    """
+    Keep the outermost blocks, but swap any block over the token budget for the
+    blocks nested inside it (e.g. the handlers inside a DOMContentLoaded
+    wrapper), then attach line numbers.
+    """
+    blocks.sort(key=lambda b: (b[0], -b[1]))
+    roots, stack = [], []
+    for block in blocks:
+        node = (block, [])
+        while stack and stack[-1][0][1] <= block[0]:
+            stack.pop()
+        (stack[-1][1] if stack else roots).append(node)
+        stack.append(node)
+
+    selected = []
+    budget = block_token_budget()
+
+    def select(node):
+        (start, end, kind, name), children = node
+        if children and estimate_tokens(code[start:end]) > budget:
+            for child in children:
+                select(child)
+        else:
+            selected.append((start, end, kind, name))
+
+    for root in roots:
+        select(root)
+
+    line_no, line_pos = 1, 0
+    for start, end, kind, name in selected:
+        block_start = code.rfind("\n", 0, start) + 1
+        line_no += code.count("\n", line_pos, start)
+        start_line = line_no
+        line_no += code.count("\n", start, end)
+        line_pos = end
+        yield CodeBlock(kind, name, start_line, line_no, code[block_start:end])
+
+def js_block_spans(code):
+    """
+    Single pass over the token stream of `code` that matches braces, strings,
+    template literals (including nested ${...}), regex literals and comments.
+    Yields a CodeBlock for every function, class, method, event handler or
+    callback registration; oversized wrappers are replaced by what they contain.
+    """
+    frames = [_JsFrame("top")]
     blocks = []
-    pattern = re.compile(r'(function\s+\w+\s*\(|window\.addEventListener|fetch\(|postMessage)', re.MULTILINE)
-    matches = list(pattern.finditer(code))
-    for i, match in enumerate(matches):
-        start = match.start()
-        end = matches[i+1].start() if i+1 < len(matches) else len(code)
-        block = code[start:end]
-        if len(block.strip()) > 80:
-            blocks.append(block[:CHUNK_LIMIT])
-    return blocks or [code[:CHUNK_LIMIT]]
+    prev_value, prev_end = None, 0
+    pos, length = 0, len(code)
+
+    def statement_frame():
+        for frame in reversed(frames):
+            if frame.opener in ("{", "top"):
+                return frame
+        return frames[0]
+
+    def close_statement(frame, end):
+        if frame.stmt_start is not None and frame.has_function:
+            text = code[frame.stmt_start:frame.stmt_start + 256]
+            kind, name = _classify_js_statement(text, frame.is_class)
+            blocks.append((frame.stmt_start, end, kind, name))
+            # A statement containing a function block is itself a block.
+            ancestors = frames[:frames.index(frame)] if frame in frames else frames
+            for outer in reversed(ancestors):
+                if outer.opener in ("{", "top"):
+                    outer.has_function = True
+                    break
+        frame.stmt_start, frame.has_function = None, False
+
+    def resume_template(at):
+        m = _JS_TEMPLATE_BODY.match(code, at)
+        if m.group(1) == "${":
+            frames.append(_JsFrame("${"))
+        return m.end()
+
+    while pos < length:
+        m = _JS_TOKEN.search(code, pos)
+        if m is None:
+            break
+        kind, value, start = m.lastgroup, m.group(), m.start()
+        pos = m.end()
+        if kind == "comment":
+            continue
+        if value == "/" and (prev_value is None or prev_value in _JS_REGEX_PREFIX):
+            rm = _JS_REGEX_LITERAL.match(code, start)
+            if rm:
+                kind, value, pos = "string", rm.group(), rm.end()
+
+        frame = frames[-1]
+        if frame.opener in ("{", "top") and value not in ("}", ";"):
+            new_line = code.find("\n", prev_end, start) != -1
+            if frame.stmt_start is None or (new_line and prev_value not in _JS_CONTINUATION
+                                            and value not in _JS_LEADING_CONTINUATION):
+                close_statement(frame, prev_end)
+                frame.stmt_start = start
+
+        if kind == "template":
+            pos = resume_template(pos)
+        elif kind == "name":
+            if value in ("function", "class"):
+                statement_frame().has_function = True
+                if value == "class":
+                    frame.class_pending = True
+        elif value == "=>":
+            statement_frame().has_function = True
+        elif value in ("{", "(", "["):
+            if value == "{" and frame.is_class:
+                frame.has_function = True  # method body
+            frames.append(_JsFrame(value, is_class=value == "{" and frame.class_pending))
+            if value == "{":
+                frame.class_pending = False
+        elif value in ("}", ")", "]") and len(frames) > 1:
+            closing = frames.pop()
+            if closing.opener in ("{", "top"):
+                close_statement(closing, start)
+            if closing.opener == "${":
+                pos = resume_template(pos)
+        elif value == ";" and frame.opener in ("{", "top"):
+            close_statement(frame, pos)
+
+        prev_value, prev_end = value, pos
+
+    for frame in reversed(frames):
+        if frame.opener in ("{", "top"):
+            close_statement(frame, length)
+    return list(_nest_blocks(blocks, code))
+
+def extract_js_blocks(code):
+    return _block_windows(js_block_spans(code), code, ".js", lambda b: len(b.text.strip()) > 80)
+
+_CSS_TOKEN = re.compile(r"""/\*.*?\*/|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|[{}]""", re.DOTALL)
+
+def css_block_spans(code):
+    """
+    Split a stylesheet at top-level rule boundaries (an @media/@keyframes group
+    counts as one rule) and pack consecutive rules into groups that fit the
+    token budget. Comments ahead of a rule stay with it.
+    """
+    rules, depth, rule_start = [], 0, 0
+    for m in _CSS_TOKEN.finditer(code):
+        value = m.group()
+        if value == "{":
+            depth += 1
+        elif value == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                rules.append((rule_start, m.end()))
+                rule_start = m.end()
+
+    groups, budget = [], block_token_budget()
+    for start, end in rules:
+        tokens = estimate_tokens(code[start:end])
+        if groups and groups[-1][2] + tokens <= budget:
+            groups[-1][1] = end
+            groups[-1][2] += tokens
+        else:
+            groups.append([start, end, tokens])
+
+    line_no, line_pos = 1, 0
+    for start, end, _ in groups:
+        text = code[start:end]
+        start += len(text) - len(text.lstrip())
+        text = code[start:end]
+        selector = re.sub(r"/\*.*?\*/", "", text.split("{", 1)[0], flags=re.DOTALL).strip()
+        line_no += code.count("\n", line_pos, start)
+        start_line = line_no
+        line_no += text.count("\n")
+        line_pos = end
+        yield CodeBlock("rules", selector[:80], start_line, line_no, text)
+
+def extract_css_blocks(code):
+    return _block_windows(css_block_spans(code), code, ".css", lambda b: len(b.text) > 80)
+
+_HTML_EMBEDDED = re.compile(r"<(script|style)\b([^>]*)>(.*?)</\1\s*>", re.DOTALL | re.IGNORECASE)
+
+def html_block_spans(code):
+    """Blocks from inline <script> and <style> elements, with page line numbers."""
+    for m in _HTML_EMBEDDED.finditer(code):
+        body = m.group(3)
+        if not body.strip():
+            continue  # <script src=...></script>
+        offset = code.count("\n", 0, m.start(3))
+        spans = js_block_spans(body) if m.group(1).lower() == "script" else css_block_spans(body)
+        for block in spans:
+            yield block._replace(start_line=block.start_line + offset,
+                                 end_line=block.end_line + offset)
 
 def extract_html_blocks(code):
-    blocks = re.findall(r'<script[\s\S]*?</script>', code)
-    return [b[:CHUNK_LIMIT] for b in blocks] or [code[:CHUNK_LIMIT]]
+    return _block_windows(html_block_spans(code), code, ".html", lambda b: len(b.text.strip()) > 80)
+
+# Vendored libraries and content-hashed chunks are not worth a request. dist/,
+# build/ and lib/ alone are not enough: resources keep their own code there too.
+_LIBRARY_NAMES = (r"jquery|bootstrap|vue|react|preact|axios|lodash|underscore|tailwind|popper|moment"
+                  r"|chart\.?js|font ?awesome|howler|swiper|select2|sweetalert2?|socket\.io|three\.js"
+                  r"|gsap|anime\.js|normalize\.css|animate\.css|alpine")
+_VENDOR_PATH = re.compile(
+    r"(\.min\.(js|css)$|(^|/)(vendor|vendors|node_modules)/"
+    rf"|(^|/)({_LIBRARY_NAMES})[\w.-]*\.(js|css)$"
+    r"|[.-][0-9a-f]{8,}\.(js|css)$)", re.IGNORECASE)
+_BUILD_PATH = re.compile(r"(^|/)(dist|build|lib)/", re.IGNORECASE)
+# /*! and @license comments are the ones bundlers and minifiers preserve.
+_LICENSE_BANNER = re.compile(r"^\s*/\*(!|\*?\s*@license)", re.IGNORECASE)
+_LIBRARY_BANNER = re.compile(rf"^\s*/\*[!*]?[^\n]*\b({_LIBRARY_NAMES})\b", re.IGNORECASE)
+
+def bundled_asset_reason(rel_path, text):
+    """
+    Why a file is a minified bundle or vendored library, or None for code worth
+    crawling. `rel_path` is relative to the resource so folders above it cannot
+    match. Copyright and version banners are common in first-party code, so a
+    banner only counts when it names a known library, or is a preserved
+    license comment in build output.
+    """
+    rel_path = rel_path.replace("\\", "/")
+    if _VENDOR_PATH.search(rel_path):
+        return "vendored"
+    if len(text) > 2000:
+        lines = text.count("\n") + 1
+        if len(text) / lines > 250 or max(map(len, text.splitlines())) > 5000:
+            return "minified"  # very long lines
+    head = text[:300]
+    if _LIBRARY_BANNER.match(head):
+        return "library banner"
+    if _BUILD_PATH.search(rel_path) and _LICENSE_BANNER.match(head):
+        return "licensed build output"
+    return None
 
 def extract_blocks(text, ext):
     if ext == '.lua':
@@ -101,196 +631,2106 @@ def extract_blocks(text, ext):
         return extract_js_blocks(text)
     elif ext == '.html':
         return extract_html_blocks(text)
+    elif ext == '.css':
+        return extract_css_blocks(text)
     else:
-        return [text[:CHUNK_LIMIT]]
+        return split_block(CodeBlock("file", "", 1, text.count("\n") + 1, text), ext)
 
 # --------------------------------------
-# LLM CALLER
+# FXMANIFEST PARSER
+# --------------------------------------
+_MANIFEST_TOKEN = re.compile(rf"""
+    (?P<comment>{_LUA_COMMENT})
+  | (?P<string>{_LUA_STRING})
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<number>\d[\w.]*)
+  | (?P<op>\S)
+""", re.VERBOSE | re.DOTALL)
+# Singular and plural directives collect into the same list.
+MANIFEST_LIST_KEYS = {
+    "client_script": "client_scripts", "client_scripts": "client_scripts",
+    "server_script": "server_scripts", "server_scripts": "server_scripts",
+    "shared_script": "shared_scripts", "shared_scripts": "shared_scripts",
+    "file": "files", "files": "files",
+    "dependency": "dependencies", "dependencies": "dependencies",
+    "game": "games", "games": "games",
+    "export": "exports", "exports": "exports",
+    "server_export": "server_exports", "server_exports": "server_exports",
+    "provide": "provides", "provides": "provides",
+}
+SCRIPT_KEYS = ["client_scripts", "server_scripts", "shared_scripts", "files"]
+
+def _unquote(token):
+    if token.startswith("["):
+        return token[token.index("[", 1) + 1:token.rindex("]", 0, -1)].lstrip("\n")
+    return re.sub(r"\\(.)", r"\1", token[1:-1])
+
+def _manifest_args(tokens, i):
+    """Collect the call arguments starting at tokens[i]: strings, tables and (...) lists."""
+    args = []
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == "string":
+            args.append(_unquote(value))
+            i += 1
+        elif value in ("{", "("):
+            closer = "}" if value == "{" else ")"
+            depth, i = 1, i + 1
+            while i < len(tokens) and depth:
+                kind, value = tokens[i]
+                if value in ("{", "("):
+                    depth += 1
+                elif value in ("}", ")"):
+                    depth -= 1
+                elif kind == "string" and not (i + 1 < len(tokens) and tokens[i + 1][1] == "="):
+                    args.append(_unquote(value))
+                i += 1
+            if closer == ")":
+                break  # f('a', 'b') is one complete call
+        else:
+            break
+    return args, i
+
+def parse_manifest_text(data):
+    """
+    Parse the Lua subset used by fxmanifest.lua: directive calls written as
+    `key 'value'`, `key { 'a', 'b' }`, `key('a')` or chained like
+    `data_file 'TYPE' 'path'`. Comments, including --[[ blocks ]], are ignored.
+    """
+    tokens = [(m.lastgroup, m.group()) for m in _MANIFEST_TOKEN.finditer(data)
+              if m.lastgroup != "comment"]
+    fx = {}
+    i = 0
+    while i < len(tokens):
+        kind, key = tokens[i]
+        i += 1
+        if kind != "name" or (i < len(tokens) and tokens[i][1] in ("=", ".", ":")):
+            continue  # not a directive (local variables, lib calls, ...)
+        is_table = i < len(tokens) and tokens[i][1] == "{"
+        args, i = _manifest_args(tokens, i)
+        if not args:
+            continue
+        if key in MANIFEST_LIST_KEYS:
+            fx.setdefault(MANIFEST_LIST_KEYS[key], []).extend(args)
+        elif key == "data_file":
+            fx.setdefault("data_files", []).append(args)
+        elif len(args) == 1 and not is_table:
+            fx[key] = args[0]
+        else:
+            fx[key] = args
+    return fx
+
+_manifest_cache = {}  # path -> (mtime_ns, size, fx)
+
+def parse_fxmanifest(path):
+    """Parse a manifest, reusing the previous result while its mtime and size hold."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+    cached = _manifest_cache.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    fx = parse_manifest_text(safe_read(path))
+    _manifest_cache[path] = (st.st_mtime_ns, st.st_size, fx)
+    return fx
+
+resource_index = {}  # resource name -> directory, filled in during discovery
+
+def resolve_reference(pattern):
+    """Resolve an '@resource/path' manifest entry through resource_index."""
+    name, _, rel = pattern[1:].partition("/")
+    resource_dir = resource_index.get(name)
+    if resource_dir is None:
+        return None, None
+    return resource_dir, os.path.join(resource_dir, rel)
+
+# --------------------------------------
+# METRICS
+# --------------------------------------
+# Resource the current task is working on, so deep calls (the Ollama client)
+# can attribute their numbers without threading it through every signature.
+current_resource = contextvars.ContextVar("current_resource", default=None)
+
+class CrawlMetrics:
+    """
+    Counters and stage timers for the whole crawl.
+
+    Counters only grow (blocks, tokens, retries, ...); timers keep count, total
+    and max seconds per stage. With profiling on, the same numbers are also
+    kept per resource and written out by write_profile() at the end of each
+    epoch.
+    """
+
+    def __init__(self, profile=PROFILE):
+        self.profile = profile
+        self.started = time.time()
+        self.counters = {}
+        self.timers = {}
+        self.gauges = {}
+        self.resources = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, resource=None):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if self.profile:
+                resource = resource or current_resource.get()
+                if resource:
+                    stats = self.resources.setdefault(resource, {})
+                    stats[name] = stats.get(name, 0) + value
+
+    def observe(self, name, seconds, resource=None):
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+            if self.profile:
+                resource = resource or current_resource.get()
+                if resource:
+                    stats = self.resources.setdefault(resource, {})
+                    stats[name + "_seconds"] = stats.get(name + "_seconds", 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name, resource=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, resource)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            timers = {name: {"count": c, "seconds": round(total, 3), "max": round(peak, 3),
+                             "avg": round(total / c, 4) if c else 0.0}
+                      for name, (c, total, peak) in self.timers.items()}
+            gauges = dict(self.gauges)
+        uptime = time.time() - self.started
+        eval_seconds = counters.get("llm_eval_ns", 0) / 1e9
+        prompt_seconds = counters.get("llm_prompt_eval_ns", 0) / 1e9
+        return {
+            "uptime_seconds": round(uptime, 1),
+            "blocks_per_second": round(counters.get("blocks_answered", 0) / uptime, 3) if uptime else 0.0,
+            "tokens_per_second": round(counters.get("llm_eval_tokens", 0) / uptime, 2) if uptime else 0.0,
+            # Ollama's own timings, so these are model speed without queueing or HTTP.
+            "eval_tokens_per_second": round(counters.get("llm_eval_tokens", 0) / eval_seconds, 2)
+                                      if eval_seconds else 0.0,
+            "prompt_tokens_per_second": round(counters.get("llm_prompt_tokens", 0) / prompt_seconds, 2)
+                                        if prompt_seconds else 0.0,
+            "counters": counters,
+            "timers": timers,
+            "gauges": gauges,
+        }
+
+    def prometheus(self):
+        snap = self.snapshot()
+        lines = []
+        for name in ("uptime_seconds", "blocks_per_second", "tokens_per_second",
+                     "eval_tokens_per_second", "prompt_tokens_per_second"):
+            lines += [f"# TYPE fivem_crawler_{name} gauge", f"fivem_crawler_{name} {snap[name]}"]
+        for name, value in sorted(snap["counters"].items()):
+            lines += [f"# TYPE fivem_crawler_{name}_total counter", f"fivem_crawler_{name}_total {value}"]
+        for name, value in sorted(snap["gauges"].items()):
+            lines += [f"# TYPE fivem_crawler_{name} gauge", f"fivem_crawler_{name} {value}"]
+        for name, timer in sorted(snap["timers"].items()):
+            lines += [f"# TYPE fivem_crawler_{name}_seconds summary",
+                      f"fivem_crawler_{name}_seconds_count {timer['count']}",
+                      f"fivem_crawler_{name}_seconds_sum {timer['seconds']}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=METRICS_PATH, fmt=METRICS_FORMAT):
+        if not path:
+            return
+        if fmt == "prometheus":
+            path = os.path.splitext(path)[0] + ".prom"
+            data = self.prometheus()
+        else:
+            data = json.dumps(self.snapshot(), indent=2)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def write_profile(self, directory=PROFILE_DIR):
+        """Write and reset the per-resource breakdown; returns the file written."""
+        with self._lock:
+            resources, self.resources = self.resources, {}
+        if not resources:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"epoch-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"finished": datetime.utcnow().isoformat(),
+                       "resources": {name: {k: round(v, 4) for k, v in stats.items()}
+                                     for name, stats in resources.items()}}, f, indent=2)
+        slowest = sorted(resources.items(), key=lambda kv: kv[1].get("llm_request_seconds", 0),
+                         reverse=True)[:5]
+        print(f"[Profile] {len(resources)} resources -> {path}")
+        for name, stats in slowest:
+            print(f"[Profile]   {name}: {stats.get('blocks_answered', 0)} blocks, "
+                  f"LLM {stats.get('llm_request_seconds', 0):.1f}s, "
+                  f"extract {stats.get('extract_seconds', 0):.2f}s, "
+                  f"queue wait {stats.get('queue_wait_seconds', 0):.1f}s, "
+                  f"{stats.get('llm_eval_tokens', 0)} tokens")
+        return path
+
+metrics = CrawlMetrics()
+
+# --------------------------------------
+# LLM WORKER POOL
 # --------------------------------------
-ollama_lock = asyncio.Lock()
+class LLMWorkerPool:
+    """
+    Bounds the number of requests in flight against Ollama.
+
+    In adaptive mode the limit starts at MIN_CONCURRENCY and is re-evaluated
+    every `window` completions: it grows by one while the median latency stays
+    within `latency_tolerance` of the baseline, shrinks in proportion once
+    latency climbs past that, and is halved when the error rate of the window
+    exceeds `error_threshold`. The baseline is the best median seen, drifting
+    up towards every slower one by `baseline_decay`, so one unusually fast
+    window doesn't hold the limit down for good.
+
+    Slots are handed over in arrival order: a finishing request passes its
+    slot straight to the oldest waiter instead of releasing it for whoever
+    runs next.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, adaptive=ADAPTIVE_CONCURRENCY,
+                 min_concurrency=MIN_CONCURRENCY, window=8, latency_tolerance=2.0,
+                 error_threshold=0.25, baseline_decay=0.2):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.adaptive = adaptive
+        self.limit = self.min_concurrency if adaptive else self.max_concurrency
+        self.in_flight = 0
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.baseline_decay = baseline_decay
+        self._samples = []
+        self._best_latency = None
+        self._waiters = deque()  # futures of callers waiting for a slot, oldest first
+
+    async def _acquire(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter  # resolved by _hand_over, which has already counted the slot
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # handed over just as we were cancelled; pass it on
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._hand_over()
+
+    def _hand_over(self):
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def run(self, fn, *args, **kwargs):
+        """Await a free slot, run `fn(*args, **kwargs)` and record the outcome."""
+        with metrics.timer("llm_slot_wait"):
+            await self._acquire()
 
-async def query_llm(payload, max_retries=3, retry_delay=30):
+        start = time.monotonic()
+        ok = False
+        try:
+            result = await fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self._record(time.monotonic() - start, ok)
+            self._release()
+
+    def _record(self, latency, ok):
+        if not self.adaptive:
+            return
+        self._samples.append((latency, ok))
+        if len(self._samples) < self.window:
+            return
+
+        errors = sum(1 for _, good in self._samples if not good)
+        latencies = sorted(lat for lat, good in self._samples if good)
+        self._samples = []
+        old_limit = self.limit
+
+        if errors / self.window > self.error_threshold or not latencies:
+            self.limit = max(self.min_concurrency, self.limit // 2)
+        else:
+            median = latencies[len(latencies) // 2]
+            if self._best_latency is None or median < self._best_latency:
+                self._best_latency = median
+            else:
+                self._best_latency += (median - self._best_latency) * self.baseline_decay
+            gradient = min(1.0, max(0.5, self._best_latency * self.latency_tolerance / median))
+            self.limit = int(self.limit * gradient) + (1 if gradient >= 1.0 else 0)
+            self.limit = max(self.min_concurrency, min(self.max_concurrency, self.limit))
+
+        if self.limit != old_limit:
+            print(f"[Pool] Concurrency {old_limit} -> {self.limit} "
+                  f"(errors {errors}/{self.window})")
+
+llm_pool = LLMWorkerPool()
+
+# --------------------------------------
+# LLM CALLER
+# --------------------------------------
+class OllamaClient:
     """
-    Send one request at a time to Ollama and retry automatically if the runner dies.
+    Long-lived Ollama client owning one keep-alive connection pool.
+
+    Failed attempts back off with jittered exponential delays on the event loop.
+    After BREAKER_THRESHOLD consecutive failures the circuit opens: new requests
+    wait for BREAKER_COOLDOWN while the runner is restarted, then a single probe
+    request decides whether dispatch resumes or the breaker opens again.
     """
-    async with ollama_lock:
-        for attempt in range(1, max_retries + 1):
+
+    def __init__(self, url=OLLAMA_URL, pool=None, max_retries=MAX_RETRIES,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 failure_threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN,
+                 request_timeout=REQUEST_TIMEOUT):
+        self.url = url
+        self.pool = pool or llm_pool
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.request_timeout = request_timeout
+        # Only a runner on this machine can be restarted with the ollama CLI.
+        self.local = urlsplit(url).hostname in ("localhost", "127.0.0.1", "::1")
+        self.outstanding = 0  # routed here and not finished, including waits for a slot
+        self.latency = None  # moving average of successful request seconds
+        self.models = set()  # models this node answered with, so presumably has loaded
+        self.served = 0
+        self._session = None
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._restart_task = None
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool.max_concurrency,
+                                             keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # ---- circuit breaker ----
+    @property
+    def ejected(self):
+        return self._failures >= self.failure_threshold
+
+    def readmit(self):
+        self._failures = 0
+        self._open_until = 0.0
+
+    async def healthy(self):
+        """Whether the server answers /api/version; says nothing about the runner."""
+        url = urlunsplit(urlsplit(self.url)._replace(path="/api/version", query=""))
+        try:
+            session = await self._get_session()
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                return resp.status == 200
+        except Exception:
+            return False
+
+    async def _wait_for_circuit(self):
+        while True:
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+            if self._failures < self.failure_threshold:
+                return False  # closed
+            if not self._probing:
+                self._probing = True
+                return True  # half-open: this caller is the probe
+            await asyncio.sleep(1)
+
+    def _record_success(self):
+        if self._failures >= self.failure_threshold:
+            print("[Ollama] Runner is back, resuming dispatch.")
+        self._failures = 0
+
+    def _record_failure(self, model):
+        self._failures += 1
+        if self._failures >= self.failure_threshold and self._open_until <= time.monotonic():
+            self._open_until = time.monotonic() + self.cooldown
+            print(f"[Ollama] {self.url}: {self._failures} consecutive failures, pausing dispatch "
+                  f"for {self.cooldown}s" + (" and restarting the runner..." if self.local else "..."))
+            if self.local and (self._restart_task is None or self._restart_task.done()):
+                self._restart_task = asyncio.ensure_future(self._restart_runner(model))
+
+    async def _restart_runner(self, model):
+        # Unloading the model makes Ollama spawn a fresh runner on the next request.
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ollama", "stop", model,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+            await proc.wait()
+        except Exception:
+            pass
+
+    # ---- requests ----
+    async def _chat_once(self, payload):
+        """Stream a single /api/chat request; raises if the runner failed."""
+        session = await self._get_session()
+        async with session.post(self.url, json=payload) as resp:
+            if resp.status != 200:
+                text = await resp.text()
+                raise RuntimeError(f"HTTP {resp.status}: {text}")
+
+            parts, stray = [], []
+            async for line in resp.content:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    stray.append(line.decode(errors="ignore"))
+                    continue
+                if "error" in obj:
+                    raise RuntimeError(f"Ollama error: {obj['error']}")
+                content = obj.get("message", {}).get("content")
+                if content:
+                    parts.append(content)
+                if obj.get("done"):
+                    record_ollama_timings(obj)
+
+            final_text = "".join(parts).strip()
+            if final_text:
+                return final_text
+
+            # fallthrough: no text, maybe a non-JSON error body
+            text = "\n".join(stray)
+            if "exit status 2" in text.lower():
+                raise RuntimeError("Ollama runner crashed")
+            return text
+
+    async def attempt(self, payload):
+        """
+        One request through the worker pool, after any open circuit; raises on
+        failure. The pool slot is held only while the request is in flight.
+        """
+        with metrics.timer("llm_circuit_wait"):
+            probe = await self._wait_for_circuit()
+        self.outstanding += 1
+        start = time.monotonic()
+        try:
+            with metrics.timer("llm_request"):
+                answer = await self.pool.run(self._chat_once, payload)
+            self._record_success()
+            elapsed = time.monotonic() - start
+            self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+            self.models.add(payload.get("model", MODEL))
+            self.served += 1
+            return answer
+        except Exception:
+            self._record_failure(payload.get("model", MODEL))
+            raise
+        finally:
+            self.outstanding -= 1
+            if probe:
+                self._probing = False
+
+    async def query(self, payload):
+        """Send a request and retry automatically if the runner dies."""
+        for attempt in range(1, self.max_retries + 1):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(OLLAMA_URL, json=payload, timeout=600) as resp:
-                        if resp.status != 200:
-                            text = await resp.text()
-                            raise RuntimeError(f"HTTP {resp.status}: {text}")
-
-                        final_text = ""
-                        async for line in resp.content:
-                            if not line:
-                                continue
-                            try:
-                                obj = json.loads(line.decode().strip())
-                                if "message" in obj and "content" in obj["message"]:
-                                    final_text += obj["message"]["content"]
-                            except Exception:
-                                continue
-
-                        if final_text.strip():
-                            return final_text.strip()
-
-                        # fallthrough: no text, maybe error JSON
-                        text = await resp.text()
-                        if "exit status 2" in text.lower():
-                            raise RuntimeError("Ollama runner crashed")
-                        return text
+                return await self.attempt(payload)
+            except Exception as e:
+                print(f"[Error] Attempt {attempt}/{self.max_retries}: {e}")
+                if attempt == self.max_retries:
+                    metrics.inc("llm_failures")
+                    return f"[Error: {e}]"
+                metrics.inc("llm_retries")
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                print(f"[Ollama] Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+def record_ollama_timings(final):
+    """Count the token and duration fields of Ollama's final stream object."""
+    for field, name in (("eval_count", "llm_eval_tokens"), ("eval_duration", "llm_eval_ns"),
+                        ("prompt_eval_count", "llm_prompt_tokens"),
+                        ("prompt_eval_duration", "llm_prompt_eval_ns"),
+                        ("load_duration", "llm_load_ns"), ("total_duration", "llm_total_ns")):
+        if final.get(field):
+            metrics.inc(name, final[field])
+
+ollama_client = OllamaClient()
+
+class OllamaRouter:
+    """
+    Spreads requests over several Ollama endpoints, each an OllamaClient with
+    its own worker pool (concurrency limit) and circuit breaker.
+
+    Every attempt goes to the healthy endpoint with the fewest outstanding
+    requests per slot of its current limit ("least_outstanding"), optionally
+    weighted by its recent latency ("latency"). Endpoints that have not yet
+    answered with the requested model count one full load higher, so
+    requests stay with nodes that have it loaded until those are saturated.
+    A node whose breaker opens is ejected: it gets no traffic until a health
+    probe of its server succeeds. Retries go to the best endpoint at that
+    moment and back off only when that is the node that just failed.
+    """
+
+    def __init__(self, clients, routing=ROUTING, keep_alive=KEEP_ALIVE,
+                 probe_interval=HEALTH_PROBE_INTERVAL, max_retries=MAX_RETRIES,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.clients = clients
+        self.routing = routing
+        self.keep_alive = keep_alive
+        self.probe_interval = probe_interval
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._probe_task = None
+
+    # Pool-like totals, so the pipeline can size and report itself.
+    @property
+    def max_concurrency(self):
+        return sum(c.pool.max_concurrency for c in self.clients)
+
+    @property
+    def limit(self):
+        return sum(c.pool.limit for c in self.clients if not c.ejected)
 
+    @property
+    def in_flight(self):
+        return sum(c.pool.in_flight for c in self.clients)
+
+    def _score(self, client, model):
+        load = (client.outstanding + 1) / client.pool.limit
+        if model not in client.models:
+            load += 1
+        if self.routing == "latency":
+            # An idle node's estimate can't improve without traffic, so it is
+            # scored with the best one rather than starved by one slow sample.
+            best = min((c.latency for c in self.clients if c.latency is not None), default=1.0)
+            load *= client.latency if client.outstanding and client.latency is not None else best
+        return load
+
+    def pick(self, model):
+        healthy = [c for c in self.clients if not c.ejected]
+        if not healthy:
+            # Everything is down: queue on whichever breaker reopens first.
+            return min(self.clients, key=lambda c: c._open_until)
+        return min(healthy, key=lambda c: self._score(c, model))
+
+    async def query(self, payload):
+        if self.keep_alive is not None:
+            payload = dict(payload, keep_alive=self.keep_alive)
+        model = payload.get("model", MODEL)
+        if len(self.clients) > 1 and (self._probe_task is None or self._probe_task.done()):
+            self._probe_task = asyncio.ensure_future(self._probe_loop())
+        for attempt in range(1, self.max_retries + 1):
+            client = self.pick(model)
+            try:
+                return await client.attempt(payload)
             except Exception as e:
-                print(f"[Error] Attempt {attempt}/{max_retries}: {e}")
-                if attempt < max_retries:
-                    print(f"[Ollama] Restarting server and retrying in {retry_delay}s...")
-                    try:
-                        subprocess.run(["ollama", "stop", "all"], check=False)
-                    except Exception:
-                        pass
-                    time.sleep(retry_delay)
-                    continue
-                else:
+                print(f"[Error] {client.url} attempt {attempt}/{self.max_retries}: {e}")
+                if attempt == self.max_retries:
+                    metrics.inc("llm_failures")
                     return f"[Error: {e}]"
+                metrics.inc("llm_retries")
+                if self.pick(model) is client:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                    print(f"[Ollama] Retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            for client in self.clients:
+                if client.ejected and client._open_until <= time.monotonic():
+                    if await client.healthy():
+                        print(f"[Router] {client.url} is healthy again, re-admitting it.")
+                        client.readmit()
+                    else:
+                        client._open_until = time.monotonic() + client.cooldown
+
+    def snapshot(self):
+        return [{"url": c.url, "limit": c.pool.limit, "in_flight": c.pool.in_flight,
+                 "outstanding": c.outstanding, "served": c.served, "ejected": c.ejected,
+                 "latency": round(c.latency, 3) if c.latency is not None else None}
+                for c in self.clients]
+
+    async def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        for client in self.clients:
+            await client.close()
+
+def build_router(endpoints=OLLAMA_ENDPOINTS, routing=ROUTING):
+    """Router over `endpoints` ({"url", "concurrency"} dicts), or the single OLLAMA_URL client."""
+    if not endpoints:
+        return OllamaRouter([ollama_client], routing)
+    clients = [OllamaClient(e["url"], LLMWorkerPool(e.get("concurrency", MAX_CONCURRENCY)))
+               for e in endpoints]
+    return OllamaRouter(clients, routing)
+
+def parse_endpoint(spec):
+    """'URL' or 'URL=concurrency' from the command line."""
+    url, sep, concurrency = spec.rpartition("=")
+    if not sep or not concurrency.isdigit():
+        return {"url": spec, "concurrency": MAX_CONCURRENCY}
+    return {"url": url, "concurrency": int(concurrency)}
+
+ollama_router = build_router()
+
+async def query_llm(payload):
+    return await ollama_router.query(payload)
 
 # --------------------------------------
-# MAIN RESOURCE CRAWLER
+# COMPLETION CACHE
 # --------------------------------------
-async def process_resource(resource_dir):
-    fx_path = os.path.join(resource_dir, "fxmanifest.lua")
-    if not os.path.exists(fx_path):
-        return []
+class CompletionCache:
+    """
+    Persistent LRU cache of completions in a small SQLite file.
+
+    Keys come from `cache_key`, so changing the model, prompt templates or
+    sampling options naturally invalidates old answers. Once the table grows
+    past `max_entries` the least recently used tenth is evicted.
+    """
+
+    def __init__(self, path=COMPLETION_CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._db = None
+        self._count = 0
+        self._pending_touches = 0
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                " key TEXT PRIMARY KEY, chunk_id TEXT, completion TEXT,"
+                " created REAL, last_used REAL)")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS completions_last_used ON completions(last_used)")
+            self._count = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return self._db
+
+    def get(self, key):
+        db = self._conn()
+        row = db.execute("SELECT completion FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        db.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+        # Recency updates are cheap to lose, so they are committed in batches.
+        self._pending_touches += 1
+        if self._pending_touches >= 256:
+            db.commit()
+            self._pending_touches = 0
+        return row[0]
+
+    def put(self, key, chunk_id, completion):
+        self.put_many([(key, chunk_id, completion)])
+
+    def put_many(self, entries):
+        """Insert or update (key, chunk_id, completion) tuples in one transaction."""
+        db = self._conn()
+        now = time.time()
+        # Insert-or-ignore first so only keys that are really new add to the count;
+        # a replace reports a changed row too and would make eviction delete live entries.
+        before = db.total_changes
+        db.executemany(
+            "INSERT OR IGNORE INTO completions (key, chunk_id, completion, created, last_used)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [(key, chunk_id, completion, now, now) for key, chunk_id, completion in entries])
+        added = db.total_changes - before
+        if added < len(entries):
+            db.executemany(
+                "UPDATE completions SET chunk_id = ?, completion = ?, last_used = ? WHERE key = ?",
+                [(chunk_id, completion, now, key) for key, chunk_id, completion in entries])
+        self._count += added
+        if self._count > self.max_entries:
+            self._evict()
+        db.commit()
+        self._pending_touches = 0
 
-    fx = parse_fxmanifest(fx_path)
+    def _evict(self):
+        db = self._conn()
+        target = int(self.max_entries * 0.9)
+        self._count = db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        if self._count <= self.max_entries:
+            return
+        db.execute(
+            "DELETE FROM completions WHERE key IN ("
+            " SELECT key FROM completions ORDER BY last_used ASC LIMIT ?)",
+            (self._count - target,))
+        self._count = db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        print(f"[Cache] Evicted down to {self._count} completions.")
+
+    def close(self):
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+completion_cache = CompletionCache()
+
+def cache_key(chunk_id, model=MODEL, options=None, packed=None):
+    """
+    Key a chunk's completion on everything that changes the answer. Packed
+    crawls (PACK_BLOCKS) get keys of their own, so switching it on or off never
+    serves answers written for the other prompt.
+    """
+    options = LLM_OPTIONS if options is None else options
+    packed = PACK_BLOCKS if packed is None else packed
+    prompts = (SYSTEM_PROMPT, USER_PROMPT) + ((PACK_SYSTEM_PROMPT, PACK_BLOCK) if packed else ())
+    return hash_id(chunk_id, model, *prompts, json.dumps(options, sort_keys=True))
+
+# --------------------------------------
+# CONTENT DEDUPLICATION
+# --------------------------------------
+# Comments are dropped, strings kept as they are; everything else is only
+# whitespace-normalised, so renamed code is still different code.
+_STRIP_LUA = re.compile(rf"(?P<comment>{_LUA_COMMENT})|(?P<string>{_LUA_STRING})", re.DOTALL)
+_STRIP_JS = re.compile(r"""(?P<comment>/\*.*?\*/|//[^\n]*)|(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)""",
+                       re.DOTALL)
+_STRIP_CSS = re.compile(r"""(?P<comment>/\*.*?\*/)|(?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""", re.DOTALL)
+_STRIP_HTML = re.compile(r"(?P<comment><!--.*?-->|/\*.*?\*/)|(?P<string>(?!))", re.DOTALL)
+_STRIP = {".lua": _STRIP_LUA, ".js": _STRIP_JS, ".css": _STRIP_CSS, ".html": _STRIP_HTML}
+_SIMHASH_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+def normalize_block(block, ext):
+    """Block text without comments and with every run of whitespace collapsed to one space."""
+    pattern = _STRIP.get(ext)
+    if pattern is not None:
+        block = pattern.sub(lambda m: " " if m.group("comment") else m.group(0), block)
+    return " ".join(block.split())
+
+def simhash(text):
+    """64-bit simhash of the token trigrams of `text`, or None when it is too short to compare."""
+    tokens = _SIMHASH_TOKEN.findall(text)
+    if len(tokens) < FUZZY_MIN_TOKENS:
+        return None
+    weights = [0] * 64
+    for i in range(len(tokens) - 2):
+        h = int.from_bytes(hashlib.blake2b(" ".join(tokens[i:i + 3]).encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+class ContentIndex:
+    """
+    Answers a block whose code was already sent to the model from another
+    resource or file, so forks and vendored copies cost one request in total.
+
+    Answers are stored in the completion cache under a key of the normalised
+    code, right away rather than after the record is written: a content entry
+    never makes a block be skipped, it only saves the request. Identical
+    blocks that arrive while the first one is still being answered wait for
+    it. With fuzzy matching on, blocks whose simhash differs in at most
+    FUZZY_MAX_DISTANCE bits share an answer too; the hashes are kept in the
+    cache's chunk_id column so they survive restarts.
+    """
+
+    BANDS = 4  # 16-bit bands: any two hashes within 3 bits agree on at least one
+
+    def __init__(self, fuzzy=CONTENT_DEDUPE_FUZZY, max_distance=FUZZY_MAX_DISTANCE):
+        self.fuzzy = fuzzy
+        self.max_distance = max_distance
+        self._inflight = {}
+        self._bands = None
+
+    def key(self, block, ext):
+        normalized = normalize_block(block, ext)
+        return cache_key("content:" + hash_id(ext, normalized)), normalized
+
+    def _band_keys(self, h):
+        return [(band, h >> (16 * band) & 0xFFFF) for band in range(self.BANDS)]
+
+    def _load_bands(self):
+        self._bands = {}
+        rows = completion_cache._conn().execute(
+            "SELECT key, chunk_id FROM completions WHERE chunk_id LIKE 'simhash:%'").fetchall()
+        for key, tag in rows:
+            self._add_band(int(tag[len("simhash:"):], 16), key)
+
+    def _add_band(self, h, key):
+        for band in self._band_keys(h):
+            self._bands.setdefault(band, []).append((h, key))
+
+    def _near(self, h):
+        if self._bands is None:
+            self._load_bands()
+        seen = set()
+        for band in self._band_keys(h):
+            for other, key in self._bands.get(band, ()):
+                if key not in seen and bin(h ^ other).count("1") <= self.max_distance:
+                    answer = completion_cache.get(key)
+                    if answer is not None:
+                        return answer
+                    seen.add(key)
+        return None
+
+    def lookup(self, block, ext):
+        """(cached answer or None, content key, simhash or None) for a block."""
+        key, normalized = self.key(block, ext)
+        answer = completion_cache.get(key)
+        if answer is not None:
+            metrics.inc("content_dedupe_hits")
+            return answer, key, None
+        h = simhash(normalized) if self.fuzzy else None
+        if h is not None:
+            answer = self._near(h)
+            if answer is not None:
+                metrics.inc("content_fuzzy_hits")
+        return answer, key, h
+
+    def remember(self, key, h, answer):
+        if answer.startswith("[Error"):
+            return
+        completion_cache.put(key, f"simhash:{h:016x}" if h is not None else "content", answer)
+        if h is not None and self._bands is not None:
+            self._add_band(h, key)
+
+    async def answer(self, block, ext, ask):
+        """The answer for `block`: reused when its content was seen, else from `ask()`."""
+        answer, key, h = self.lookup(block, ext)
+        if answer is not None:
+            return answer
+        while key in self._inflight:
+            # Shielded: a cancelled waiter must not cancel the request it waits on.
+            answer = await asyncio.shield(self._inflight[key])
+            if answer is not None:
+                metrics.inc("content_inflight_hits")
+                return answer
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            answer = await ask()
+            self.remember(key, h, answer)
+            return answer
+        finally:
+            del self._inflight[key]
+            # Waiters ask for themselves when this attempt failed.
+            future.set_result(answer if answer and not answer.startswith("[Error") else None)
+
+content_index = ContentIndex()
+
+# --------------------------------------
+# RESOURCE DISCOVERY
+# --------------------------------------
+def _ignored(name, ignore):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in ignore)
+
+def _scan_dir(path, ignore, is_root=False):
+    """
+    One os.scandir pass over `path`. Returns (is_resource, subdirs); a resource
+    root is not descended into, and ignored or symlinked folders are skipped.
+    """
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name == "fxmanifest.lua" and not is_root:
+                    return True, []
+                try:
+                    if entry.is_dir(follow_symlinks=False) and not _ignored(entry.name, ignore):
+                        subdirs.append(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return False, subdirs
+
+def walk_resources(root_dir=ROOT_DIR, ignore=DISCOVERY_IGNORE, workers=DISCOVERY_WORKERS):
+    """
+    Yield every folder below `root_dir` that contains an fxmanifest.lua, as soon
+    as it is found. With workers > 1 directories are scanned on a thread pool,
+    which pays off on network drives and very wide trees.
+    """
+    if workers <= 1:
+        stack = _scan_dir(root_dir, ignore, is_root=True)[1]
+        while stack:
+            path = stack.pop()
+            is_resource, subdirs = _scan_dir(path, ignore)
+            if is_resource:
+                yield path
+            stack.extend(subdirs)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_scan_dir, path, ignore): path
+                   for path in _scan_dir(root_dir, ignore, is_root=True)[1]}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                is_resource, subdirs = future.result()
+                if is_resource:
+                    yield path
+                for sub in subdirs:
+                    pending[executor.submit(_scan_dir, sub, ignore)] = sub
+
+def discover_resources(root_dir=ROOT_DIR, ignore=DISCOVERY_IGNORE, workers=DISCOVERY_WORKERS):
+    """Recursively find all folders that contain an fxmanifest.lua."""
+    return list(walk_resources(root_dir, ignore, workers))
+
+async def iter_resources(root_dir=ROOT_DIR, ignore=DISCOVERY_IGNORE, workers=DISCOVERY_WORKERS):
+    """Async stream of resource folders; the walk runs on a background thread."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for path in walk_resources(root_dir, ignore, workers):
+                loop.call_soon_threadsafe(queue.put_nowait, path)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    threading.Thread(target=produce, name="resource-discovery", daemon=True).start()
+    while True:
+        path = await queue.get()
+        if path is done:
+            return
+        yield path
+
+# --------------------------------------
+# CHANGE DETECTION
+# --------------------------------------
+def _file_sha1(path):
+    h = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+class FileIndex:
+    """
+    Remembers mtime, size and content hash of every manifest and crawled file.
+
+    A file is only re-hashed when its mtime or size moved, and a resource only
+    counts as changed when a hash differs or its file set changed, so touching
+    a file without editing it does not trigger a new crawl.
+    """
+
+    def __init__(self, path=FILE_INDEX_PATH):
+        self.path = path
+        self.resources = {}
+        self._dirty = False
+        self._last_save = 0.0
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.resources = json.load(f).get("resources", {})
+            except Exception:
+                self.resources = {}
+
+    @staticmethod
+    def _snapshot(path, previous=None):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if previous and previous["mtime"] == st.st_mtime_ns and previous["size"] == st.st_size:
+            return previous
+        return {"mtime": st.st_mtime_ns, "size": st.st_size, "sha1": _file_sha1(path)}
+
+    def check(self, resource_dir, files):
+        """Return (changed, entry); store `entry` with `commit` once it is crawled."""
+        old = self.resources.get(resource_dir, {})
+        old_files = old.get("files", {})
+        entry = {
+            "manifest": self._snapshot(os.path.join(resource_dir, "fxmanifest.lua"),
+                                       old.get("manifest")),
+            "files": {},
+        }
+        for path in files:
+            snap = self._snapshot(path, old_files.get(path))
+            if snap is not None:
+                entry["files"][path] = snap
+
+        def hashes(e):
+            return ((e.get("manifest") or {}).get("sha1"),
+                    {p: f["sha1"] for p, f in e.get("files", {}).items()})
+
+        changed = not old or hashes(old) != hashes(entry)
+        if not changed and entry != old:
+            # Only stat data moved; keep it so the next check skips hashing.
+            self.commit(resource_dir, entry)
+        return changed, entry
+
+    def commit(self, resource_dir, entry):
+        self.resources[resource_dir] = entry
+        self._dirty = True
+
+    def forget(self, resource_dir):
+        """Drop a resource that no longer exists, so it stops showing up as stale."""
+        if self.resources.pop(resource_dir, None) is not None:
+            self._dirty = True
+
+    def prune(self, resource_dirs):
+        """Forget every indexed resource not in `resource_dirs` (a full discovery)."""
+        for resource_dir in set(self.resources) - set(resource_dirs):
+            self.forget(resource_dir)
+
+    def stale_resources(self):
+        """
+        Cheap stat-only sweep over indexed files. Returns {resource_dir: signature}
+        for resources whose files moved or vanished; the signature changes again
+        while the files are still being written.
+        """
+        stale = {}
+        for resource_dir, entry in self.resources.items():
+            paths = [(os.path.join(resource_dir, "fxmanifest.lua"), entry.get("manifest"))]
+            paths += list(entry.get("files", {}).items())
+            signature, moved = [], False
+            for path, snap in paths:
+                try:
+                    st = os.stat(path)
+                    current = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    current = None
+                signature.append(current)
+                if not snap or current != (snap["mtime"], snap["size"]):
+                    moved = True
+            if moved:
+                stale[resource_dir] = tuple(signature)
+        return stale
+
+    def save(self, force=False):
+        # Rewriting the whole index per resource is wasteful; throttle to every 30s.
+        if not self._dirty or (not force and time.monotonic() - self._last_save < 30):
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"resources": self.resources}, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+# --------------------------------------
+# CRAWL STATE
+# --------------------------------------
+class CrawlState:
+    """
+    Transactional record of crawl progress in SQLite (WAL mode).
+
+    Resources, files and chunks each carry a status (pending, in_flight, done,
+    failed). A resource left in_flight by a crash is resumed on the next pass:
+    files whose blocks were all written are not read again and written chunks
+    are not sent again. Failed chunks keep their block text so later passes
+    can retry just those chunks without rescanning anything.
+    """
+
+    def __init__(self, path=STATE_DB_PATH):
+        self.path = path
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS resources (
+                    path TEXT PRIMARY KEY, name TEXT, status TEXT, attempts INTEGER DEFAULT 0,
+                    count INTEGER DEFAULT 0, last_run TEXT, updated REAL);
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY, resource TEXT, status TEXT, mtime INTEGER,
+                    size INTEGER, blocks INTEGER, updated REAL);
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY, resource TEXT, file TEXT, ext TEXT, status TEXT,
+                    attempts INTEGER DEFAULT 0, block TEXT, error TEXT, updated REAL);
+                CREATE INDEX IF NOT EXISTS files_resource ON files(resource);
+                CREATE INDEX IF NOT EXISTS chunks_resource ON chunks(resource, status);
+                CREATE INDEX IF NOT EXISTS chunks_status ON chunks(status);
+            """)
+            # Requests cut off by a crash never got an answer.
+            self._db.execute("UPDATE chunks SET status = 'pending' WHERE status = 'in_flight'")
+            self._db.commit()
+        return self._db
+
+    def import_progress(self, path=PROGRESS_LOG):
+        """Seed an empty store with the resources listed in a legacy progress.json."""
+        db = self._conn()
+        if not os.path.exists(path) or db.execute("SELECT 1 FROM resources LIMIT 1").fetchone():
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                progress = json.load(f)
+        except Exception:
+            return
+        db.executemany(
+            "INSERT OR IGNORE INTO resources (path, name, status, count, last_run, updated)"
+            " VALUES (?, ?, 'done', ?, ?, ?)",
+            [(p.get("path", name), name, p.get("count", 0), p.get("last_run"), time.time())
+             for name, p in progress.items()])
+        db.commit()
+        print(f"[State] Imported {len(progress)} resources from {path}.")
+
+    def begin_resource(self, resource_dir, name):
+        """
+        Mark a resource in flight. Returns (done_files, done_chunks) left by an
+        interrupted crawl of it, where done_files maps path -> (mtime, size);
+        both are empty when the resource starts from scratch.
+        """
+        db = self._conn()
+        row = db.execute("SELECT status FROM resources WHERE path = ?", (resource_dir,)).fetchone()
+        done_files, done_chunks = {}, set()
+        if row is not None and row[0] == "in_flight":
+            done_files = {path: (mtime, size) for path, mtime, size in db.execute(
+                "SELECT path, mtime, size FROM files WHERE resource = ? AND status = 'done'",
+                (resource_dir,))}
+            done_chunks = {cid for (cid,) in db.execute(
+                "SELECT id FROM chunks WHERE resource = ? AND status = 'done'", (resource_dir,))}
+        else:
+            db.execute("DELETE FROM files WHERE resource = ?", (resource_dir,))
+            db.execute("DELETE FROM chunks WHERE resource = ?", (resource_dir,))
+        db.execute(
+            "INSERT INTO resources (path, name, status, attempts, updated) VALUES (?, ?, 'in_flight', 1, ?)"
+            " ON CONFLICT(path) DO UPDATE SET status = 'in_flight', attempts = attempts + 1,"
+            " updated = excluded.updated", (resource_dir, name, time.time()))
+        db.commit()
+        return done_files, done_chunks
+
+    def add_file(self, resource_dir, file_path, ext, chunk_ids):
+        """Record an extracted file and its chunks as pending."""
+        db = self._conn()
+        try:
+            st = os.stat(file_path)
+            mtime, size = st.st_mtime_ns, st.st_size
+        except OSError:
+            mtime = size = None
+        now = time.time()
+        db.execute(
+            "INSERT OR REPLACE INTO files (path, resource, status, mtime, size, blocks, updated)"
+            " VALUES (?, ?, 'pending', ?, ?, ?, ?)",
+            (file_path, resource_dir, mtime, size, len(chunk_ids), now))
+        db.executemany(
+            "INSERT INTO chunks (id, resource, file, ext, status, updated) VALUES (?, ?, ?, ?, 'pending', ?)"
+            " ON CONFLICT(id) DO UPDATE SET status = 'pending', updated = excluded.updated"
+            " WHERE status != 'done'",
+            [(cid, resource_dir, file_path, ext, now) for cid in chunk_ids])
+
+    def file_done(self, file_path):
+        self._conn().execute("UPDATE files SET status = 'done', updated = ? WHERE path = ?",
+                             (time.time(), file_path))
+
+    def chunk_started(self, chunk_id):
+        self._conn().execute("UPDATE chunks SET status = 'in_flight', updated = ? WHERE id = ?",
+                             (time.time(), chunk_id))
+
+    def chunks_done(self, chunk_ids):
+        """Mark chunks whose records reached the dataset; commits the batch."""
+        db = self._conn()
+        now = time.time()
+        db.executemany("UPDATE chunks SET status = 'done', block = NULL, error = NULL, updated = ?"
+                       " WHERE id = ?", [(now, cid) for cid in chunk_ids])
+        db.commit()
+
+    def chunk_failed(self, chunk_id, resource_dir, file_path, ext, block, error):
+        """Keep a failed chunk's block so a later pass can retry it on its own."""
+        self._conn().execute(
+            "INSERT INTO chunks (id, resource, file, ext, status, attempts, block, error, updated)"
+            " VALUES (?, ?, ?, ?, 'failed', 1, ?, ?, ?)"
+            " ON CONFLICT(id) DO UPDATE SET status = 'failed', attempts = attempts + 1,"
+            " block = excluded.block, error = excluded.error, updated = excluded.updated",
+            (chunk_id, resource_dir, file_path, ext, block, error, time.time()))
+
+    def finish_resource(self, resource_dir):
+        """Close out a resource; it stays 'failed' while any of its chunks failed."""
+        db = self._conn()
+        count, failed = db.execute(
+            "SELECT SUM(status = 'done'), SUM(status = 'failed') FROM chunks WHERE resource = ?",
+            (resource_dir,)).fetchone()
+        db.execute("UPDATE resources SET status = ?, count = ?, last_run = ?, updated = ?"
+                   " WHERE path = ?",
+                   ("failed" if failed else "done", count or 0, datetime.utcnow().isoformat(),
+                    time.time(), resource_dir))
+        if not failed:
+            db.execute("UPDATE files SET status = 'done' WHERE resource = ?", (resource_dir,))
+        db.commit()
+
+    def failed_chunks(self, max_attempts=CHUNK_MAX_ATTEMPTS):
+        """{resource_dir: [(file, ext, block), ...]} of failed chunks still worth retrying."""
+        retry = {}
+        for resource_dir, file_path, ext, block in self._conn().execute(
+                "SELECT c.resource, c.file, c.ext, c.block FROM chunks c"
+                " JOIN resources r ON r.path = c.resource"
+                " WHERE c.status = 'failed' AND c.attempts < ? AND c.block IS NOT NULL"
+                " AND r.status != 'in_flight' ORDER BY c.resource, c.file", (max_attempts,)):
+            retry.setdefault(resource_dir, []).append((file_path, ext, block))
+        return retry
+
+    def summary(self):
+        db = self._conn()
+        return {
+            table: dict(db.execute(f"SELECT status, COUNT(*) FROM {table} GROUP BY status").fetchall())
+            for table in ("resources", "files", "chunks")
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+crawl_state = CrawlState()
+
+# --------------------------------------
+# DATASET WRITER
+# --------------------------------------
+class DatasetWriter:
+    """
+    Append-only JSONL writer that batches records into few large writes.
+
+    A batch goes out with a single os.write of whole lines once it reaches
+    `batch_records`/`batch_bytes`, or when `flush` is called. The fsync policy
+    is "always", "batch" or "never". If a previous run was killed mid-write,
+    the torn last line is cut off on open, so readers never see half a record.
+    `on_flush` receives the (record, meta) pairs of each batch once written.
+
+    With `compress`, every batch is its own gzip member (concatenated members
+    are still one valid .gz stream) and the end offset of the last complete
+    member is kept in `<path>.end`, which is what a torn tail is cut back to.
+    """
+
+    def __init__(self, path=DATASET_PATH, batch_records=WRITER_BATCH_RECORDS,
+                 batch_bytes=WRITER_BATCH_BYTES, fsync=WRITER_FSYNC, on_flush=None,
+                 compress=False):
+        self.path = path
+        self.compress = compress
+        self._end_fd = None
+        self.batch_records = 1 if fsync == "always" else batch_records
+        self.batch_bytes = batch_bytes
+        self.fsync = fsync
+        self.on_flush = on_flush
+        self.records_written = 0
+        self.last_flush = time.monotonic()
+        self._fd = None
+        self._lines = []
+        self._records = []
+        self._size = 0
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # os.open defaults to mode 0o777, which would make the data files executable.
+        flags = os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+        self._fd = os.open(self.path, flags, 0o644)
+        if self.compress:
+            self._end_fd = os.open(self.path + ".end", os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+            self._repair_compressed_tail()
+        else:
+            self._repair_tail()
+
+    def _repair_compressed_tail(self):
+        end = os.lseek(self._fd, 0, os.SEEK_END)
+        os.lseek(self._end_fd, 0, os.SEEK_SET)
+        raw = os.read(self._end_fd, 8)
+        if len(raw) == 8:
+            good = struct.unpack(">Q", raw)[0]
+            if good < end:
+                os.ftruncate(self._fd, good)
+                print(f"[Writer] Dropped {end - good} bytes of a torn batch at the end of {self.path}")
+
+    def _repair_tail(self):
+        end = os.lseek(self._fd, 0, os.SEEK_END)
+        if end == 0:
+            return
+        os.lseek(self._fd, end - 1, os.SEEK_SET)
+        if os.read(self._fd, 1) == b"\n":
+            return
+        # Walk back to the last complete line and drop the torn one.
+        pos = end
+        while pos > 0:
+            step = min(64 * 1024, pos)
+            pos -= step
+            os.lseek(self._fd, pos, os.SEEK_SET)
+            newline = os.read(self._fd, step).rfind(b"\n")
+            if newline != -1:
+                pos += newline + 1
+                break
+        os.ftruncate(self._fd, pos)
+        print(f"[Writer] Dropped {end - pos} bytes of a torn record at the end of {self.path}")
+
+    def write(self, record, meta=None):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._lines.append(line)
+        self._records.append((record, meta))
+        self._size += len(line)
+        if len(self._lines) >= self.batch_records or self._size >= self.batch_bytes:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self._lines:
+            return
+        if self._fd is None:
+            self._open()
+        start = time.perf_counter()
+        data = b"".join(self._lines)
+        if self.compress:
+            data = gzip.compress(data)
+        data = memoryview(data)
+        while data:
+            data = data[os.write(self._fd, data):]
+        if self.fsync != "never":
+            os.fsync(self._fd)
+        metrics.observe("writer_flush", time.perf_counter() - start)
+        if self.compress:
+            # Only now does the new member count as complete.
+            os.lseek(self._end_fd, 0, os.SEEK_SET)
+            os.write(self._end_fd, struct.pack(">Q", os.lseek(self._fd, 0, os.SEEK_END)))
+        records = self._records
+        self.records_written += len(records)
+        self._lines, self._records, self._size = [], [], 0
+        if self.on_flush is not None:
+            self.on_flush(records)
+
+    def close(self):
+        self.flush()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._end_fd is not None:
+            os.close(self._end_fd)
+            self._end_fd = None
+
+def compact_dataset_path(path=DATASET_PATH, compress=DATASET_COMPRESS):
+    base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    return base + ".compact.jsonl" + (".gz" if compress else "")
+
+def compact_rows(resource_dir, fx):
+    """
+    Rows of the compact dataset format. A resource row carries what every
+    record of that resource shares:
+        {"rid", "resource", "dir", "fxmanifest", "user_prompt"}
+    and is written once per crawled resource, ahead of its chunk rows:
+        {"id", "rid", "file", "timestamp", "code", "completion"}
+    where `file` is relative to `dir`. Readers rebuild the full record with
+    path = dir/file and prompt = user_prompt.format(resource, path, code);
+    see dataset_reader.py. Returns (rid, resource_row, make_chunk_row).
+    """
+    name = os.path.basename(resource_dir)
+    rid = hash_id(resource_dir, json.dumps(fx, sort_keys=True), USER_PROMPT)[:16]
+    resource_row = {"rid": rid, "resource": name, "dir": resource_dir,
+                    "fxmanifest": fx, "user_prompt": USER_PROMPT}
+
+    def make_chunk_row(record, code):
+        return {
+            "id": record["id"],
+            "rid": rid,
+            "file": os.path.relpath(record["path"], resource_dir),
+            "timestamp": record["timestamp"],
+            "code": code,
+            "completion": record["completion"],
+        }
+
+    return rid, resource_row, make_chunk_row
+
+# --------------------------------------
+# MAIN RESOURCE CRAWLER
+# --------------------------------------
+def resolve_resource_files(resource_dir, fx):
+    """Expand the manifest's script/file globs into the set of files to crawl."""
     all_files = set()
-    for key in ["client_scripts", "server_scripts", "shared_scripts", "files"]:
+    # Escape the resource path so [category] folders are not read as glob classes.
+    base = glob.escape(resource_dir.replace("\\", "/"))
+    for key in SCRIPT_KEYS:
         for pattern in fx.get(key, []):
-            # Skip commented or blank lines
-            if pattern.startswith("--") or not pattern.strip():
+            pattern = pattern.strip()
+            if not pattern:
                 continue
 
-            # Resolve relative to the manifest directory
-            abs_pattern = os.path.join(resource_dir, pattern).replace("\\", "/")
-
-            # Expand single and recursive wildcards
-            expanded = glob.glob(abs_pattern, recursive=True)
-
-            # If it’s a direct file with no wildcard, add it manually if it exists
-            if not expanded and os.path.exists(abs_pattern):
-                expanded = [abs_pattern]
+            if pattern.startswith("@"):
+                # Files of another resource are crawled with their owner.
+                owner, path = resolve_reference(pattern)
+                if owner is None or os.path.normpath(owner) != os.path.normpath(resource_dir):
+                    continue
+                expanded = [path] if os.path.isfile(path) else []
+            else:
+                # Resolve relative to the manifest directory, expanding ** and * wildcards
+                pattern = pattern.replace("\\", "/")
+                if pattern.startswith("./"):
+                    pattern = pattern[2:]
+                abs_pattern = base + "/" + pattern
+                expanded = [f for f in glob.glob(abs_pattern, recursive=True) if os.path.isfile(f)]
 
             if not expanded:
                 print(f"[Warn] No files matched pattern {pattern} in {resource_dir}")
-            else:
-                for f in expanded:
-                    all_files.add(os.path.normpath(f))
-
+            for f in expanded:
+                all_files.add(os.path.normpath(f))
 
     ui_root = fx.get("ui_page")
-    if ui_root:
-        ui_path = os.path.join(resource_dir, ui_root)
-        if os.path.exists(ui_path):
+    if isinstance(ui_root, str) and "://" not in ui_root:
+        ui_path = os.path.normpath(os.path.join(resource_dir, ui_root))
+        if os.path.isfile(ui_path):
             all_files.add(ui_path)
 
-    dataset_records = []
+    return all_files
 
-    for file_path in all_files:
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext not in ('.lua', '.js', '.html', '.css'):
-            continue
+def extract_file(file_path, resource_dir):
+    """
+    Read and chunk one file. Runs in the extraction process pool, so it takes
+    and returns plain data only; blocks is None for skipped bundles, with the
+    reason as the last item. The seconds spent are returned too, since the
+    pool's metrics never reach ours.
+    """
+    start = time.perf_counter()
+    ext = os.path.splitext(file_path)[1].lower()
+    text = safe_read(file_path)
+    if SKIP_BUNDLED_ASSETS and ext != '.lua':
+        reason = bundled_asset_reason(os.path.relpath(file_path, resource_dir), text)
+        if reason:
+            return file_path, ext, None, time.perf_counter() - start, reason
+    return file_path, ext, extract_blocks(text, ext), time.perf_counter() - start, None
+
+_extract_executor = None
+
+def get_extract_executor():
+    """Process pool for extract_file, or None to use the loop's default threads."""
+    global _extract_executor
+    if _extract_executor is None and EXTRACT_WORKERS > 0:
+        _extract_executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    return _extract_executor
+
+def shutdown_extract_executor():
+    global _extract_executor
+    if _extract_executor is not None:
+        _extract_executor.shutdown(cancel_futures=True)
+        _extract_executor = None
+
+async def process_block(resource_dir, fx, file_path, ext, block):
+    """Answer one block from the cache or the LLM; returns its record, or None when skipped."""
+    chunk_id = hash_id(resource_dir, file_path, block)
+    answer = completion_cache.get(cache_key(chunk_id))
+    if answer is not None:
+        metrics.inc("cache_hits")
+        if CACHE_MODE == "skip":
+            return None
+    else:
+        metrics.inc("cache_misses")
+        answer = await _ask_block(resource_dir, file_path, ext, block)
+
+    return _block_record(resource_dir, fx, file_path, chunk_id, block, answer)
+
+async def _ask_block(resource_dir, file_path, ext, block):
+    """The LLM's answer for a block that missed the completion cache."""
+    payload = {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT.format(ext=ext)},
+            {"role": "user", "content": USER_PROMPT.format(
+                resource=os.path.basename(resource_dir), path=file_path, code=block)}
+        ],
+        "options": LLM_OPTIONS
+    }
+
+    # Cached by the writer once the record is on disk; see cache_flushed_records.
+    if CONTENT_DEDUPE:
+        return await content_index.answer(block, ext, lambda: query_llm(payload))
+    return await query_llm(payload)
+
+def _block_record(resource_dir, fx, file_path, chunk_id, block, answer):
+    return {
+        "id": chunk_id,
+        "timestamp": datetime.utcnow().isoformat(),
+        "resource": os.path.basename(resource_dir),
+        "path": file_path,
+        "fxmanifest": fx,
+        "prompt": USER_PROMPT.format(resource=os.path.basename(resource_dir),
+                                     path=file_path, code=block),
+        "completion": answer
+    }
+
+def pack_blocks(blocks, budget=PACK_TOKEN_BUDGET, max_blocks=PACK_MAX_BLOCKS):
+    """
+    Group consecutive blocks into packs of at most `max_blocks` whose code
+    fits in `budget` tokens. A block over the budget gets a pack of its own.
+    """
+    packs, pack, used = [], [], 0
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        if pack and (used + tokens > budget or len(pack) >= max_blocks):
+            packs.append(pack)
+            pack, used = [], 0
+        pack.append(block)
+        used += tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+def parse_pack_answer(answer, ids):
+    """
+    Split a packed JSON answer into {block id: answer}. Ids that are missing
+    or empty are left out; structured answers are kept as indented JSON text.
+    """
+    try:
+        obj = json.loads(answer)
+    except ValueError:
+        return {}
+    if not isinstance(obj, dict):
+        return {}
+    answers = {}
+    for block_id in ids:
+        value = obj.get(block_id)
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, ensure_ascii=False, indent=2)
+        if isinstance(value, str) and value.strip():
+            answers[block_id] = value.strip()
+    return answers
+
+async def process_pack(resource_dir, fx, file_path, ext, blocks):
+    """
+    Answer several blocks of one file with a single JSON-mode request; returns
+    one record (or None when skipped) per block, in order. Blocks the answer
+    doesn't cover are sent on their own.
+    """
+    chunk_ids = [hash_id(resource_dir, file_path, block) for block in blocks]
+    results = [None] * len(blocks)
+    todo = []
+    content = {}
+    for i, chunk_id in enumerate(chunk_ids):
+        answer = completion_cache.get(cache_key(chunk_id))
+        if answer is None:
+            metrics.inc("cache_misses")
+            if CONTENT_DEDUPE:
+                answer, key, h = content_index.lookup(blocks[i], ext)
+                if answer is not None:
+                    results[i] = _block_record(resource_dir, fx, file_path, chunk_id, blocks[i], answer)
+                    continue
+                content[i] = (key, h)
+            todo.append(i)
+        else:
+            metrics.inc("cache_hits")
+            if CACHE_MODE != "skip":
+                results[i] = _block_record(resource_dir, fx, file_path, chunk_id, blocks[i], answer)
+
+    answers = {}
+    if len(todo) > 1:
+        ids = [f"b{n}" for n in range(1, len(todo) + 1)]
+        code = "\n".join(PACK_BLOCK.format(id=block_id, code=blocks[i])
+                         for block_id, i in zip(ids, todo))
+        payload = {
+            "model": MODEL,
+            "messages": [
+                {"role": "system", "content": PACK_SYSTEM_PROMPT.format(ext=ext)},
+                {"role": "user", "content": USER_PROMPT.format(
+                    resource=os.path.basename(resource_dir), path=file_path, code=code)}
+            ],
+            "format": "json",
+            "options": dict(LLM_OPTIONS, num_predict=LLM_OPTIONS["num_predict"] * len(todo),
+                            num_ctx=PACK_NUM_CTX)
+        }
+        answer = await query_llm(payload)
+        if answer.startswith("[Error"):
+            # Already retried; don't multiply the load on a failing runner.
+            for i in todo:
+                results[i] = _block_record(resource_dir, fx, file_path, chunk_ids[i], blocks[i], answer)
+            return results
+        parsed = parse_pack_answer(answer, ids)
+        answers = {i: parsed[block_id] for block_id, i in zip(ids, todo) if block_id in parsed}
+        for i, answer in answers.items():
+            if i in content:
+                content_index.remember(*content[i], answer)
+        metrics.inc("packed_requests")
+        metrics.inc("packed_blocks", len(answers))
+        if len(answers) < len(todo):
+            print(f"[Pack] {file_path}: answer covered {len(answers)}/{len(todo)} blocks, "
+                  f"sending the rest one by one")
+            metrics.inc("pack_fallbacks", len(todo) - len(answers))
+
+    for i in todo:
+        # Already counted as cache misses above.
+        answer = answers[i] if i in answers else await _ask_block(resource_dir, file_path, ext, blocks[i])
+        results[i] = _block_record(resource_dir, fx, file_path, chunk_ids[i], blocks[i], answer)
+    return results
+
+def cache_flushed_records(records):
+    """Cache completions only after their records are written, so a crash can't lose them."""
+    completion_cache.put_many([(cache_key(r["id"]), r["id"], r["completion"]) for r in records])
 
-        text = safe_read(file_path)
-        blocks = extract_blocks(text, ext)
-        print(f"[Blocks] {file_path} -> {len(blocks)} blocks found")
-
-        for block in blocks:
-            chunk_id = hash_id(resource_dir, file_path, block)
-            sys_prompt = (
-                f"You are an expert FiveM developer analyzing {ext} code. "
-                f"Explain what this block does, identify any events or NUI communication, "
-                f"and generate 2-3 realistic developer questions about it."
-            )
-
-            user_prompt = f"Resource: {os.path.basename(resource_dir)}\nFile: {file_path}\n\n{block[:CHUNK_LIMIT]}"
-
-            payload = {
-                "model": MODEL,
-                "messages": [
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "options": {"temperature": TEMPERATURE, "num_predict": 1024}
-            }
-
-            answer = await query_llm(payload)
-            record = {
-                "id": chunk_id,
-                "timestamp": datetime.utcnow().isoformat(),
-                "resource": os.path.basename(resource_dir),
-                "path": file_path,
-                "fxmanifest": fx,
-                "prompt": user_prompt,
-                "completion": answer
-            }
-
-            os.makedirs(os.path.dirname(DATASET_PATH), exist_ok=True)
-            with open(DATASET_PATH, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-            dataset_records.append(record)
-            await asyncio.sleep(1.5)
-
-    return dataset_records
-
-async def main():
-    # Load previous progress if exists
-    progress = {}
-    if os.path.exists(PROGRESS_LOG):
+class _ResourceJob:
+    __slots__ = ("path", "name", "fx", "entry", "pending", "extracted", "written", "chunk_row",
+                 "files")
+
+    def __init__(self, path, fx, entry):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.fx = fx
+        self.entry = entry
+        self.pending = 0  # blocks queued but not yet written or skipped
+        self.extracted = False
+        self.written = 0
+        self.chunk_row = None  # compact format: set once the resource row is written
+        self.files = {}  # file -> blocks still pending, for the state store
+
+class CrawlPipeline:
+    """
+    Staged crawl: discovery -> file read + extract_blocks in a process pool ->
+    bounded block queue -> LLM workers -> dataset writer.
+
+    The block queue is bounded, so extraction stalls instead of buffering a
+    whole tree while the model is behind, and the model always has parsed
+    blocks waiting while files are still being read. A resource is committed
+    to the file index and state store once its last block is written.
+    """
+
+    def __init__(self, state=None, file_index=None, queue_size=BLOCK_QUEUE_SIZE,
+                 llm_workers=None):
+        self.state = state
+        self.file_index = file_index
+        self.blocks = asyncio.Queue(maxsize=queue_size)
+        self.records = asyncio.Queue(maxsize=queue_size)
+        # A few more workers than the pool limit so cache hits never starve it.
+        self.llm_workers = llm_workers or ollama_router.max_concurrency + 2
+        self.resources_seen = 0
+        self.discovered = set()
+        self.resources_changed = 0
+        self.resources_done = 0
+        self.files_extracting = 0
+        self.files_done = 0
+        self.blocks_skipped = 0
+        self.blocks_resumed = 0
+        self.blocks_failed = 0
+        self.records_written = 0
+        self.collected = None  # a list to also keep every record written, for process_resource
+        self.compact = DATASET_FORMAT == "compact"
+        if self.compact:
+            self.writer = DatasetWriter(compact_dataset_path(DATASET_PATH, DATASET_COMPRESS),
+                                        on_flush=self._flushed,
+                                        compress=DATASET_COMPRESS)
+        else:
+            self.writer = DatasetWriter(on_flush=self._flushed)
+
+    def snapshot(self):
+        """Queue depth and progress of every stage."""
+        return {
+            "resources_seen": self.resources_seen,
+            "resources_changed": self.resources_changed,
+            "resources_done": self.resources_done,
+            "files_extracting": self.files_extracting,
+            "files_done": self.files_done,
+            "block_queue": self.blocks.qsize(),
+            "llm_in_flight": ollama_router.in_flight,
+            "llm_limit": ollama_router.limit,
+            "record_queue": self.records.qsize(),
+            "records_written": self.records_written,
+            "records_buffered": len(self.writer._records),
+            "blocks_skipped": self.blocks_skipped,
+            "blocks_resumed": self.blocks_resumed,
+            "blocks_failed": self.blocks_failed,
+        }
+
+    async def run(self, resource_dirs):
+        """Crawl `resource_dirs` (a list or an async stream) through every stage."""
+        tasks = [asyncio.ensure_future(self._llm_worker()) for _ in range(self.llm_workers)]
+        tasks.append(asyncio.ensure_future(self._writer()))
+        tasks.append(asyncio.ensure_future(self._report()))
         try:
-            with open(PROGRESS_LOG, 'r', encoding='utf-8') as pf:
-                progress = json.load(pf)
-        except Exception:
-            progress = {}
+            if self.state is not None:
+                # Retries go first so a re-crawl of the same resource can't race them.
+                await self._retry_failed()
+                await self.blocks.join()
+                await self.records.join()
+            await self._produce(resource_dirs)
+            await self.blocks.join()
+            await self.records.join()
+            self.writer.flush()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.writer.close()
+        return self.snapshot()
 
-    while True:
-        resource_dirs = []
+    async def _retry_failed(self):
+        """Queue the failed chunks recorded in the state store, without reading any files."""
+        retry = self.state.failed_chunks()
+        if not retry:
+            return
+        print(f"[State] Retrying {sum(map(len, retry.values()))} failed chunks "
+              f"in {len(retry)} resources...")
+        for path, chunks in retry.items():
+            fx_path = os.path.join(path, "fxmanifest.lua")
+            if not os.path.exists(fx_path):
+                continue
+            job = _ResourceJob(path, await asyncio.to_thread(parse_fxmanifest, fx_path), None)
+            resource_index[job.name] = path
+            for file_path, ext, block in chunks:
+                job.pending += 1
+                await self.blocks.put((job, file_path, ext, [block], time.monotonic()))
+            job.extracted = True
+            if job.pending == 0:
+                self._finish(job)
+
+    # ---- stage 1: discovery + change detection ----
+    async def _produce(self, resource_dirs):
+        slots = asyncio.Semaphore(max(2, EXTRACT_WORKERS))
+        tasks = []
 
-        # Recursively find all folders that contain an fxmanifest.lua
-        for root, dirs, files in os.walk(ROOT_DIR):
-            for d in dirs:
-                candidate = os.path.join(root, d)
-                manifest = os.path.join(candidate, "fxmanifest.lua")
-                if os.path.exists(manifest):
-                    resource_dirs.append(candidate)
+        async def prepare(path):
+            async with slots:
+                try:
+                    await self._prepare_resource(path)
+                except Exception as e:
+                    print(f"[Error] {path}: {e}")
 
-        print(f"[Crawler] Found {len(resource_dirs)} resources with fxmanifest.lua.")
+        def start(path):
+            self.resources_seen += 1
+            self.discovered.add(path)
+            metrics.inc("resources_discovered")
+            resource_index[os.path.basename(path)] = path
+            tasks.append(asyncio.ensure_future(prepare(path)))
 
-        for resource_path in resource_dirs:
-            resource_name = os.path.basename(resource_path)
+        # Resources may arrive as an async stream so crawling starts with the first one found.
+        if hasattr(resource_dirs, "__aiter__"):
+            async for path in resource_dirs:
+                start(path)
+        else:
+            for path in resource_dirs:
+                start(path)
+        await asyncio.gather(*tasks)
 
-            print(f"[Crawler] Processing {resource_name} -> {resource_path} ...")
-            records = await process_resource(resource_path)
+    # ---- stage 2: file read + extraction ----
+    async def _prepare_resource(self, path):
+        fx_path = os.path.join(path, "fxmanifest.lua")
+        if not os.path.exists(fx_path):
+            if self.file_index is not None:
+                self.file_index.forget(path)
+            return
+        name = os.path.basename(path)
+        with metrics.timer("manifest", name):
+            fx = await asyncio.to_thread(parse_fxmanifest, fx_path)
+            files = await asyncio.to_thread(resolve_resource_files, path, fx)
+        entry = None
+        if self.file_index is not None:
+            with metrics.timer("change_detection", name):
+                changed, entry = await asyncio.to_thread(self.file_index.check, path, files)
+            if not changed:
+                metrics.inc("resources_unchanged")
+                return
 
-            progress[resource_name] = {
-                "last_run": datetime.utcnow().isoformat(),
-                "count": len(records),
-                "path": resource_path,
-            }
+        self.resources_changed += 1
+        job = _ResourceJob(path, fx, entry)
+        done_files, done_chunks = {}, set()
+        if self.state is not None:
+            done_files, done_chunks = self.state.begin_resource(path, job.name)
+        if done_chunks:
+            print(f"[Crawler] Resuming {job.name} -> {path} ({len(done_chunks)} blocks already written) ...")
+        else:
+            print(f"[Crawler] Processing {job.name} -> {path} ...")
 
-            # Persist progress after each resource
-            os.makedirs(os.path.dirname(PROGRESS_LOG), exist_ok=True)
-            with open(PROGRESS_LOG, 'w', encoding='utf-8') as pf:
-                json.dump(progress, pf, indent=2)
+        loop = asyncio.get_running_loop()
+        executor = get_extract_executor()
+        futures = []
+        for f in sorted(files):
+            if os.path.splitext(f)[1].lower() not in SUPPORTED_EXTS:
+                continue
+            if f in done_files:
+                try:
+                    st = os.stat(f)
+                    if done_files[f] == (st.st_mtime_ns, st.st_size):
+                        self.files_done += 1
+                        continue
+                except OSError:
+                    pass
+            futures.append(loop.run_in_executor(executor, extract_file, f, path))
+        self.files_extracting += len(futures)
+        for future in asyncio.as_completed(futures):
+            file_path, ext, blocks, seconds, skipped = await future
+            self.files_extracting -= 1
+            self.files_done += 1
+            metrics.observe("extract", seconds, job.name)
+            metrics.inc("files_extracted", resource=job.name)
+            if blocks is None:
+                metrics.inc("files_skipped", resource=job.name)
+                print(f"[Blocks] {file_path} -> skipped ({skipped}; SKIP_BUNDLED_ASSETS = False crawls it)")
+                continue
+            print(f"[Blocks] {file_path} -> {len(blocks)} blocks found")
+            if self.state is not None:
+                ids = [hash_id(path, file_path, block) for block in blocks]
+                self.state.add_file(path, file_path, ext, ids)
+                fresh = [block for cid, block in zip(ids, blocks) if cid not in done_chunks]
+                self.blocks_resumed += len(blocks) - len(fresh)
+                blocks = fresh
+                job.files[file_path] = len(blocks)
+                if not blocks:
+                    self.state.file_done(file_path)
+            metrics.inc("blocks_extracted", len(blocks), job.name)
+            for pack in pack_blocks(blocks) if PACK_BLOCKS else [[block] for block in blocks]:
+                job.pending += len(pack)
+                # Blocks here while the queue is full: backpressure from the LLM stage.
+                with metrics.timer("queue_backpressure", job.name):
+                    await self.blocks.put((job, file_path, ext, pack, time.monotonic()))
+
+        job.extracted = True
+        if job.pending == 0:
+            self._finish(job)
+
+    # ---- stage 3: LLM workers ----
+    async def _llm_worker(self):
+        while True:
+            job, file_path, ext, blocks, queued = await self.blocks.get()
+            current_resource.set(job.name)
+            metrics.observe("queue_wait", time.monotonic() - queued)
+            chunk_ids = [hash_id(job.path, file_path, block) for block in blocks]
+            handled = 0
+            try:
+                if self.state is not None:
+                    for chunk_id in chunk_ids:
+                        self.state.chunk_started(chunk_id)
+                if len(blocks) == 1:
+                    records = [await process_block(job.path, job.fx, file_path, ext, blocks[0])]
+                else:
+                    records = await process_pack(job.path, job.fx, file_path, ext, blocks)
+                for chunk_id, block, record in zip(chunk_ids, blocks, records):
+                    await self._handle_record(job, file_path, ext, block, chunk_id, record)
+                    handled += 1
+            except Exception as e:
+                print(f"[Error] {file_path}: {e}")
+                for chunk_id, block in list(zip(chunk_ids, blocks))[handled:]:
+                    self._block_failed(job, file_path, ext, block, chunk_id, f"[Error: {e}]")
+            finally:
+                self.blocks.task_done()
+
+    async def _handle_record(self, job, file_path, ext, block, chunk_id, record):
+        if record is None:
+            self.blocks_skipped += 1
+            if self.state is not None:
+                self.state.chunks_done([chunk_id])
+            self._block_done(job, file_path)
+        elif record["completion"].startswith("[Error"):
+            # Failed answers stay out of the dataset and the cache; see CrawlState.
+            self._block_failed(job, file_path, ext, block, chunk_id, record["completion"])
+        else:
+            metrics.inc("blocks_answered")
+            await self.records.put((job, record, block))
+
+    # ---- stage 4: writer ----
+    async def _writer(self):
+        while True:
+            try:
+                job, record, block = await asyncio.wait_for(self.records.get(),
+                                                            timeout=WRITER_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                self.writer.flush()
+                continue
+            try:
+                # Records stream straight to disk; only the job counters stay in memory.
+                meta = (job, record["path"])
+                if self.collected is not None:
+                    self.collected.append(record)
+                if self.compact:
+                    if job.chunk_row is None:
+                        _, resource_row, job.chunk_row = compact_rows(job.path, job.fx)
+                        self.writer.write(resource_row)
+                    record = job.chunk_row(record, block)
+                self.writer.write(record, meta)
+                if time.monotonic() - self.writer.last_flush >= WRITER_FLUSH_INTERVAL:
+                    self.writer.flush()
+            finally:
+                self.records.task_done()
+
+    def _flushed(self, items):
+        items = [(record, meta) for record, meta in items if meta is not None]  # skip resource rows
+        cache_flushed_records([record for record, _ in items])
+        if self.state is not None:
+            self.state.chunks_done([record["id"] for record, _ in items])
+        for _, (job, file_path) in items:
+            self.records_written += 1
+            job.written += 1
+            self._block_done(job, file_path)
+
+    def _block_failed(self, job, file_path, ext, block, chunk_id, error):
+        self.blocks_failed += 1
+        metrics.inc("blocks_failed", resource=job.name)
+        if self.state is not None:
+            self.state.chunk_failed(chunk_id, job.path, file_path, ext, block, error)
+        # The file stays unfinished so a resumed crawl reads it again.
+        job.files.pop(file_path, None)
+        self._block_done(job, file_path)
+
+    def _block_done(self, job, file_path):
+        left = job.files.get(file_path)
+        if left is not None:
+            job.files[file_path] = left - 1
+            if left == 1:
+                self.state.file_done(file_path)
+        job.pending -= 1
+        if job.extracted and job.pending == 0:
+            self._finish(job)
+
+    def _finish(self, job):
+        self.resources_done += 1
+        metrics.inc("resources_done")
+        if self.file_index is not None and job.entry is not None:
+            self.file_index.commit(job.path, job.entry)
+            self.file_index.save()
+        if self.state is not None:
+            self.state.finish_resource(job.path)
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(PIPELINE_REPORT_INTERVAL)
+            s = self.snapshot()
+            metrics.gauges.update(s)
+            metrics.write()
+            print(f"[Pipeline] resources {s['resources_done']}/{s['resources_changed']} "
+                  f"(seen {s['resources_seen']}) | extracting {s['files_extracting']} files | "
+                  f"block queue {s['block_queue']}/{self.blocks.maxsize} | "
+                  f"LLM {s['llm_in_flight']}/{s['llm_limit']} | "
+                  f"record queue {s['record_queue']} | written {s['records_written']}")
+            if len(ollama_router.clients) > 1:
+                print("[Router] " + " | ".join(
+                    f"{e['url']} {e['in_flight']}/{e['limit']} served {e['served']}"
+                    + (" EJECTED" if e["ejected"] else "") for e in ollama_router.snapshot()))
+
+async def process_resource(resource_dir):
+    """
+    Crawl a single resource regardless of the file index and return the list
+    of records written, in full record form whatever DATASET_FORMAT is.
+    """
+    pipeline = CrawlPipeline()
+    pipeline.collected = []
+    await pipeline.run([resource_dir])
+    return pipeline.collected
+
+async def crawl_resources(resource_dirs, state, file_index, prune=False):
+    """
+    Crawl every resource whose manifest or referenced files changed. With
+    prune=True `resource_dirs` is a full discovery, and index entries of
+    resources it no longer returns are dropped.
+    """
+    pipeline = CrawlPipeline(state, file_index)
+    stats = await pipeline.run(resource_dirs)
+    if prune:
+        file_index.prune(pipeline.discovered)
+    file_index.save(force=True)
+    print(f"[Crawler] Found {stats['resources_seen']} resources with fxmanifest.lua, "
+          f"{stats['resources_changed']} changed since the last pass, "
+          f"{stats['records_written']} records written, {stats['blocks_failed']} blocks failed.")
+    metrics.gauges.update(stats)
+    metrics.write()
+    if metrics.profile:
+        metrics.write_profile()
+
+async def watch_resources(state, file_index, duration):
+    """
+    Poll the indexed files for `duration` seconds and crawl resources shortly
+    after they stop changing. New resources are picked up by the next rescan.
+    """
+    deadline = time.monotonic() + duration
+    pending = {}  # resource_dir -> (signature, monotonic time it last moved)
+    while time.monotonic() < deadline:
+        await asyncio.sleep(WATCH_POLL_INTERVAL)
+        now = time.monotonic()
+        stale = await asyncio.to_thread(file_index.stale_resources)
+        for resource_dir, signature in stale.items():
+            # Re-arm the debounce timer as long as the files keep moving.
+            if pending.get(resource_dir, (None,))[0] != signature:
+                pending[resource_dir] = (signature, now)
+        for resource_dir in list(pending):
+            if resource_dir not in stale:
+                del pending[resource_dir]
+
+        ready = [r for r, (_, moved) in pending.items() if now - moved >= WATCH_DEBOUNCE]
+        for r in ready:
+            del pending[r]
+        gone = [r for r in ready if not os.path.exists(os.path.join(r, "fxmanifest.lua"))]
+        if gone:
+            for r in gone:
+                file_index.forget(r)
+            file_index.save(force=True)
+            print(f"[Watch] {len(gone)} resource(s) removed: {', '.join(map(os.path.basename, gone))}")
+            ready = [r for r in ready if r not in gone]
+        if ready:
+            print(f"[Watch] {len(ready)} resource(s) changed, crawling...")
+            await crawl_resources(ready, state, file_index)
+
+async def main(watch=WATCH_MODE):
+    crawl_state.import_progress(PROGRESS_LOG)
+    file_index = FileIndex(FILE_INDEX_PATH)
+
+    while True:
+        await crawl_resources(iter_resources(ROOT_DIR), crawl_state, file_index, prune=True)
+
+        if watch:
+            print("[Crawler] Epoch complete. Watching for changes...")
+            await watch_resources(crawl_state, file_index, WATCH_RESCAN_INTERVAL)
+        else:
+            print("[Crawler] Epoch complete. Sleeping before next pass...")
+            await asyncio.sleep(EPOCH_INTERVAL)
+
+
+async def run(watch=WATCH_MODE, profile=PROFILE, endpoints=None, routing=ROUTING):
+    global ollama_router
+    metrics.profile = profile
+    if endpoints:
+        ollama_router = build_router(endpoints, routing)
+    ollama_router.routing = routing
+    try:
+        await main(watch=watch)
+    finally:
+        await ollama_router.close()
+        completion_cache.close()
+        crawl_state.close()
+        shutdown_extract_executor()
 
-        print("[Crawler] Epoch complete. Sleeping before next pass...")
-        await asyncio.sleep(3600)  # 1 hour between epochs
+def print_status():
+    for table, counts in crawl_state.summary().items():
+        print(f"[State] {table}: " + (", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+                                      or "none"))
+    crawl_state.close()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crawl FiveM resources into an LLM dataset.")
+    parser.add_argument("--watch", action="store_true", default=WATCH_MODE,
+                        help="react to file edits within seconds instead of hourly epochs")
+    parser.add_argument("--status", action="store_true",
+                        help="print resource/file/chunk counts by status from the state store and exit")
+    parser.add_argument("--profile", action="store_true", default=PROFILE,
+                        help=f"write a per-resource stage breakdown to {PROFILE_DIR} after every epoch")
+    parser.add_argument("--endpoint", action="append", type=parse_endpoint, metavar="URL[=N]",
+                        help="an Ollama /api/chat endpoint taking N concurrent requests; repeat for "
+                             "several nodes (default: OLLAMA_ENDPOINTS, else OLLAMA_URL)")
+    parser.add_argument("--routing", choices=("least_outstanding", "latency"), default=ROUTING)
+    args = parser.parse_args()
+    if args.status:
+        print_status()
+        raise SystemExit
     try:
-        asyncio.run(main())
+        asyncio.run(run(watch=args.watch, profile=args.profile, endpoints=args.endpoint,
+                        routing=args.routing))
     except KeyboardInterrupt:
         print("\n[Crawler] Gracefully shutting down.")
 
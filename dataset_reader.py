@@ -0,0 +1,75 @@
+"""
+Dataset Reader
+--------------
+Reads crawler datasets in either format and always yields full records:
+
+- fivem_dataset.jsonl: one self-contained record per line.
+- fivem_dataset.compact.jsonl[.gz]: resource rows followed by chunk rows that
+  reference them by "rid" (see compact_rows in crawl.py). Chunk rows are
+  expanded back into the full record shape on the fly.
+"""
+
+import os
+import gzip
+import json
+import zlib
+
+def resolve_dataset_path(path):
+    """
+    Return whichever of `path` and its compact variants exists. When several
+    do (DATASET_FORMAT was changed at some point), the one written to most
+    recently is the one the crawler is using, and the others are stale.
+    """
+    base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    found = [p for p in (path, base + ".compact.jsonl", base + ".compact.jsonl.gz") if os.path.exists(p)]
+    if not found:
+        return path
+    newest = max(found, key=os.path.getmtime)
+    if len(found) > 1:
+        print(f"⚠️ Found {', '.join(found)}; reading {newest}, the most recently written")
+    return newest
+
+def _open_lines(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def expand_chunk(row, resource):
+    """Rebuild a full dataset record from a compact chunk row and its resource row."""
+    path = os.path.join(resource["dir"], row["file"])
+    return {
+        "id": row["id"],
+        "timestamp": row["timestamp"],
+        "resource": resource["resource"],
+        "path": path,
+        "fxmanifest": resource["fxmanifest"],
+        "prompt": resource["user_prompt"].format(
+            resource=resource["resource"], path=path, code=row["code"]),
+        "completion": row["completion"],
+    }
+
+def iter_records(path):
+    """
+    Yield every record of the dataset at `path`, or None for a line that is
+    not valid JSON so callers can count it. A truncated final gzip member, as
+    left by a killed crawler, ends the stream quietly.
+    """
+    resources = {}
+    with _open_lines(path) as f:
+        try:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+                    continue
+                if "rid" not in row:
+                    yield row
+                elif "id" not in row:
+                    resources[row["rid"]] = row
+                elif row["rid"] in resources:
+                    yield expand_chunk(row, resources[row["rid"]])
+                else:
+                    yield None
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            return
@@ -1,10 +1,32 @@
+import os
+import re
 import json
+import zlib
 import hashlib
+import argparse
+import tempfile
+from multiprocessing import Pool
 from tqdm import tqdm
+from dataset_reader import iter_records, resolve_dataset_path
 
 INPUT_PATH = "./dataset/fivem_dataset.jsonl"
 OUTPUT_PATH = "./dataset/fivem_dataset_deduped.jsonl"
 
+# Near-duplicate mode (--near)
+NUM_PERM = 128  # MinHash permutations per entry
+LSH_BANDS = 16  # NUM_PERM / LSH_BANDS rows per band; candidates show up from ~0.7 similarity
+NEAR_THRESHOLD = 0.7  # estimated Jaccard similarity at which two entries are the same
+CODE_SHINGLE = 5  # tokens per code shingle
+TEXT_SHINGLE = 3  # words per completion shingle
+NEAR_BATCH = 2000  # entries per worker task
+NEAR_WORKERS = os.cpu_count() or 1
+
+np = None  # NumPy and the MinHash constants are loaded by _load_numpy(); only --near needs them
+_GROUP_SHINGLES = 8192  # shingles permuted per array operation; keeps the scratch cache-sized
+
+_CODE_TOKEN = re.compile(r"\w+|[^\w\s]")
+_WORD = re.compile(r"\w+")
+
 def hash_entry(entry):
     """Create a unique fingerprint for the entry content."""
     key = (entry.get("prompt", "") + entry.get("completion", "")).strip().lower()
@@ -19,17 +41,245 @@ def is_valid(entry):
         "llama runner process" not in text
     )
 
+# --------------------------------------
+# NEAR-DUPLICATES (MinHash + LSH)
+# --------------------------------------
+def prompt_code(prompt):
+    """The code part of a prompt; the resource/file header differs between forks."""
+    parts = prompt.split("\n\n", 1)
+    return parts[1] if len(parts) == 2 else prompt
+
+class TokenHashes(dict):
+    """Memoised crc32 per token; stable across processes, unlike hash()."""
+
+    def __missing__(self, token):
+        h = self[token] = zlib.crc32(token.encode("utf-8"))
+        return h
+
+def _load_numpy():
+    global np, _MAX_HASH, _SHINGLE_MUL, _TEXT_SALT, _PERM_A, _PERM_B, _SHIFT
+    if np is not None:
+        return
+    try:
+        import numpy
+    except ImportError:
+        raise SystemExit("dedupe.py --near needs numpy: pip install numpy")
+    _MAX_HASH = numpy.uint64(0xFFFFFFFF)
+    _SHINGLE_MUL = numpy.uint64(0x01000193)
+    _TEXT_SALT = numpy.uint64(0x9E3779B9)
+    # Multiply-shift permutations, (a * x + b) >> 32 in wrapping 64-bit arithmetic.
+    # The seed is fixed so every worker process draws the same ones.
+    rng = numpy.random.default_rng(0x5EED)
+    _PERM_A = rng.integers(1, 1 << 63, size=NUM_PERM, dtype=numpy.uint64) | numpy.uint64(1)
+    _PERM_B = rng.integers(0, 1 << 63, size=NUM_PERM, dtype=numpy.uint64)
+    _SHIFT = numpy.uint64(32)
+    np = numpy
+
+def shingle_hashes(tokens, k, token_hashes):
+    """32-bit hashes of every k-token window, computed with NumPy."""
+    _load_numpy()
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    ids = np.fromiter(map(token_hashes.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+    k = min(k, len(ids))
+    n = len(ids) - k + 1
+    shingles = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        shingles = (shingles * _SHINGLE_MUL + ids[j:j + n]) & _MAX_HASH
+    return shingles
+
+def minhash_signatures(pairs, token_hashes=None):
+    """
+    MinHash signatures (len(pairs) x NUM_PERM, uint32) for (code, completion)
+    pairs. Shingles of a whole group of entries are permuted in one array
+    operation and reduced per entry with np.minimum.reduceat.
+    """
+    _load_numpy()
+    token_hashes = TokenHashes() if token_hashes is None else token_hashes
+    sigs = np.full((len(pairs), NUM_PERM), 0xFFFFFFFF, dtype=np.uint32)
+    group, rows, size = [], [], 0
+    scratch = np.empty(NUM_PERM * 2 * _GROUP_SHINGLES, dtype=np.uint64)
+
+    def flush():
+        lengths = np.array([len(s) for s in group])
+        values = np.concatenate(group)
+        # In place on a reused buffer: the temporaries cost more than the math.
+        if NUM_PERM * len(values) <= len(scratch):
+            permuted = scratch[:NUM_PERM * len(values)].reshape(NUM_PERM, len(values))
+        else:
+            permuted = np.empty((NUM_PERM, len(values)), dtype=np.uint64)
+        np.multiply(values[None, :], _PERM_A[:, None], out=permuted)
+        permuted += _PERM_B[:, None]
+        permuted >>= _SHIFT
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        sigs[rows] = np.minimum.reduceat(permuted, offsets, axis=1).T
+
+    for row, (code, completion) in enumerate(pairs):
+        shingles = np.concatenate((
+            shingle_hashes(_CODE_TOKEN.findall(code.lower()), CODE_SHINGLE, token_hashes),
+            shingle_hashes(_WORD.findall(completion.lower()), TEXT_SHINGLE, token_hashes) ^ _TEXT_SALT,
+        ))
+        if not len(shingles):
+            continue
+        group.append(shingles)
+        rows.append(row)
+        size += len(shingles)
+        if size >= _GROUP_SHINGLES:
+            flush()
+            group, rows, size = [], [], 0
+    if group:
+        flush()
+    return sigs
+
+_worker_token_hashes = TokenHashes()
+
+def _signature_worker(pairs):
+    return minhash_signatures(pairs, _worker_token_hashes)
+
+def band_keys(sigs, bands=LSH_BANDS):
+    """One 64-bit key per LSH band (rows of the band folded together)."""
+    _load_numpy()
+    rows = sigs.shape[1] // bands
+    keys = np.zeros((len(sigs), bands), dtype=np.uint64)
+    for r in range(rows):
+        keys = keys * np.uint64(0x100000001B3) + sigs[:, r::rows][:, :bands].astype(np.uint64)
+    return keys
+
+def near_duplicate_clusters(sigs, bands=LSH_BANDS, threshold=NEAR_THRESHOLD, chunk=1 << 18):
+    """
+    Cluster entries whose estimated Jaccard similarity reaches `threshold`.
+    Entries that share an LSH band bucket are compared with the bucket's first
+    entry and merged with union-find. Returns the root (lowest index) per entry.
+    """
+    _load_numpy()
+    n = len(sigs)
+    parent = np.arange(n)
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    # Band keys are built in slices so a memory-mapped input is read piecewise.
+    keys = np.concatenate([band_keys(np.asarray(sigs[start:start + chunk]), bands)
+                           for start in range(0, n, chunk)])
+    for band in range(bands):
+        column = keys[:, band]
+        order = np.argsort(column, kind="stable")
+        sorted_keys = column[order]
+        same = sorted_keys[1:] == sorted_keys[:-1]
+        if not same.any():
+            continue
+        # Index of the first entry of every bucket, for each sorted position.
+        starts = np.where(np.concatenate(([True], ~same)))[0]
+        first = order[starts[np.cumsum(np.concatenate(([True], ~same))) - 1]]
+        members = np.where(np.concatenate(([False], same)))[0]
+        a, b = first[members], order[members]
+        for lo in range(0, len(a), chunk):
+            sa, sb = a[lo:lo + chunk], b[lo:lo + chunk]
+            similar = (np.asarray(sigs[sa]) == np.asarray(sigs[sb])).mean(axis=1) >= threshold
+            for i, j in zip(sa[similar].tolist(), sb[similar].tolist()):
+                ri, rj = find(i), find(j)
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+    # Pointer jumping flattens every chain to its root in a few vectorised steps.
+    while True:
+        jumped = parent[parent]
+        if np.array_equal(jumped, parent):
+            return parent
+        parent = jumped
+
+def cluster_stats(roots):
+    """Sizes of the clusters with more than one member, largest first."""
+    _load_numpy()
+    sizes = np.bincount(roots)
+    sizes = sizes[sizes > 1]
+    return np.sort(sizes)[::-1]
+
+def _exact_pass(counts):
+    """Yield (raw index, entry) for valid, exactly-unique entries; counts drops."""
+    seen = set()
+    for index, entry in enumerate(iter_records(resolve_dataset_path(INPUT_PATH))):
+        if entry is None or not is_valid(entry):
+            counts["dropped"] += 1
+            continue
+        fingerprint = hash_entry(entry)
+        if fingerprint in seen:
+            counts["dropped"] += 1
+            continue
+        seen.add(fingerprint)
+        yield index, entry
+
+def _batches(entries, raw_indices):
+    batch = []
+    for index, entry in entries:
+        raw_indices.append(index)
+        batch.append((prompt_code(entry.get("prompt", "")), entry.get("completion", "")))
+        if len(batch) >= NEAR_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def near_dedupe(workers=NEAR_WORKERS, threshold=NEAR_THRESHOLD):
+    _load_numpy()
+    counts = {"dropped": 0}
+    raw_indices = []
+    # Signatures go to a temporary file so millions of entries don't have to fit in RAM.
+    with tempfile.TemporaryFile() as sig_file:
+        total = 0
+        batches = _batches(_exact_pass(counts), raw_indices)
+        if workers > 1:
+            with Pool(workers) as pool:
+                for sigs in tqdm(pool.imap(_signature_worker, batches), desc="MinHash signatures"):
+                    sig_file.write(sigs.tobytes())
+                    total += len(sigs)
+        else:
+            for sigs in tqdm(map(_signature_worker, batches), desc="MinHash signatures"):
+                sig_file.write(sigs.tobytes())
+                total += len(sigs)
+        sig_file.flush()
+        if total:
+            sigs = np.memmap(sig_file, dtype=np.uint32, mode="r", shape=(total, NUM_PERM))
+            roots = near_duplicate_clusters(sigs, threshold=threshold)
+        else:
+            roots = np.empty(0, dtype=np.int64)
+
+    raw_indices = np.array(raw_indices, dtype=np.int64)
+    representatives = raw_indices[roots == np.arange(len(roots))]
+    keep = set(representatives.tolist())
+    sizes = cluster_stats(roots)
+
+    kept = 0
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as outfile:
+        for index, entry in enumerate(tqdm(iter_records(resolve_dataset_path(INPUT_PATH)),
+                                           desc="Writing representatives")):
+            if index in keep:
+                json.dump(entry, outfile, ensure_ascii=False)
+                outfile.write("\n")
+                kept += 1
+
+    near = len(roots) - kept
+    print(f"🔎 {len(sizes)} near-duplicate clusters covering {int(sizes.sum())} entries, "
+          f"{near} removed")
+    if len(sizes):
+        histogram = [("2", sizes == 2), ("3-5", (sizes >= 3) & (sizes <= 5)),
+                     ("6-20", (sizes >= 6) & (sizes <= 20)), (">20", sizes > 20)]
+        print("   cluster sizes: " + ", ".join(f"{label}: {int(mask.sum())}" for label, mask in histogram)
+              + f" | largest: {', '.join(map(str, sizes[:5].tolist()))}")
+    print(f"✅ Deduplication complete: {kept} kept, {counts['dropped'] + near} dropped")
+
 def main():
     seen = set()
     kept = 0
     dropped = 0
 
-    with open(INPUT_PATH, "r", encoding="utf-8") as infile, \
-         open(OUTPUT_PATH, "w", encoding="utf-8") as outfile:
-        for line in tqdm(infile, desc="Deduplicating dataset"):
-            try:
-                entry = json.loads(line)
-            except json.JSONDecodeError:
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as outfile:
+        for entry in tqdm(iter_records(resolve_dataset_path(INPUT_PATH)), desc="Deduplicating dataset"):
+            if entry is None:
                 dropped += 1
                 continue
 
@@ -50,4 +300,14 @@ def main():
     print(f"✅ Deduplication complete: {kept} kept, {dropped} dropped")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Remove broken and duplicate dataset entries.")
+    parser.add_argument("--near", action="store_true",
+                        help="also collapse near-duplicates (MinHash/LSH) to one entry per cluster")
+    parser.add_argument("--threshold", type=float, default=NEAR_THRESHOLD,
+                        help="estimated Jaccard similarity that counts as a near-duplicate")
+    parser.add_argument("--workers", type=int, default=NEAR_WORKERS)
+    args = parser.parse_args()
+    if args.near:
+        near_dedupe(args.workers, args.threshold)
+    else:
+        main()
@@ -11,94 +11,276 @@ sys.modules["bitsandbytes"] = fake_bnb
 import os
 os.environ["PEFT_BACKEND"] = "TORCH"  # extra safety
 
+import json
+import shutil
+import hashlib
+import inspect
 import torch
-from datasets import load_dataset
+from datasets import load_dataset, load_from_disk
 from transformers import AutoModelForCausalLM, AutoTokenizer, TrainingArguments, Trainer
 from peft import LoraConfig, get_peft_model
 
 # === CONFIG ===
 model_id = "meta-llama/Llama-3.2-3B"
-dataset_path = "fivem_dataset_lora.jsonl"
+dataset_path = "./dataset/fivem_dataset_lora.jsonl"
 output_dir = "./lora-finetuned-fivem"
+MAX_LENGTH = 2048
+BATCH_SIZE = 4  # examples per step; batches are padded only to their longest example
+GRAD_ACCUM = 1
+PACKING = False  # concatenate examples into MAX_LENGTH rows instead of padding them
+NUM_PROC = max(1, (os.cpu_count() or 2) - 1)  # tokenizer processes
+BUCKET_FACTOR = 50  # batches per length bucket; larger = tighter padding, less shuffling
+IGNORE_INDEX = -100
+TOKENIZED_CACHE_DIR = "./dataset/tokenized"  # memory-mapped Arrow copies of tokenized datasets
+DATALOADER_WORKERS = 2  # workers share the memory-mapped cache instead of copying it
 
-# === LOAD DATA ===
-dataset = load_dataset("json", data_files=dataset_path, split="train")
-
-tokenizer = AutoTokenizer.from_pretrained(model_id)
-tokenizer.pad_token = tokenizer.eos_token
-
+# === DATA ===
 def format(example):
     instruction = example.get("instruction", "")
     input_text = example.get("input", "")
     output_text = example.get("output", "")
-    text = f"### Instruction:\n{instruction}\n\n### Input:\n{input_text}\n\n### Response:\n{output_text}"
-
-    tokens = tokenizer(
-        text,
-        truncation=True,
-        max_length=2048,
-        padding="max_length",
-        return_tensors="pt",  # <-- important: ensures actual torch tensors
+    return f"### Instruction:\n{instruction}\n\n### Input:\n{input_text}\n\n### Response:\n{output_text}"
+
+def tokenize_batch(batch, tokenizer, max_length=MAX_LENGTH):
+    """Tokenize a batch of examples without padding; padding happens per training batch."""
+    texts = [format({key: batch[key][i] for key in batch}) for i in range(len(batch["input"]))]
+    tokens = tokenizer(texts, truncation=True, max_length=max_length)
+    return {"input_ids": tokens["input_ids"], "length": [len(ids) for ids in tokens["input_ids"]]}
+
+def pack_batch(batch, max_length=MAX_LENGTH):
+    """
+    Pack tokenized examples into rows of up to max_length tokens (first fit,
+    longest first). position_ids restart at every example, so attention stays
+    within it, and the first token of each example is not a target, so no loss
+    crosses a boundary.
+    """
+    rows = []
+    for ids in sorted(batch["input_ids"], key=len, reverse=True):
+        for row in rows:
+            if len(row["input_ids"]) + len(ids) <= max_length:
+                break
+        else:
+            row = {"input_ids": [], "position_ids": [], "labels": []}
+            rows.append(row)
+        row["input_ids"].extend(ids)
+        row["position_ids"].extend(range(len(ids)))
+        row["labels"].extend([IGNORE_INDEX] + ids[1:])
+    return {
+        "input_ids": [row["input_ids"] for row in rows],
+        "position_ids": [row["position_ids"] for row in rows],
+        "labels": [row["labels"] for row in rows],
+        "length": [len(row["input_ids"]) for row in rows],
+    }
+
+def prepare_dataset(dataset, tokenizer, max_length=MAX_LENGTH, packing=PACKING, num_proc=NUM_PROC):
+    tokenized = dataset.map(tokenize_batch, batched=True, num_proc=num_proc,
+                            fn_kwargs={"tokenizer": tokenizer, "max_length": max_length},
+                            remove_columns=dataset.column_names)
+    if packing:
+        tokenized = tokenized.map(pack_batch, batched=True, batch_size=1000, num_proc=num_proc,
+                                  fn_kwargs={"max_length": max_length},
+                                  remove_columns=tokenized.column_names)
+    return tokenized
+
+def _sha1_file(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def tokenized_cache_key(dataset_path, tokenizer, max_length=MAX_LENGTH, packing=PACKING):
+    """
+    Key for a tokenized dataset: data content, tokenizer vocabulary and rules,
+    max length, packing, and the source of the functions that produce it, so
+    editing format() invalidates old caches too.
+    """
+    if getattr(tokenizer, "is_fast", False):
+        vocab = tokenizer.backend_tokenizer.to_str()
+    else:
+        vocab = json.dumps(tokenizer.get_vocab(), sort_keys=True)
+    parts = [
+        _sha1_file(dataset_path),
+        tokenizer.name_or_path,
+        hashlib.sha1(vocab.encode("utf-8")).hexdigest(),
+        str(max_length),
+        str(packing),
+        "".join(inspect.getsource(fn) for fn in (format, tokenize_batch, pack_batch)),
+    ]
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def load_tokenized(dataset_path, tokenizer, max_length=MAX_LENGTH, packing=PACKING,
+                   cache_dir=TOKENIZED_CACHE_DIR, num_proc=NUM_PROC):
+    """
+    Tokenized dataset for `dataset_path`, from the on-disk cache when nothing
+    that affects it changed. The Arrow files are memory-mapped, so loading is
+    instant and dataloader workers read the same pages without copies.
+    """
+    path = os.path.join(cache_dir, tokenized_cache_key(dataset_path, tokenizer, max_length, packing))
+    if os.path.exists(path):
+        print(f"⚡ Using tokenized cache {path}")
+        return load_from_disk(path)
+
+    dataset = load_dataset("json", data_files=dataset_path, split="train")
+    tokenized = prepare_dataset(dataset, tokenizer, max_length, packing, num_proc)
+    # Written aside and renamed, so a crash mid-save never leaves a cache that looks complete.
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tokenized.save_to_disk(tmp)
+    os.replace(tmp, path)
+    print(f"💾 Saved tokenized cache {path}")
+    return load_from_disk(path)
+
+class PaddingCollator:
+    """
+    Pads a batch to its longest row (rounded up to pad_to_multiple_of).
+
+    Padding is excluded from the loss by position, not by token id, because the
+    pad token is the EOS token. Packed rows carry position_ids and get no
+    attention_mask, so the model builds per-example causal masks from them;
+    their padding forms one more short sequence of its own.
+    """
+
+    def __init__(self, pad_token_id, pad_to_multiple_of=8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        longest = max(len(f["input_ids"]) for f in features)
+        if self.pad_to_multiple_of:
+            longest = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        packed = "position_ids" in features[0]
+        batch = {"input_ids": [], "labels": []}
+        if packed:
+            batch["position_ids"] = []
+        else:
+            batch["attention_mask"] = []
+        for f in features:
+            ids = list(f["input_ids"])
+            pad = longest - len(ids)
+            batch["input_ids"].append(ids + [self.pad_token_id] * pad)
+            if packed:
+                batch["labels"].append(list(f["labels"]) + [IGNORE_INDEX] * pad)
+                batch["position_ids"].append(list(f["position_ids"]) + list(range(pad)))
+            else:
+                batch["labels"].append([IGNORE_INDEX] + ids[1:] + [IGNORE_INDEX] * pad)
+                batch["attention_mask"].append([1] * len(ids) + [0] * pad)
+        return {k: torch.tensor(v, dtype=torch.long) for k, v in batch.items()}
+
+class LengthBucketSampler(torch.utils.data.Sampler):
+    """
+    Shuffles, then sorts each window of batch_size * bucket_factor examples by
+    length so every batch holds examples of similar size. Batch order is
+    shuffled again so training doesn't see lengths in sequence.
+    """
+
+    def __init__(self, lengths, batch_size, bucket_factor=BUCKET_FACTOR, seed=42):
+        self.lengths = list(lengths)
+        self.batch_size = batch_size
+        self.bucket_factor = bucket_factor
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        self.epoch += 1
+        order = torch.randperm(len(self.lengths), generator=g).tolist()
+        window = self.batch_size * self.bucket_factor
+        batches = []
+        for start in range(0, len(order), window):
+            bucket = sorted(order[start:start + window], key=lambda i: self.lengths[i], reverse=True)
+            batches += [bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size)]
+        for b in torch.randperm(len(batches), generator=g).tolist():
+            yield from batches[b]
+
+class BucketedTrainer(Trainer):
+    """Trainer that draws batches from a LengthBucketSampler."""
+
+    def __init__(self, *args, lengths=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lengths = lengths
+
+    def _get_train_sampler(self, *args, **kwargs):
+        return LengthBucketSampler(self.lengths, self.args.per_device_train_batch_size)
+
+def main():
+    # === LOAD DATA ===
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    tokenizer.pad_token = tokenizer.eos_token
+
+    tokenized = load_tokenized(dataset_path, tokenizer)
+    if PACKING:
+        try:
+            from transformers.masking_utils import find_packed_sequence_indices  # noqa: F401
+        except ImportError:
+            print("⚠️ This transformers version ignores position_ids for masking; packed examples "
+                  "will attend to each other unless the model uses flash_attention_2.")
+
+    # === LOAD MODEL (no bitsandbytes) ===
+    # === LOAD MODEL THEN APPLY LORA BEFORE DEVICE SPLIT ===
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        torch_dtype=torch.float16,
+        device_map=None  # stay on CPU during LoRA injection
+    )
+    # Training never reads the KV cache, and with one allocated the model
+    # ignores the example boundaries in packed position_ids.
+    model.config.use_cache = False
+
+    lora_config = LoraConfig(
+        r=16,
+        lora_alpha=32,
+        target_modules=["q_proj", "v_proj"],  # typical for LLaMA-based models
+        lora_dropout=0.05,
+        bias="none",
+        task_type="CAUSAL_LM",
     )
 
-    # Flatten single batch dimension if necessary
-    for k in tokens:
-        tokens[k] = tokens[k].squeeze(0)
-
-    tokens["labels"] = tokens["input_ids"].clone()
-    return tokens
-
-tokenized = dataset.map(format, remove_columns=dataset.column_names)
-
-# === LOAD MODEL (no bitsandbytes) ===
-# === LOAD MODEL THEN APPLY LORA BEFORE DEVICE SPLIT ===
-model = AutoModelForCausalLM.from_pretrained(
-    model_id,
-    torch_dtype=torch.float16,
-    device_map=None  # stay on CPU during LoRA injection
-)
-
-lora_config = LoraConfig(
-    r=16,
-    lora_alpha=32,
-    target_modules=["q_proj", "v_proj"],  # typical for LLaMA-based models
-    lora_dropout=0.05,
-    bias="none",
-    task_type="CAUSAL_LM",
-)
-
-model = get_peft_model(model, lora_config)
-
-# Ensure LoRA params require grad
-for name, param in model.named_parameters():
-    if param.requires_grad:
-        param.requires_grad_(True)
-
-model.print_trainable_parameters()
-
-model = get_peft_model(model, lora_config)
-print("Trainable parameters:", sum(p.numel() for p in model.parameters() if p.requires_grad))
-
-# === TRAINING ARGS ===
-args = TrainingArguments(
-    output_dir=output_dir,
-    per_device_train_batch_size=1,
-    gradient_accumulation_steps=4,
-    num_train_epochs=2,
-    learning_rate=2e-4,
-    fp16=True,
-    gradient_checkpointing=True,
-    logging_steps=10,
-    save_strategy="epoch",
-    save_total_limit=2
-)
-
-trainer = Trainer(
-    model=model,
-    args=args,
-    train_dataset=tokenized
-)
-
-trainer.train()
-model.save_pretrained(output_dir)
-tokenizer.save_pretrained(output_dir)
+    model = get_peft_model(model, lora_config)
+
+    # Ensure LoRA params require grad
+    for name, param in model.named_parameters():
+        if param.requires_grad:
+            param.requires_grad_(True)
+
+    model.print_trainable_parameters()
+
+    model = get_peft_model(model, lora_config)
+    print("Trainable parameters:", sum(p.numel() for p in model.parameters() if p.requires_grad))
+
+    # === TRAINING ARGS ===
+    args = TrainingArguments(
+        output_dir=output_dir,
+        per_device_train_batch_size=BATCH_SIZE,
+        gradient_accumulation_steps=GRAD_ACCUM,
+        num_train_epochs=2,
+        learning_rate=2e-4,
+        fp16=True,
+        gradient_checkpointing=True,
+        logging_steps=10,
+        save_strategy="epoch",
+        save_total_limit=2,
+        dataloader_num_workers=DATALOADER_WORKERS,
+    )
+
+    trainer = BucketedTrainer(
+        model=model,
+        args=args,
+        train_dataset=tokenized,
+        data_collator=PaddingCollator(tokenizer.pad_token_id),
+        lengths=tokenized["length"],
+    )
+
+    trainer.train()
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -6,22 +6,271 @@ Works with: PS G:\FiveM\txData> G:\FiveM\fxArtifact\FXServer.exe +exec server.cf
 
 This script provides:
 - Read server logs 
+- Follow server logs as they are written (--follow)
+- Index log events (resource start/stop, script errors, warnings, joins) for cheap queries
 - Queue commands for manual typing
 - Check server status
 """
 
+import os
+import re
 import time
 import json
+import sqlite3
+import argparse
 from datetime import datetime
 from pathlib import Path
 
+TAIL_BLOCK_SIZE = 64 * 1024
+
+def tail_lines(path, lines=20, block_size=TAIL_BLOCK_SIZE):
+    """Last `lines` lines of a file, read backwards from EOF in blocks."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        # One extra newline is needed to know the oldest wanted line is complete.
+        while pos > 0 and data.count(b"\n") <= lines:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    text = data.decode('utf-8', errors='ignore')
+    return text.splitlines()[-lines:] if lines > 0 else []
+
+class LogFollower:
+    """
+    Yields only the lines appended to a log since the last poll.
+
+    Keeps a byte offset instead of an open handle (an open handle would stop
+    the server from rotating the log on Windows). A new file id or a file
+    shorter than the offset means rotation or truncation, and reading starts
+    again from the top. A trailing line without a newline is held back until
+    it is complete.
+    """
+
+    def __init__(self, path, from_end=True):
+        self.path = Path(path)
+        self.offset = 0
+        self.file_id = None
+        self.partial = b""
+        if from_end and self.path.exists():
+            st = self.path.stat()
+            self.offset, self.file_id = st.st_size, (st.st_dev, st.st_ino)
+
+    def poll(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return []
+        file_id = (st.st_dev, st.st_ino)
+        if file_id != self.file_id or st.st_size < self.offset:
+            if self.file_id is not None:
+                print(f"[Monitor] {self.path.name} was rotated or truncated; reading from the start")
+            self.file_id, self.offset, self.partial = file_id, 0, b""
+        if st.st_size == self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+        self.offset += len(data)
+        data = self.partial + data
+        complete, newline, self.partial = data.rpartition(b"\n")
+        if not newline:
+            return []
+        return complete.decode('utf-8', errors='ignore').splitlines()
+
+    def follow(self, interval=1.0):
+        """Generator of new lines, forever."""
+        while True:
+            for line in self.poll():
+                yield line
+            time.sleep(interval)
+
+# FXServer prefixes most lines with a padded channel: "[    script:qb-core] ...".
+_LOG_LINE = re.compile(r"^\[\s*(?P<channel>[^\]]*?)\s*\]\s?(?P<msg>.*)$")
+_RESOURCE_START = re.compile(r"\bStarted resource (?P<resource>\S+)")
+_RESOURCE_STOP = re.compile(r"\bStopp(?:ing|ed) resource (?P<resource>\S+)")
+_SCRIPT_ERROR = re.compile(r"SCRIPT ERROR(?: in [^:]*)?:\s*(?P<message>.*)")
+_RESOURCE_REF = re.compile(r"@(?P<resource>[\w.-]+)/")
+_WARNING = re.compile(r"\bwarn(?:ing)?\b", re.IGNORECASE)
+# Some setups (txAdmin, console redirection) prefix lines with a local date and time.
+_TIMESTAMP = re.compile(
+    r"^\[?(?P<date>\d{4}-\d{2}-\d{2})[ T](?P<time>\d{2}:\d{2}:\d{2})(?:[.,]\d+)?\]?\s*")
+_PLAYER_JOIN = re.compile(
+    r"(?:\bConnecting:\s*|\bPlayer connected:?\s*)(?P<player>.+)"
+    r"|^(?P<name>.+?) (?:joined the server|connected)\.?$")
+
+def split_log_line(line):
+    """(channel, message) of a log line; the channel is "" when there is none."""
+    m = _LOG_LINE.match(line)
+    return (m.group("channel"), m.group("msg")) if m else ("", line)
+
+def split_timestamp(line):
+    """(unix time, rest of the line); the time is None when the line has no timestamp."""
+    m = _TIMESTAMP.match(line)
+    if not m:
+        return None, line
+    try:
+        ts = datetime.strptime(f"{m.group('date')} {m.group('time')}", "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None, line
+    return ts, line[m.end():]
+
+def parse_log_line(line):
+    """(kind, resource, message) for a log line worth indexing, else None."""
+    return _classify(*split_log_line(line))
+
+def _classify(channel, msg):
+    resource = channel[len("script:"):] if channel.startswith("script:") else None
+
+    m = _SCRIPT_ERROR.search(msg)
+    if m:
+        ref = _RESOURCE_REF.search(msg)
+        return "error", (ref.group("resource") if ref else resource), m.group("message")
+    m = _RESOURCE_START.search(msg)
+    if m:
+        return "start", m.group("resource"), msg
+    m = _RESOURCE_STOP.search(msg)
+    if m:
+        return "stop", m.group("resource"), msg
+    m = _PLAYER_JOIN.search(msg)
+    if m:
+        return "join", resource, (m.group("player") or m.group("name")).strip()
+    if _WARNING.search(msg):
+        return "warning", resource, msg
+    return None
+
+class LogIndex:
+    """
+    Structured events from fxserver.log in a small SQLite file.
+
+    update() parses only what was appended since the last call (the read
+    offset is stored with the events, so this holds across restarts) and
+    queries never touch the log. An event's time comes from the line's own
+    timestamp when it has one. Otherwise the only thing known is that the line
+    was written after the previous update(), so that time is used: a gap
+    between runs makes events look older, never newer. Lines without a
+    timestamp read by the very first update() have no known time (ts is NULL);
+    they show up in events() but not in queries by age. Stack lines
+    ("> fn (@res/file.lua:12)") after a SCRIPT ERROR are attached to it, also
+    across restarts.
+    """
+
+    def __init__(self, log_file, path):
+        self.log_file = Path(log_file)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY, ts REAL, kind TEXT, resource TEXT,
+                message TEXT, stack TEXT);
+            CREATE INDEX IF NOT EXISTS events_kind_ts ON events(kind, ts);
+            CREATE INDEX IF NOT EXISTS events_resource_ts ON events(resource, ts);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.follower = LogFollower(self.log_file, from_end=False)
+        saved = dict(self.db.execute("SELECT key, value FROM meta"))
+        if "follower" in saved:
+            state = json.loads(saved["follower"])
+            self.follower.offset = state["offset"]
+            self.follower.file_id = tuple(state["file_id"]) if state["file_id"] else None
+        self.last_update = float(saved["last_update"]) if "last_update" in saved else None
+        # channel -> (event id, stack lines) of the last SCRIPT ERROR
+        self._open_errors = {channel: (event_id, stack) for channel, (event_id, stack)
+                             in json.loads(saved.get("open_errors", "{}")).items()}
+
+    def update(self):
+        """Index new log lines; returns the number of events added."""
+        now = time.time()
+        lines = self.follower.poll()
+        added = 0
+        for line in lines:
+            ts, line = split_timestamp(line)
+            channel, msg = split_log_line(line)
+            if msg.startswith("> ") and channel in self._open_errors:
+                self._open_errors[channel][1].append(msg[2:].strip())
+                continue
+            event = _classify(channel, msg)
+            if event is None:
+                continue
+            self._flush_stack(channel)
+            cur = self.db.execute(
+                "INSERT INTO events (ts, kind, resource, message) VALUES (?, ?, ?, ?)",
+                (self.last_update if ts is None else ts, *event))
+            if event[0] == "error":
+                # Kept open so the stack lines that follow can be attached.
+                self._open_errors[channel] = (cur.lastrowid, [])
+            added += 1
+        for channel in list(self._open_errors):
+            self._flush_stack(channel, keep=True)
+        state = {"offset": self.follower.offset - len(self.follower.partial),
+                 "file_id": self.follower.file_id}
+        self.last_update = now
+        self.db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ("follower", json.dumps(state)),
+            ("last_update", repr(now)),
+            ("open_errors", json.dumps(self._open_errors)),
+        ])
+        self.db.commit()
+        return added
+
+    def _flush_stack(self, channel, keep=False):
+        open_error = self._open_errors.get(channel)
+        if open_error is None:
+            return
+        event_id, stack = open_error
+        if stack:
+            self.db.execute("UPDATE events SET stack = ? WHERE id = ?", ("\n".join(stack), event_id))
+        if not keep:
+            del self._open_errors[channel]
+
+    def count_by_resource(self, kind="error", since=3600):
+        """{resource: count} of `kind` events in the last `since` seconds."""
+        return dict(self.db.execute(
+            "SELECT COALESCE(resource, '?'), COUNT(*) FROM events WHERE kind = ? AND ts >= ?"
+            " GROUP BY resource ORDER BY COUNT(*) DESC", (kind, time.time() - since)))
+
+    def events(self, kind=None, resource=None, since=None, limit=50):
+        """Most recent events, newest first, filtered by kind, resource and age in seconds."""
+        where, args = [], []
+        if kind:
+            where.append("kind = ?")
+            args.append(kind)
+        if resource:
+            where.append("resource = ?")
+            args.append(resource)
+        if since:
+            where.append("ts >= ?")
+            args.append(time.time() - since)
+        sql = "SELECT ts, kind, resource, message, stack FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self.db.execute(sql + " ORDER BY ts DESC, id DESC LIMIT ?", args + [limit])
+        return [dict(zip(("ts", "kind", "resource", "message", "stack"), row)) for row in rows]
+
+    def close(self):
+        self.db.close()
+
 class ServerMonitor:
     def __init__(self):
         self.log_file = Path("G:/FiveM/txData/default/logs/fxserver.log")
         self.queue_file = Path("G:/FiveM/server-control/llm-commands.txt")
+        self.index_file = Path("G:/FiveM/server-control/log_index.sqlite")
         
         # Create queue directory if needed
         self.queue_file.parent.mkdir(exist_ok=True)
+        self._index = None
+
+    @property
+    def index(self):
+        """Event index of the server log, brought up to date on first use"""
+        if self._index is None:
+            self._index = LogIndex(self.log_file, self.index_file)
+        self._index.update()
+        return self._index
     
     def read_logs(self, lines=20):
         """Read recent server logs"""
@@ -29,12 +278,16 @@ class ServerMonitor:
             return ["Log file not found. Server may not be started yet."]
         
         try:
-            with open(self.log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                all_lines = f.readlines()
-                recent_lines = all_lines[-lines:]
-                return [line.strip() for line in recent_lines if line.strip()]
+            recent_lines = tail_lines(self.log_file, lines)
+            return [line.strip() for line in recent_lines if line.strip()]
         except Exception as e:
             return [f"Error reading logs: {e}"]
+
+    def follow_logs(self, interval=1.0):
+        """Yield new server log lines as they are written"""
+        for line in LogFollower(self.log_file).follow(interval):
+            if line.strip():
+                yield line.strip()
     
     def queue_command(self, command):
         """Queue a command for LLM"""
@@ -46,25 +299,32 @@ class ServerMonitor:
         
         return f"Command queued: {command}"
     
-    def check_server(self):
+    def check_server(self, active_within=300):
         """Check if server appears to be running"""
         logs = self.read_logs(5)
+        logs_available = bool(logs and not logs[0].startswith("Log file not found"))
         
-        # Look for recent activity
-        recent_activity = any(
-            line.lower().startswith(('[', 'script:')) and 
-            datetime.now().minute in [int(time.strftime("%M")) % 60]  # Simple check
-            for line in logs[-10:]
-        )
+        # The server writes constantly while it runs; a quiet log means it is down or hung.
+        recent_activity = logs_available and time.time() - self.log_file.stat().st_mtime < active_within
         
         return {
-            "logs_available": bool(logs and not logs[0].startswith("Log file not found")),
+            "logs_available": logs_available,
             "recent_activity": recent_activity,
-            "log_count": len(logs)
+            "log_count": len(logs),
+            "errors_last_hour": self.index.count_by_resource("error", 3600) if logs_available else {},
         }
 
-def main():
+def main(follow=False):
     monitor = ServerMonitor()
+
+    if follow:
+        print(f"Following {monitor.log_file} (Ctrl+C to stop)")
+        try:
+            for line in monitor.follow_logs():
+                print(f"  {line}")
+        except KeyboardInterrupt:
+            pass
+        return
     
     print("FiveM Server LLM Monitor")
     print("=" * 30)
@@ -78,6 +338,10 @@ def main():
     print(f"  Logs available: {status['logs_available']}")
     print(f"  Recent activity: {status['recent_activity']}")
     print(f"  Log entries: {status['log_count']}")
+    if status["errors_last_hour"]:
+        print(f"  Script errors in the last hour:")
+        for resource, count in status["errors_last_hour"].items():
+            print(f"    {resource}: {count}")
     
     # Read recent logs
     print(f"\nRecent Server Logs:")
@@ -100,4 +364,7 @@ def main():
     print(f"4. Run this script anytime to monitor server")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Monitor the FiveM server log and queue LLM commands.")
+    parser.add_argument("--follow", action="store_true", help="print new log lines as they are written")
+    args = parser.parse_args()
+    main(follow=args.follow)
@@ -0,0 +1,205 @@
+"""
+Dataset Post-processing
+-----------------------
+One streaming pass over the raw crawl that does what dedupe.py, prepare.py and
+test.py do separately: drop broken entries (is_valid), remove exact duplicates,
+write the deduplicated dataset and its LoRA instruction file, and print the
+file-type breakdown.
+
+The raw JSONL is split into byte-range shards parsed by a process pool. Every
+surviving entry is spilled to one of PARTITIONS files by its fingerprint, so
+each partition is deduplicated on its own and no process ever holds the
+fingerprints of the whole dataset. The partitions are then merged back into
+crawl order.
+
+Usage:
+    python postprocess.py [--workers 8] [--partitions 64]
+"""
+
+import os
+import json
+import heapq
+import shutil
+import argparse
+import tempfile
+from collections import Counter
+from multiprocessing import Pool
+from tqdm import tqdm
+
+from dataset_reader import iter_records, resolve_dataset_path
+from dedupe import INPUT_PATH, OUTPUT_PATH, hash_entry, is_valid
+from prepare import out as LORA_PATH, to_lora
+from breakdown import FRONTEND_EXTS, BACKEND_EXTS, file_kind, print_breakdown
+
+WORKERS = os.cpu_count() or 1
+PARTITIONS = 64  # fingerprint buckets; each one is deduplicated in memory on its own
+SHARD_BYTES = 64 << 20  # target size of a byte-range shard
+
+# --------------------------------------
+# SHARDING
+# --------------------------------------
+def plan_shards(path, workers=WORKERS, shard_bytes=SHARD_BYTES):
+    """
+    Byte ranges covering `path`. Compact and gzip datasets can't be split at
+    arbitrary offsets (chunk rows need their resource row), so they are read
+    as a single shard.
+    """
+    if path.endswith(".gz") or ".compact." in os.path.basename(path):
+        return [(0, None)]
+    size = os.path.getsize(path)
+    count = max(workers * 4, -(-size // shard_bytes))
+    count = max(1, min(count, size >> 20))  # no point in shards below ~1 MB
+    step = -(-size // count) or 1
+    return [(start, min(size, start + step)) for start in range(0, size, step)] or [(0, 0)]
+
+def _shard_entries(path, start, end):
+    """Yield (order key, entry or None) for the lines that begin inside [start, end)."""
+    if end is None:
+        yield from enumerate(iter_records(path))
+        return
+    with open(path, "rb") as f:
+        if start:
+            # Finish the line that straddles the boundary; the previous shard owns it.
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            yield pos, entry
+            pos += len(line)
+
+def _split_shard(task):
+    """Validate and format one shard, spilling survivors to their fingerprint partition."""
+    path, start, end, shard, tmp_dir, partitions = task
+    parts = [open(os.path.join(tmp_dir, f"{p}.{shard}"), "w", encoding="utf-8")
+             for p in range(partitions)]
+    read = dropped = 0
+    try:
+        for key, entry in _shard_entries(path, start, end):
+            read += 1
+            if entry is None or not is_valid(entry):
+                dropped += 1
+                continue
+            fingerprint = hash_entry(entry)
+            ext, base_dir = file_kind(entry.get("path", ""))
+            lora = to_lora(entry)
+            # json.dumps escapes tabs and newlines, so tabs can separate the fields.
+            parts[int(fingerprint[:8], 16) % partitions].write("\t".join((
+                str(key), fingerprint, ext, base_dir,
+                json.dumps(entry, ensure_ascii=False),
+                json.dumps(lora, ensure_ascii=False) if lora else "",
+            )) + "\n")
+    finally:
+        for f in parts:
+            f.close()
+    return read, dropped
+
+# --------------------------------------
+# PARTITIONS
+# --------------------------------------
+def _dedupe_partition(task):
+    """
+    Keep the earliest copy of every fingerprint in one partition, write the
+    survivors sorted by crawl order and return their statistics.
+    """
+    tmp_dir, partition, shards = task
+    first = {}
+    for shard in range(shards):
+        part_path = os.path.join(tmp_dir, f"{partition}.{shard}")
+        with open(part_path, "r", encoding="utf-8") as f:
+            for line in f:
+                key, fingerprint, rest = line.split("\t", 2)
+                # Shards are numbered in file order, so within a fingerprint
+                # the smaller key is the earlier entry.
+                key = int(key)
+                if fingerprint not in first or key < first[fingerprint][0]:
+                    first[fingerprint] = (key, rest)
+        os.remove(part_path)
+
+    stats = {"ext": Counter(), "dir": Counter(), "frontend": 0, "backend": 0, "total": 0,
+             "kept": len(first)}
+    with open(os.path.join(tmp_dir, f"merged.{partition}"), "w", encoding="utf-8") as f:
+        for key, rest in sorted(first.values()):
+            ext, base_dir, entry, lora = rest.split("\t", 3)
+            f.write(f"{key}\t{entry}\t{lora}")
+            if not ext:
+                continue
+            stats["ext"][ext] += 1
+            stats["dir"][base_dir] += 1
+            stats["total"] += 1
+            if ext in FRONTEND_EXTS:
+                stats["frontend"] += 1
+            elif ext in BACKEND_EXTS:
+                stats["backend"] += 1
+    return stats
+
+def _merged_rows(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            key, entry, lora = line.split("\t", 2)
+            yield int(key), entry, lora
+
+# --------------------------------------
+# MAIN
+# --------------------------------------
+def main(workers=WORKERS, partitions=PARTITIONS):
+    path = resolve_dataset_path(INPUT_PATH)
+    shards = plan_shards(path, workers)
+    os.makedirs(os.path.dirname(OUTPUT_PATH) or ".", exist_ok=True)
+    # Spill files live next to the dataset so they land on the same disk.
+    tmp_dir = tempfile.mkdtemp(prefix="postprocess-", dir=os.path.dirname(OUTPUT_PATH) or ".")
+    pool = Pool(workers) if workers > 1 else None
+    run = pool.imap if pool else map
+    try:
+        read = dropped = 0
+        tasks = [(path, start, end, shard, tmp_dir, partitions)
+                 for shard, (start, end) in enumerate(shards)]
+        for shard_read, shard_dropped in tqdm(run(_split_shard, tasks), total=len(tasks),
+                                              desc="Reading shards"):
+            read += shard_read
+            dropped += shard_dropped
+
+        ext_counter, dir_counter = Counter(), Counter()
+        frontend_count = backend_count = total = kept = 0
+        tasks = [(tmp_dir, p, len(shards)) for p in range(partitions)]
+        for stats in tqdm(run(_dedupe_partition, tasks), total=partitions,
+                          desc="Deduplicating partitions"):
+            ext_counter.update(stats["ext"])
+            dir_counter.update(stats["dir"])
+            frontend_count += stats["frontend"]
+            backend_count += stats["backend"]
+            total += stats["total"]
+            kept += stats["kept"]
+
+        lora_count = 0
+        merged = [_merged_rows(os.path.join(tmp_dir, f"merged.{p}")) for p in range(partitions)]
+        with open(OUTPUT_PATH, "w", encoding="utf-8") as deduped, \
+                open(LORA_PATH, "w", encoding="utf-8") as lora_out:
+            for _, entry, lora in heapq.merge(*merged, key=lambda row: row[0]):
+                deduped.write(entry + "\n")
+                if lora != "\n":
+                    lora_out.write(lora)
+                    lora_count += 1
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print_breakdown(ext_counter, dir_counter, frontend_count, backend_count, total)
+    print(f"✅ Deduplication complete: {kept} kept, {read - kept} dropped "
+          f"({dropped} invalid, {read - dropped - kept} duplicates)")
+    print(f"✅ dataset ready: {OUTPUT_PATH}, {lora_count} LoRA records in {LORA_PATH}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate, dedupe, format and summarise the dataset in one pass.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--partitions", type=int, default=PARTITIONS)
+    args = parser.parse_args()
+    main(args.workers, args.partitions)
@@ -1,20 +1,32 @@
 import json
+from dataset_reader import iter_records, resolve_dataset_path
 
-src = "fivem_dataset_deduped.jsonl"
-out = "fivem_dataset_lora.jsonl"
+src = "./dataset/fivem_dataset_deduped.jsonl"
+out = "./dataset/fivem_dataset_lora.jsonl"
 
-with open(src, "r", encoding="utf-8") as f, open(out, "w", encoding="utf-8") as o:
-    for line in f:
-        ex = json.loads(line)
-        prompt = ex.get("prompt", "").strip()
-        completion = ex.get("completion", "").strip()
-        if not prompt or not completion:
-            continue
-        record = {
-            "instruction": "Explain, analyze, or answer this FiveM code segment.",
-            "input": prompt,
-            "output": completion
-        }
-        o.write(json.dumps(record, ensure_ascii=False) + "\n")
+def to_lora(ex):
+    """Instruction-format record for one dataset entry, or None if it is empty."""
+    prompt = ex.get("prompt", "").strip()
+    completion = ex.get("completion", "").strip()
+    if not prompt or not completion:
+        return None
+    return {
+        "instruction": "Explain, analyze, or answer this FiveM code segment.",
+        "input": prompt,
+        "output": completion
+    }
 
-print("✅ dataset ready:", out)
+def main():
+    with open(out, "w", encoding="utf-8") as o:
+        for ex in iter_records(resolve_dataset_path(src)):
+            if ex is None:
+                continue
+            record = to_lora(ex)
+            if record is None:
+                continue
+            o.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    print("✅ dataset ready:", out)
+
+if __name__ == "__main__":
+    main()
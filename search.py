@@ -0,0 +1,623 @@
+"""
+Dataset Search
+--------------
+A retrieval index over the crawled dataset, for RAG and for questions like
+"which resource handles esx:playerLoaded", with no database server: everything
+lives in dataset/search_index.
+
+- BM25 over prompts and completions. The inverted index is a list of immutable
+  segments (sorted term hashes, postings and term frequencies as memory-mapped
+  .npy files). Every update adds a segment and segments of similar size are
+  merged, so a query only ever looks at O(log n) of them.
+- Optional dense vectors: one float16 row per entry in a raw memory-mapped
+  matrix, normalised so cosine similarity is a dot product. They come from
+  Ollama's /api/embed ("ollama") or from hashed token counts ("hash", a local
+  stand-in that needs no model).
+
+Updates only read what the crawler appended since the last one, so
+"update --watch" follows a running crawl and queries catch up before searching.
+Results can be filtered by resource and file extension.
+
+Usage:
+    python search.py update [--embed ollama|hash|none] [--rebuild] [--watch]
+    python search.py query "esx:playerLoaded" [-k 10] [--resource es_extended] [--ext .lua]
+                           [--mode hybrid|bm25|dense] [--group]
+"""
+
+import os
+import re
+import gzip
+import json
+import math
+import time
+import zlib
+import shutil
+import hashlib
+import argparse
+import urllib.request
+from collections import Counter
+import numpy as np
+from tqdm import tqdm
+
+from dataset_reader import expand_chunk, resolve_dataset_path
+from dedupe import INPUT_PATH, is_valid
+
+INDEX_DIR = "./dataset/search_index"
+EMBED_BACKEND = ""  # "ollama", "hash" (local stand-in, no model) or "" for BM25 only
+EMBED_MODEL = "nomic-embed-text"
+EMBED_URL = "http://localhost:11434/api/embed"
+EMBED_BATCH = 32  # texts per /api/embed request
+EMBED_TIMEOUT = 120  # seconds per /api/embed request
+EMBED_MAX_CHARS = 2000  # of answer + prompt per entry; embedding models have short contexts
+HASH_DIM = 256  # width of the "hash" stand-in vectors
+BM25_K1 = 1.2
+BM25_B = 0.75
+SEGMENT_DOCS = 50000  # entries per segment written during an update; progress is saved after each
+RRF_K = 60  # reciprocal rank fusion constant for hybrid results
+SCAN_ROWS = 1024  # vector rows converted to float32 and scored at a time; keeps the scratch in cache
+VECTOR_CACHE_MB = 1024  # float32 copy of the vectors a long-lived SearchIndex keeps; 0 = always scan the file
+PREVIEW_CHARS = 200
+WATCH_INTERVAL = 10  # seconds between dataset checks with --watch
+
+DOC_DTYPE = np.dtype([("text", "<u8"), ("length", "<u4"), ("resource", "<u4"), ("ext", "<u2")])
+_HEAD_BYTES = 4096  # dataset prefix fingerprinted to notice a rewritten file
+_WORD = re.compile(r"\w+")
+_SUBWORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+# --------------------------------------
+# TEXT
+# --------------------------------------
+def tokenize(text):
+    """
+    Lowercase words, plus the parts of camelCase and snake_case identifiers so
+    "playerLoaded" also matches "player loaded".
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        tokens.append(word.lower())
+        parts = _SUBWORD.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+class TermHashes(dict):
+    """Memoised 64-bit term hash; stable across processes, unlike hash()."""
+
+    def __missing__(self, term):
+        h = self[term] = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+        return h
+
+_term_hashes = TermHashes()
+
+def embed_text(entry):
+    # The answer first: it reads like the questions people ask.
+    return (entry.get("completion", "") + "\n\n" + entry.get("prompt", ""))[:EMBED_MAX_CHARS]
+
+def preview(text):
+    return " ".join(text.split())[:PREVIEW_CHARS]
+
+# --------------------------------------
+# EMBEDDINGS
+# --------------------------------------
+class OllamaEmbedder:
+    """Batched requests to Ollama's /api/embed."""
+
+    def __init__(self, model=EMBED_MODEL, url=EMBED_URL):
+        self.model = model
+        self.url = url
+
+    def config(self):
+        return {"backend": "ollama", "model": self.model}
+
+    def embed(self, texts):
+        vectors = []
+        for start in range(0, len(texts), EMBED_BATCH):
+            body = json.dumps({"model": self.model, "input": texts[start:start + EMBED_BATCH], "truncate": True})
+            request = urllib.request.Request(self.url, data=body.encode("utf-8"),
+                                             headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=EMBED_TIMEOUT) as response:
+                vectors.extend(json.loads(response.read())["embeddings"])
+        return np.asarray(vectors, dtype=np.float32)
+
+class HashEmbedder:
+    """
+    Signed feature hashing of log-scaled token counts. Not semantic, but it
+    exercises the vector path and finds entries sharing rare identifiers
+    without an embedding model.
+    """
+
+    def __init__(self, dim=HASH_DIM):
+        self.dim = dim
+
+    def config(self):
+        return {"backend": "hash", "dim": self.dim}
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token, count in Counter(tokenize(text)).items():
+                h = _term_hashes[token]
+                vectors[row, h % self.dim] += (1 + math.log(count)) * (1 if h >> 63 else -1)
+        return vectors
+
+def make_embedder(config):
+    """Embedder for a stored or requested config, or None for BM25 only."""
+    if not config:
+        return None
+    if config["backend"] == "ollama":
+        return OllamaEmbedder(config.get("model", EMBED_MODEL))
+    if config["backend"] == "hash":
+        return HashEmbedder(config.get("dim", HASH_DIM))
+    raise ValueError(f"unknown embedding backend {config['backend']!r}")
+
+def embed_config(backend, model=EMBED_MODEL):
+    """Config for a backend name; {} means no vectors."""
+    if not backend or backend == "none":
+        return {}
+    return make_embedder({"backend": backend, "model": model}).config()
+
+def _same_embed(a, b):
+    # The stored config also records the dimension the first batch came back with.
+    return (a or {}).get("backend") == (b or {}).get("backend") and (a or {}).get("model") == (b or {}).get("model")
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+# --------------------------------------
+# DATASET TAIL
+# --------------------------------------
+def _head(path, length):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+def read_appended(path, offset, resources):
+    """
+    Yield (offset after the line, record or None) for every complete line past
+    `offset`. A line without its newline is still being written and is left
+    for the next update. Compact resource rows are kept in `resources` so chunk
+    rows of later updates can still be expanded.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        f.seek(offset)
+        try:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                offset += len(line)
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield offset, None
+                    continue
+                if "rid" not in row:
+                    yield offset, row
+                elif "id" not in row:
+                    resources[str(row["rid"])] = row
+                    yield offset, None
+                elif str(row["rid"]) in resources:
+                    yield offset, expand_chunk(row, resources[str(row["rid"])])
+                else:
+                    yield offset, None
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            return
+
+# --------------------------------------
+# SEGMENTS
+# --------------------------------------
+class Segment:
+    """One immutable slice of the inverted index, memory-mapped."""
+
+    FILES = ("terms", "starts", "docs", "tfs")
+
+    def __init__(self, path):
+        for name in self.FILES:
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+
+    def postings(self, term):
+        i = np.searchsorted(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return None
+        return self.docs[self.starts[i]:self.starts[i + 1]], self.tfs[self.starts[i]:self.starts[i + 1]]
+
+    def expanded(self):
+        """(term per posting, doc, tf) arrays, for merging."""
+        return np.repeat(np.asarray(self.terms), np.diff(self.starts)), np.asarray(self.docs), np.asarray(self.tfs)
+
+def write_segment(path, terms, docs, tfs):
+    """
+    Write postings given as parallel arrays in doc order. The sort is stable,
+    so every term's postings stay sorted by doc.
+    """
+    order = np.argsort(terms, kind="stable")
+    terms, docs, tfs = terms[order], docs[order], tfs[order]
+    unique, starts = np.unique(terms, return_index=True)
+    arrays = {
+        "terms": unique,
+        "starts": np.append(starts, len(terms)).astype(np.int64),
+        "docs": docs.astype(np.uint32),
+        "tfs": np.minimum(tfs, 0xFFFF).astype(np.uint16),
+    }
+    # Written aside and renamed, so a crash never leaves a segment that looks complete.
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name + ".npy"), array)
+    os.replace(tmp, path)
+    return len(terms)
+
+# --------------------------------------
+# INDEX
+# --------------------------------------
+class SearchIndex:
+    """
+    The on-disk index. meta.json is the commit point: it is replaced
+    atomically after the data files are appended to, and anything past the
+    sizes it records is a crashed update's leftovers, cut off by the next one.
+
+    A process that keeps the index open (a RAG server) gets a float32 copy of
+    the vectors up to vector_cache_mb, so vector queries after the first are a
+    single matrix product instead of a float16 scan.
+    """
+
+    def __init__(self, path=INDEX_DIR, vector_cache_mb=VECTOR_CACHE_MB):
+        self.path = path
+        self.vector_cache_mb = vector_cache_mb
+        self.meta = self._read_meta()
+        self._open()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"dataset": None, "offset": 0, "head": None, "head_bytes": 0, "docs": 0,
+                    "text_bytes": 0, "total_length": 0, "resources": [], "exts": [], "segments": [],
+                    "next_segment": 0, "embed": None, "compact": {}}
+
+    def _commit(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._open()
+
+    def _open(self):
+        """Map the committed part of every data file."""
+        n = self.meta["docs"]
+        self.segments = [Segment(self._file(s["name"])) for s in self.meta["segments"]]
+        self.docs = np.memmap(self._file("docs.bin"), dtype=DOC_DTYPE, mode="r", shape=(n,)) if n else \
+            np.zeros(0, dtype=DOC_DTYPE)
+        dim = (self.meta["embed"] or {}).get("dim")
+        self.vectors = np.memmap(self._file("vectors.f16"), dtype=np.float16, mode="r", shape=(n, dim)) \
+            if n and dim else None
+        self._norm = None
+        self._columns = {}
+        self._vectors32 = None
+
+    def _recover(self):
+        """Cut off whatever an interrupted update appended past the committed sizes."""
+        os.makedirs(self.path, exist_ok=True)
+        n = self.meta["docs"]
+        dim = (self.meta["embed"] or {}).get("dim") or 0
+        for name, size in (("docs.bin", n * DOC_DTYPE.itemsize), ("docs.jsonl", self.meta["text_bytes"]),
+                           ("vectors.f16", n * dim * 2)):
+            with open(self._file(name), "ab") as f:
+                f.truncate(size)
+        live = {s["name"] for s in self.meta["segments"]}
+        for name in os.listdir(self.path):
+            if name.startswith("seg-") and name not in live:
+                shutil.rmtree(self._file(name), ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.meta = self._read_meta()
+        self._open()
+
+    # ---------- updates ----------
+    def update(self, dataset_path, embed=None, progress=True):
+        """
+        Index the records appended to `dataset_path` since the last update.
+        `embed` is an embedding config ({} for none); None keeps the index's
+        own, or EMBED_BACKEND for a new index. Returns the number of entries
+        added.
+        """
+        if not os.path.exists(dataset_path):
+            raise SystemExit(f"No dataset at {dataset_path}; run crawl.py first.")
+        if embed is None and not self.meta["offset"]:
+            embed = embed_config(EMBED_BACKEND)
+        if embed is not None and self.meta["docs"] and not _same_embed(embed, self.meta["embed"]):
+            raise SystemExit(f"Index was built with embeddings {self.meta['embed']}; "
+                             f"pass --rebuild to switch to {embed or 'none'}.")
+        if self.meta["offset"] and not self._same_dataset(dataset_path):
+            print(f"⚠️ {dataset_path} was rewritten; rebuilding the index")
+            kept = self.meta["embed"]
+            self.clear()
+            self.meta["embed"] = kept
+        if embed is not None and not self.meta["docs"]:
+            self.meta["embed"] = embed or None
+        self._recover()
+        self.meta["dataset"] = dataset_path
+        embedder = make_embedder(self.meta["embed"])
+
+        added, batch, offset = 0, [], self.meta["offset"]
+        lines = read_appended(dataset_path, offset, self.meta["compact"])
+        for offset, entry in tqdm(lines, desc="Indexing", unit=" lines", disable=not progress):
+            if entry is not None and is_valid(entry):
+                batch.append(entry)
+            if len(batch) >= SEGMENT_DOCS:
+                added += self._add(batch, embedder, offset, dataset_path)
+                batch = []
+        if batch or offset != self.meta["offset"]:
+            added += self._add(batch, embedder, offset, dataset_path)
+        return added
+
+    def _same_dataset(self, dataset_path):
+        if self.meta["dataset"] != dataset_path:
+            return False
+        if not dataset_path.endswith(".gz") and os.path.getsize(dataset_path) < self.meta["offset"]:
+            return False
+        return _head(dataset_path, self.meta["head_bytes"]) == self.meta["head"]
+
+    def _add(self, entries, embedder, offset, dataset_path):
+        """Append `entries` as a new segment and commit up to `offset` of the dataset."""
+        meta = self.meta
+        first = meta["docs"]
+        resource_codes = {name: code for code, name in enumerate(meta["resources"])}
+        ext_codes = {ext: code for code, ext in enumerate(meta["exts"])}
+        docs = np.zeros(len(entries), dtype=DOC_DTYPE)
+        terms, postings, tfs = [], [], []
+        with open(self._file("docs.jsonl"), "ab") as text:
+            for row, entry in enumerate(entries):
+                resource = entry.get("resource", "")
+                path = entry.get("path", "")
+                ext = os.path.splitext(path)[1].lower()
+                if resource not in resource_codes:
+                    resource_codes[resource] = len(meta["resources"])
+                    meta["resources"].append(resource)
+                if ext not in ext_codes:
+                    ext_codes[ext] = len(meta["exts"])
+                    meta["exts"].append(ext)
+                counts = Counter(tokenize(entry.get("prompt", "") + "\n" + entry.get("completion", "")))
+                docs[row] = (meta["text_bytes"], sum(counts.values()), resource_codes[resource], ext_codes[ext])
+                terms.extend(_term_hashes[t] for t in counts)
+                tfs.extend(counts.values())
+                postings.extend([first + row] * len(counts))
+                line = json.dumps({"id": entry.get("id"), "resource": resource, "path": path,
+                                   "preview": preview(entry.get("completion", ""))}, ensure_ascii=False)
+                line = (line + "\n").encode("utf-8")
+                text.write(line)
+                meta["text_bytes"] += len(line)
+        with open(self._file("docs.bin"), "ab") as f:
+            f.write(docs.tobytes())
+        if embedder is not None and entries:
+            vectors = normalize_rows(embedder.embed([embed_text(e) for e in entries]))
+            meta["embed"]["dim"] = vectors.shape[1]
+            with open(self._file("vectors.f16"), "ab") as f:
+                f.write(vectors.astype(np.float16).tobytes())
+
+        retired = []
+        if entries:
+            name = f"seg-{meta['next_segment']:06d}"
+            meta["next_segment"] += 1
+            count = write_segment(self._file(name), np.array(terms, dtype=np.uint64),
+                                  np.array(postings, dtype=np.uint32), np.array(tfs, dtype=np.int64))
+            meta["segments"].append({"name": name, "postings": count})
+            retired = self._merge_tail()
+        meta["docs"] += len(entries)
+        meta["total_length"] += int(docs["length"].sum())
+        meta["offset"] = offset
+        meta["head_bytes"] = min(_HEAD_BYTES, os.path.getsize(dataset_path))
+        meta["head"] = _head(dataset_path, meta["head_bytes"])
+        self._commit()
+        # Only once the new meta no longer points at them.
+        for name in retired:
+            shutil.rmtree(self._file(name), ignore_errors=True)
+        return len(entries)
+
+    def _merge_tail(self):
+        """
+        Merge the newest segment into the one before while it is at least half
+        its size (a binary-counter policy), so there are O(log n) segments and
+        every posting is rewritten O(log n) times. Returns retired segments.
+        """
+        segments, retired = self.meta["segments"], []
+        while len(segments) > 1 and segments[-1]["postings"] * 2 >= segments[-2]["postings"]:
+            older, newer = segments[-2], segments[-1]
+            # Older segments hold lower doc ids, so concatenating keeps doc order.
+            parts = [Segment(self._file(s["name"])).expanded() for s in (older, newer)]
+            name = f"seg-{self.meta['next_segment']:06d}"
+            self.meta["next_segment"] += 1
+            count = write_segment(self._file(name), *(np.concatenate(arrays) for arrays in zip(*parts)))
+            segments[-2:] = [{"name": name, "postings": count}]
+            retired += [older["name"], newer["name"]]
+        return retired
+
+    # ---------- queries ----------
+    def mask(self, resources=None, exts=None):
+        """Boolean filter over entries from resource names and extensions, or None."""
+        if not resources and not exts:
+            return None
+        keep = np.ones(self.meta["docs"], dtype=bool)
+        for field, names, values in (("resource", resources, self.meta["resources"]),
+                                     ("ext", [e.lower() if e.startswith(".") else "." + e.lower()
+                                              for e in exts or []], self.meta["exts"])):
+            if names:
+                if field not in self._columns:
+                    self._columns[field] = np.array(self.docs[field])
+                wanted = np.array([value in names for value in values] + [False])
+                keep &= wanted[self._columns[field]]
+        return keep
+
+    def bm25(self, query, k=10, mask=None):
+        """Top (doc, score) pairs by BM25."""
+        n = self.meta["docs"]
+        if not n:
+            return []
+        if self._norm is None:
+            lengths = self.docs["length"].astype(np.float32)
+            avgdl = self.meta["total_length"] / n or 1
+            self._norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avgdl)
+        scores = np.zeros(n, dtype=np.float32)
+        for term in {_term_hashes[t] for t in tokenize(query)}:
+            postings = [p for p in (segment.postings(term) for segment in self.segments) if p is not None]
+            df = sum(len(docs) for docs, _ in postings)
+            if not df:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for docs, tfs in postings:
+                tf = tfs.astype(np.float32)
+                scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self._norm[docs])
+        if mask is not None:
+            scores[~mask] = 0
+        return _top_k(np.flatnonzero(scores), scores, k)
+
+    def dense(self, query, k=10, mask=None):
+        """Top (doc, cosine) pairs against the query's embedding."""
+        if self.vectors is None:
+            raise SystemExit("This index has no vectors; build it with --embed ollama or --embed hash.")
+        q = normalize_rows(make_embedder(self.meta["embed"]).embed([query]))[0]
+        if self.vectors.size * 4 <= self.vector_cache_mb << 20:
+            if self._vectors32 is None:
+                self._vectors32 = self.vectors.astype(np.float32)
+            if mask is None:
+                return _top_k(np.arange(len(self._vectors32)), self._vectors32 @ q, k, positions=True)
+            rows = np.flatnonzero(mask)
+            return _top_k(rows, self._vectors32[rows] @ q, k, positions=True)
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(len(self.vectors))
+        sims = np.empty(len(rows), dtype=np.float32)
+        # Too big to keep in memory as float32. numpy has no float16 matrix
+        # product, and converting a small block at a time into one reused
+        # buffer is faster than converting the whole matrix.
+        scratch = np.empty((SCAN_ROWS, self.vectors.shape[1]), dtype=np.float32)
+        for start in range(0, len(rows), SCAN_ROWS):
+            if mask is None:
+                block = self.vectors[start:start + SCAN_ROWS]
+            else:
+                block = self.vectors[rows[start:start + SCAN_ROWS]]
+            converted = scratch[:len(block)]
+            np.copyto(converted, block)
+            np.matmul(converted, q, out=sims[start:start + len(block)])
+        return _top_k(rows, sims, k, positions=True)
+
+    def search(self, query, k=10, mode="hybrid", resources=None, exts=None, group=False):
+        """
+        Ranked result dicts (doc, score, id, resource, path, preview). Hybrid
+        mode fuses the BM25 and vector rankings by reciprocal rank, and falls
+        back to BM25 when the index has no vectors. With group=True only the
+        best hit of every resource is kept.
+        """
+        mask = self.mask(resources, exts)
+        depth = k * (20 if group else 1)
+        if mode == "hybrid" and self.vectors is None:
+            mode = "bm25"
+        if mode == "bm25":
+            hits = self.bm25(query, depth, mask)
+        elif mode == "dense":
+            hits = self.dense(query, depth, mask)
+        else:
+            fused = Counter()
+            for ranking in (self.bm25(query, depth * 4, mask), self.dense(query, depth * 4, mask)):
+                for rank, (doc, _) in enumerate(ranking):
+                    fused[doc] += 1 / (RRF_K + rank + 1)
+            hits = fused.most_common(depth)
+        results, seen = [], set()
+        with open(self._file("docs.jsonl"), "rb") as text:
+            for doc, score in hits:
+                text.seek(int(self.docs["text"][doc]))
+                result = {"doc": int(doc), "score": float(score), **json.loads(text.readline())}
+                if group:
+                    if result["resource"] in seen:
+                        continue
+                    seen.add(result["resource"])
+                results.append(result)
+                if len(results) == k:
+                    break
+        return results
+
+def _top_k(ids, scores, k, positions=False):
+    """
+    The k best (id, score) pairs, best first. `scores` is indexed by id, or
+    by position in `ids` when positions=True.
+    """
+    values = scores if positions else scores[ids]
+    if len(values) > k:
+        keep = np.argpartition(-values, k)[:k]
+        ids, values = ids[keep], values[keep]
+    order = np.argsort(-values, kind="stable")
+    return [(int(i), float(v)) for i, v in zip(ids[order], values[order])]
+
+# --------------------------------------
+# MAIN
+# --------------------------------------
+def update(index, dataset_path, embed=None, watch=False):
+    while True:
+        start = time.perf_counter()
+        added = index.update(dataset_path, embed, progress=not watch)
+        if added or not watch:
+            print(f"✅ Indexed {added} new entries in {time.perf_counter() - start:.1f}s "
+                  f"({index.meta['docs']} total, {len(index.meta['segments'])} segments)")
+        if not watch:
+            return
+        embed = None
+        time.sleep(WATCH_INTERVAL)
+
+def print_results(results, elapsed, index, mode):
+    print(f"{len(results)} results in {elapsed * 1000:.1f} ms ({mode}, {index.meta['docs']} entries)")
+    for rank, hit in enumerate(results, 1):
+        print(f"{rank:>3}. {hit['score']:8.3f}  {hit['resource']}  {hit['path']}")
+        print(f"     {hit['preview']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the crawled dataset with BM25 and optional embeddings.")
+    parser.add_argument("--dataset", default=INPUT_PATH)
+    parser.add_argument("--index", default=INDEX_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("update", help="index the entries appended since the last update")
+    p.add_argument("--embed", choices=["ollama", "hash", "none"],
+                   help="vector backend; defaults to the index's own, or EMBED_BACKEND for a new one")
+    p.add_argument("--embed-model", default=EMBED_MODEL)
+    p.add_argument("--rebuild", action="store_true", help="start over from the beginning of the dataset")
+    p.add_argument("--watch", action="store_true", help=f"keep following the dataset every {WATCH_INTERVAL}s")
+
+    p = sub.add_parser("query", help="search the index")
+    p.add_argument("text")
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("--resource", action="append", help="only this resource (repeatable)")
+    p.add_argument("--ext", action="append", help="only this file extension, e.g. .lua (repeatable)")
+    p.add_argument("--mode", choices=["hybrid", "bm25", "dense"], default="hybrid")
+    p.add_argument("--group", action="store_true", help="best hit per resource, to find which one handles something")
+    p.add_argument("--json", action="store_true", help="print results as JSON lines")
+    p.add_argument("--no-update", action="store_true", help="don't index new entries before searching")
+    args = parser.parse_args()
+
+    dataset_path = resolve_dataset_path(args.dataset)
+    # One query per process: a float32 copy would cost more than the scan it saves.
+    index = SearchIndex(args.index, vector_cache_mb=0 if args.command == "query" else VECTOR_CACHE_MB)
+    if args.command == "update":
+        if args.rebuild:
+            index.clear()
+        embed = embed_config(args.embed, args.embed_model) if args.embed else None
+        update(index, dataset_path, embed, args.watch)
+        return
+
+    if not args.no_update:
+        index.update(dataset_path, progress=False)
+    start = time.perf_counter()
+    results = index.search(args.text, args.k, args.mode, args.resource, args.ext, args.group)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        for hit in results:
+            print(json.dumps(hit, ensure_ascii=False))
+    else:
+        print_results(results, elapsed, index, args.mode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import crawl
+
+FIRST_PARTY = "function openMenu(data) {\n    document.getElementById('menu').style.display = 'block';\n}\n"
+
+def test_first_party_code_with_a_banner_or_lib_folder_is_crawled():
+    assert crawl.bundled_asset_reason("html/js/app.js", "/* Inventory v1.2 (c) 2024 MyServer */\n" + FIRST_PARTY) is None
+    assert crawl.bundled_asset_reason("html/lib/utils.js", "/* Copyright MyServer */\n" + FIRST_PARTY) is None
+    assert crawl.bundled_asset_reason("build/ui.js", FIRST_PARTY) is None
+
+def test_vendored_libraries_are_skipped():
+    assert crawl.bundled_asset_reason("html/jquery-3.6.0.js", FIRST_PARTY) == "vendored"
+    assert crawl.bundled_asset_reason("html/app.min.js", FIRST_PARTY) == "vendored"
+    assert crawl.bundled_asset_reason("web/assets/index-3f2a9c1b.js", FIRST_PARTY) == "vendored"
+    banner = "/*! jQuery v3.6.0 | (c) OpenJS Foundation and other contributors */\n"
+    assert crawl.bundled_asset_reason("html/js/dom.js", banner + FIRST_PARTY) == "library banner"
+    assert crawl.bundled_asset_reason("web/dist/app.js", "/*! @license MIT */\n" + FIRST_PARTY) == "licensed build output"
+
+def test_minified_code_is_skipped():
+    minified = "var a=1;" * 1000
+    assert crawl.bundled_asset_reason("html/js/app.js", minified) == "minified"
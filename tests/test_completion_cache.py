@@ -0,0 +1,20 @@
+import crawl
+
+def test_re_putting_existing_keys_evicts_nothing(tmp_path):
+    cache = crawl.CompletionCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    cache.put_many([(f"k{i}", f"c{i}", f"answer {i}") for i in range(8)])
+    for n in range(3):
+        cache.put_many([(f"k{i}", f"c{i}", f"batch {n} {i}") for i in range(8)])
+        assert [cache.get(f"k{i}") for i in range(8)] == [f"batch {n} {i}" for i in range(8)]
+        for i in range(8):
+            cache.put(f"k{i}", f"c{i}", f"single {n} {i}")
+            assert cache.get("k0") == f"single {n} 0"
+    assert cache._conn().execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 8
+    cache.close()
+
+def test_eviction_still_trims_to_ninety_percent(tmp_path):
+    cache = crawl.CompletionCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    for i in range(11):
+        cache.put(f"k{i}", f"c{i}", f"answer {i}")
+    assert cache._conn().execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 9
+    cache.close()
@@ -0,0 +1,26 @@
+import os
+
+from dataset_reader import resolve_dataset_path
+
+def touch(path, mtime):
+    with open(path, "w") as f:
+        f.write("{}\n")
+    os.utime(path, (mtime, mtime))
+
+def test_single_variant_is_used(tmp_path):
+    plain = str(tmp_path / "data.jsonl")
+    assert resolve_dataset_path(plain) == plain
+    touch(str(tmp_path / "data.compact.jsonl.gz"), 1000)
+    assert resolve_dataset_path(plain) == str(tmp_path / "data.compact.jsonl.gz")
+
+def test_newest_variant_wins_when_both_exist(tmp_path, capsys):
+    plain = str(tmp_path / "data.jsonl")
+    compact = str(tmp_path / "data.compact.jsonl")
+    touch(plain, 1000)
+    touch(compact, 2000)
+
+    assert resolve_dataset_path(plain) == compact
+    assert "most recently written" in capsys.readouterr().out
+
+    touch(plain, 3000)
+    assert resolve_dataset_path(plain) == plain
@@ -0,0 +1,13 @@
+import os
+import stat
+
+import crawl
+
+def test_dataset_files_are_not_executable(tmp_path):
+    for compress in (False, True):
+        path = str(tmp_path / ("data.compact.jsonl.gz" if compress else "data.jsonl"))
+        writer = crawl.DatasetWriter(path, compress=compress)
+        writer.write({"id": "a", "completion": "x"})
+        writer.close()
+        for name in [path, path + ".end"] if compress else [path]:
+            assert os.stat(name).st_mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH) == 0, name
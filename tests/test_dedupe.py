@@ -0,0 +1,19 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_exact_dedupe_does_not_import_numpy():
+    # A fresh interpreter: this test process may have imported numpy already.
+    code = "import sys, dedupe, postprocess; print('numpy' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+def test_near_duplicate_signatures_match_for_copies():
+    import dedupe
+
+    pair = ("local x = GetPlayerPed(-1)\nSetEntityHealth(x, 200)", "Heals the local player to full health.")
+    sigs = dedupe.minhash_signatures([pair, pair, ("print('hi')", "Prints a greeting.")])
+    roots = dedupe.near_duplicate_clusters(sigs)
+    assert roots.tolist()[:2] == [0, 0] and roots[2] == 2
@@ -0,0 +1,40 @@
+import importlib.util
+import time
+from pathlib import Path
+
+spec = importlib.util.spec_from_file_location(
+    "llm_monitor", Path(__file__).resolve().parent.parent / "llm-monitor.py")
+llm_monitor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(llm_monitor)
+
+def test_backlog_is_not_counted_as_recent(tmp_path):
+    log = tmp_path / "fxserver.log"
+    log.write_text(
+        "[    script:old] SCRIPT ERROR: @old/server.lua:1: boom\n"
+        "2020-01-02 03:04:05 [    script:dated] SCRIPT ERROR: @dated/server.lua:1: boom\n")
+    index = llm_monitor.LogIndex(log, tmp_path / "index.sqlite")
+    assert index.update() == 2
+    assert index.count_by_resource("error", 3600) == {}
+    dated = index.events(resource="dated")[0]
+    assert time.localtime(dated["ts"])[:6] == (2020, 1, 2, 3, 4, 5)
+
+    with open(log, "a") as f:
+        f.write("[    script:new] SCRIPT ERROR: @new/server.lua:1: boom\n")
+    index.update()
+    assert index.count_by_resource("error", 3600) == {"new": 1}
+    index.close()
+
+def test_stack_lines_survive_a_restart(tmp_path):
+    log = tmp_path / "fxserver.log"
+    log.write_text("[    script:res] SCRIPT ERROR: @res/client.lua:3: nil value\n"
+                   "[    script:res] > handler (@res/client.lua:3)\n")
+    index = llm_monitor.LogIndex(log, tmp_path / "index.sqlite")
+    index.update()
+    index.close()
+
+    with open(log, "a") as f:
+        f.write("[    script:res] > fn (@res/client.lua:10)\n")
+    index = llm_monitor.LogIndex(log, tmp_path / "index.sqlite")
+    index.update()
+    assert index.events("error")[0]["stack"] == "handler (@res/client.lua:3)\nfn (@res/client.lua:10)"
+    index.close()
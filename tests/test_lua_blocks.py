@@ -0,0 +1,25 @@
+import crawl
+
+def test_statement_after_semicolon_is_named_by_its_own_tokens():
+    blocks = list(crawl.lua_block_spans("a = 1; b = function() return 1 end\n"))
+
+    assert [(b.kind, b.name) for b in blocks] == [("function", "b")]
+    assert blocks[0].text == "b = function() return 1 end"
+
+def test_blocks_sharing_a_line_get_their_own_text():
+    first = "local onJoin = function(source) print('joined', source, GetPlayerName(source)) end"
+    second = "local onDrop = function(source, reason) print('dropped', source, reason, GetPlayerName(source)) end"
+    code = f"{first}; {second}\n"
+
+    assert [b.name for b in crawl.lua_block_spans(code)] == ["onJoin", "onDrop"]
+    blocks = crawl.extract_lua_blocks(code)
+    assert blocks == [first, second]
+    ids = {crawl.hash_id("res", "server.lua", block) for block in blocks}
+    assert len(ids) == 2
+
+def test_indentation_of_a_block_starting_its_line_is_kept():
+    code = "  RegisterCommand('heal', function(source)\n    SetEntityHealth(source, 200)\n  end)\n"
+    blocks = list(crawl.lua_block_spans(code))
+
+    assert blocks[0].text == code.rstrip("\n")
+    assert (blocks[0].start_line, blocks[0].end_line) == (1, 3)
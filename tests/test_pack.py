@@ -0,0 +1,27 @@
+import asyncio
+import json
+
+import crawl
+
+def test_packed_answers_are_cached_apart_and_misses_counted_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawl, "completion_cache", crawl.CompletionCache(str(tmp_path / "cache.sqlite")))
+    monkeypatch.setattr(crawl, "metrics", crawl.CrawlMetrics())
+    monkeypatch.setattr(crawl, "CONTENT_DEDUPE", False)
+    monkeypatch.setattr(crawl, "PACK_BLOCKS", True)
+    requests = []
+
+    async def fake_llm(payload):
+        requests.append(payload)
+        # The packed answer covers only the first block; the second is asked alone.
+        return json.dumps({"b1": "first"}) if payload.get("format") == "json" else "second"
+
+    monkeypatch.setattr(crawl, "query_llm", fake_llm)
+    blocks = ["local a = 1", "local b = 2"]
+    records = asyncio.run(crawl.process_pack("res", {}, "res/a.lua", ".lua", blocks))
+    assert [r["completion"] for r in records] == ["first", "second"]
+    assert len(requests) == 2
+    assert crawl.metrics.counters["cache_misses"] == 2
+
+    chunk_id = records[0]["id"]
+    assert crawl.cache_key(chunk_id) == crawl.cache_key(chunk_id, packed=True)
+    assert crawl.cache_key(chunk_id, packed=True) != crawl.cache_key(chunk_id, packed=False)
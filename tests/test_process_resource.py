@@ -0,0 +1,33 @@
+import os
+import asyncio
+
+import crawl
+
+HANDLER = """RegisterNetEvent('shop:buy')
+AddEventHandler('shop:buy', function(item, amount)
+    local xPlayer = ESX.GetPlayerFromId(source)
+    xPlayer.removeMoney(amount)
+    xPlayer.addInventoryItem(item, 1)
+end)
+"""
+
+def test_process_resource_returns_the_records_written(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawl, "completion_cache", crawl.CompletionCache(str(tmp_path / "cache.sqlite")))
+
+    async def fake_llm(payload):
+        return "Handles the shop:buy event: charges the player and hands over the item. " * 3
+
+    monkeypatch.setattr(crawl, "query_llm", fake_llm)
+    resource = tmp_path / "shop"
+    resource.mkdir()
+    (resource / "fxmanifest.lua").write_text("fx_version 'cerulean'\ngame 'gta5'\nserver_script 'server.lua'\n")
+    (resource / "server.lua").write_text(HANDLER)
+
+    records = asyncio.run(crawl.process_resource(str(resource)))
+
+    assert isinstance(records, list) and len(records) == 1
+    record = records[0]
+    assert record["resource"] == "shop"
+    assert os.path.basename(record["path"]) == "server.lua"
+    assert "shop:buy" in record["prompt"] and record["completion"].startswith("Handles")
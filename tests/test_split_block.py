@@ -0,0 +1,14 @@
+import crawl
+
+def test_every_window_adds_lines_past_the_overlap():
+    lines = ["local function big()\n"]
+    lines += [f"  local value_{i} = compute({i}, 'argument number {i}')\n" for i in range(60)]
+    lines += ["  return {" + ", ".join(f"k{i} = {i}" for i in range(400)) + "}\n", "end\n"]
+    text = "".join(lines)
+    block = crawl.CodeBlock("function", "big", 1, len(lines), text)
+    windows = crawl.split_block(block, ".lua", budget=300)
+    assert len(windows) > 1
+    bodies = [window.split("\n", 1)[1] for window in windows]
+    for prev, body in zip(bodies, bodies[1:]):
+        assert body not in prev
+    assert "".join(bodies).count("k399 = 399") == 1
@@ -0,0 +1,56 @@
+import os
+import shutil
+import asyncio
+
+import crawl
+
+def make_resource(root, name):
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    with open(os.path.join(path, "fxmanifest.lua"), "w") as f:
+        f.write("fx_version 'cerulean'\ngame 'gta5'\nserver_script 'server.lua'\n")
+    with open(os.path.join(path, "server.lua"), "w") as f:
+        f.write("RegisterNetEvent('demo:ping')\n")
+    return path
+
+def indexed(index, resource):
+    changed, entry = index.check(resource, [os.path.join(resource, "server.lua")])
+    index.commit(resource, entry)
+    return entry
+
+def test_deleted_resource_is_crawled_at_most_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawl, "WATCH_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(crawl, "WATCH_DEBOUNCE", 0)
+    index = crawl.FileIndex(str(tmp_path / "file_index.json"))
+    kept = make_resource(str(tmp_path), "kept")
+    gone = make_resource(str(tmp_path), "gone")
+    indexed(index, kept)
+    indexed(index, gone)
+    shutil.rmtree(gone)
+
+    crawled = []
+    real_crawl = crawl.crawl_resources
+
+    async def counting_crawl(resource_dirs, *args, **kwargs):
+        crawled.extend(resource_dirs)
+        await real_crawl(resource_dirs, *args, **kwargs)
+
+    monkeypatch.setattr(crawl, "crawl_resources", counting_crawl)
+    asyncio.run(crawl.watch_resources(None, index, 1.0))
+
+    assert crawled.count(gone) <= 1
+    assert gone not in index.resources
+    assert kept in index.resources
+    assert index.stale_resources() == {}
+
+def test_full_discovery_prunes_vanished_resources(tmp_path):
+    index = crawl.FileIndex(str(tmp_path / "file_index.json"))
+    kept = make_resource(str(tmp_path), "kept")
+    gone = make_resource(str(tmp_path), "gone")
+    indexed(index, kept)
+    indexed(index, gone)
+
+    index.prune([kept])
+
+    assert list(index.resources) == [kept]